@@ -0,0 +1,113 @@
+"""
+قياس معالجة التحديثات بالتوازي
+
+يرسل N مستخدماً رسالة في نفس الوقت عبر معالج المحادثة الحقيقي من run.py،
+مع كتابة بطيئة محاكاة إلى Google Sheets، ويقارن الزمن الكلي بالمعالجة
+المتسلسلة. كما يتحقق من أن رسائل المحادثة الواحدة تعالج بالترتيب، ومن أن
+مستخدماً يرسل رسائل كثيرة لا يؤخر المحادثات الأخرى عند امتلاء الحد الأقصى.
+
+التشغيل:
+    python benchmarks/bench_concurrency.py [--users 50] [--write-latency 0.2]
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import Callable, Optional
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import run
+from src.update_processor import PerChatUpdateProcessor
+import handlers.conversation
+from fake_telegram import FAKE_TOKEN, FakeRequest, make_update
+
+written = []
+
+# أقصى مدة انتظار لاكتمال الكتابة في كل سيناريو (بالثواني)
+SCENARIO_TIMEOUT = 60
+
+def patch_sheets(latency: float) -> None:
+    """استبدال الكتابة إلى Google Sheets بانتظار محاكى"""
+    async def add_to_sheets(product, price, notes=""):
+        await asyncio.sleep(latency)
+        written.append((product, price, notes))
+        return True
+    handlers.conversation.add_to_sheets = add_to_sheets
+
+async def run_scenario(messages: list, expected_writes: int, api_latency: float = 0.0,
+                       until: Optional[Callable[[], bool]] = None, **builder_options) -> float:
+    """
+    إرسال الرسائل إلى التطبيق وانتظار اكتمال الكتابة
+
+    المعطيات:
+        until: شرط التوقف عن القياس (افتراضي: اكتمال expected_writes كتابة)
+
+    تعيد:
+        الزمن الكلي بالثواني
+
+    ترفع:
+        TimeoutError: إذا لم يتحقق الشرط خلال SCENARIO_TIMEOUT
+    """
+    if until is None:
+        until = lambda: len(written) >= expected_writes
+    written.clear()
+    application = run.build_application(FAKE_TOKEN, request=FakeRequest(api_latency), **builder_options)
+    async with application:
+        await application.start()
+        start = time.perf_counter()
+        for chat_id, text in messages:
+            await application.update_queue.put(make_update(chat_id, text, application.bot))
+        try:
+            while not until():
+                if time.perf_counter() - start > SCENARIO_TIMEOUT:
+                    raise TimeoutError(
+                        f"لم تكتمل الكتابة خلال {SCENARIO_TIMEOUT} ثانية ({len(written)} من {expected_writes})"
+                    )
+                await asyncio.sleep(0.005)
+            elapsed = time.perf_counter() - start
+        finally:
+            # كما في run_polling: post_stop يغلق طابور الرسائل الصادرة لهذا التطبيق
+            await application.stop()
+            await run.post_stop(application)
+    return elapsed
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description='قياس معالجة التحديثات بالتوازي')
+    parser.add_argument('--users', type=int, default=50, help='عدد المستخدمين المتزامنين')
+    parser.add_argument('--write-latency', type=float, default=0.2, help='زمن الكتابة المحاكى بالثواني')
+    args = parser.parse_args()
+    patch_sheets(args.write_latency)
+
+    messages = [(1000 + i, "كولا ٢٣") for i in range(args.users)]
+    concurrent = await run_scenario(messages, args.users)
+    sequential = await run_scenario(messages, args.users, concurrent_updates=1)
+
+    print(f"{args.users} مستخدم، زمن الكتابة {args.write_latency * 1000:.0f} ms")
+    print(f"    متسلسل: {sequential:6.2f} s")
+    print(f"    متوازٍ:  {concurrent:6.2f} s  (مستخدم واحد: {args.write_latency:.2f} s)")
+
+    # الترتيب داخل المحادثة: المنتج ثم السعر ثم الملاحظات (مع تأخير في الردود
+    # حتى تصل الرسالة التالية قبل انتهاء معالجة السابقة)
+    await run_scenario([(1, "قهوة"), (1, "15"), (1, "اسبريسو"), (2, "شاي ٥")], 2, api_latency=0.05)
+    ordered = ("قهوة", 15.0, "اسبريسو") in written
+
+    print(f"    الترتيب داخل المحادثة: {'صحيح' if ordered else 'خطأ'}")
+
+    # مستخدم يرسل 20 رسالة مع حد أقصى 4 تحديثات: رسائله المنتظرة لا تشغل
+    # الأماكن، فتكتمل رسائل المحادثات الأخرى في الأماكن الثلاثة الباقية (دورتا كتابة)
+    others = 6
+    chatty = [(1, "كولا ٢٣")] * 20 + [(2 + i, "شاي ٥") for i in range(others)]
+    fair = await run_scenario(
+        chatty, 20 + others,
+        until=lambda: sum(1 for product, _, _ in written if product == "شاي") >= others,
+        concurrent_updates=PerChatUpdateProcessor(4),
+    )
+    print(f"    محادثات أخرى مع مستخدم كثير الرسائل: {fair:6.2f} s")
+
+    if not ordered or concurrent > args.write_latency * 3 or fair > args.write_latency * 3:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    asyncio.run(main())
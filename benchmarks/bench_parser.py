@@ -0,0 +1,110 @@
+"""
+قياس أداء تحليل أسطر المنتجات
+
+يقارن المحلل الحالي (utils/product_parser.py) بالتنفيذ السابق على رسائل
+كبيرة متعددة الأسطر، ويتحقق من تطابق النتائج قبل القياس.
+
+التشغيل:
+    python benchmarks/bench_parser.py [--lines 20000] [--repeat 5]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from utils.number_converter import convert_to_english_numbers
+from utils.product_parser import parse_product_line, parse_product_lines
+
+def legacy_convert_to_english_numbers(text: str) -> str:
+    """التنفيذ السابق: بناء النص حرفاً حرفاً"""
+    arabic_numbers = {'٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+                     '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+                     '.': '.', '٫': '.'}
+    result = ''
+    for char in text:
+        result += arabic_numbers.get(char, char)
+    return result
+
+def legacy_parse_product_line(line: str) -> tuple:
+    """التنفيذ السابق: تجربة float() على كل كلمة"""
+    line = ' '.join(line.split())
+    line = legacy_convert_to_english_numbers(line.strip())
+    if not line:
+        return None
+    parts = line.split()
+    price_index = -1
+    for i, part in enumerate(parts):
+        try:
+            float(part)
+            price_index = i
+            break
+        except ValueError:
+            continue
+    if price_index == -1:
+        return " ".join(parts), None, ""
+    product = " ".join(parts[:price_index])
+    price = float(parts[price_index])
+    notes = " ".join(parts[price_index + 1:])
+    return product.strip(), price, notes.strip()
+
+SAMPLE_LINES = [
+    "كولا ٢٣",
+    "شيبس ٢٥ حار 🌶",
+    "قهوة   ١٥   اسبريسو",
+    "عصير برتقال طبيعي 8.5 بارد جداً",
+    "شاي ٥",
+    "بسكويت بالشوكولاتة والبندق ١٢٫٥ علبة كبيرة",
+    "خبز",
+]
+
+def build_message(lines: int) -> str:
+    """بناء رسالة كبيرة متعددة الأسطر"""
+    return "\n".join(SAMPLE_LINES[i % len(SAMPLE_LINES)] for i in range(lines))
+
+def measure(func, repeat: int) -> float:
+    """أفضل زمن تنفيذ من عدة محاولات"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='قياس أداء تحليل أسطر المنتجات')
+    parser.add_argument('--lines', type=int, default=20000, help='عدد الأسطر في الرسالة')
+    parser.add_argument('--repeat', type=int, default=5, help='عدد مرات التكرار')
+    args = parser.parse_args()
+
+    message = build_message(args.lines)
+    lines = message.splitlines()
+
+    # التحقق من تطابق النتائج
+    for line in SAMPLE_LINES:
+        assert parse_product_line(line) == legacy_parse_product_line(line), line
+    assert convert_to_english_numbers(message) == legacy_convert_to_english_numbers(message)
+    assert [result for _, result in parse_product_lines(message)] == \
+        [legacy_parse_product_line(line) for line in lines]
+
+    results = [
+        ("convert_to_english_numbers (رسالة كاملة)",
+         measure(lambda: legacy_convert_to_english_numbers(message), args.repeat),
+         measure(lambda: convert_to_english_numbers(message), args.repeat)),
+        ("parse_product_line (كل الأسطر)",
+         measure(lambda: [legacy_parse_product_line(line) for line in lines], args.repeat),
+         measure(lambda: [parse_product_line(line) for line in lines], args.repeat)),
+        ("parse_product_lines (رسالة كاملة)",
+         measure(lambda: [legacy_parse_product_line(line) for line in message.splitlines()], args.repeat),
+         measure(lambda: parse_product_lines(message), args.repeat)),
+    ]
+
+    print(f"رسالة من {args.lines} سطر ({len(message)} حرف)")
+    print("-" * 70)
+    for name, legacy, current in results:
+        print(f"{name}")
+        print(f"    السابق: {legacy * 1000:9.2f} ms    الحالي: {current * 1000:9.2f} ms    التسريع: {legacy / current:5.1f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""
+فحص سريع لمحركات التخزين المحلية (SQLite و CSV)
+
+يكتب مشتريات بأسماء عربية حتى يتجاوز حجم ملف CSV عدة كتل قراءة
+(CSVBackend.TAIL_BLOCK_SIZE)، ويتحقق بعد كل دفعة من أن recent و iter_pages
+يعيدان نفس الصفوف في المحركين، بما في ذلك عندما تبدأ الكتلة في منتصف حرف عربي.
+
+التشغيل:
+    python benchmarks/check_storage.py [--rows 3000]
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+
+def check(condition: bool, message: str, failures: list) -> None:
+    if not condition:
+        failures.append(message)
+        print(f"    فشل: {message}")
+
+async def run_checks(rows: int, data_dir: str) -> list:
+    from database.storage import CSVBackend, SQLiteBackend
+
+    csv_backend = CSVBackend(os.path.join(data_dir, 'purchases.csv'))
+    sqlite_backend = SQLiteBackend(os.path.join(data_dir, 'purchases.sqlite3'))
+    failures: list = []
+
+    written = []
+    batch = max(1, rows // 6)
+    for start in range(0, rows, batch):
+        new_rows = [
+            ["2026/10/17", f"منتج عربي رقم {i} بالشوكولاتة", float(i % 90 + 10), "ملاحظة طويلة " * (i % 3)]
+            for i in range(start, min(rows, start + batch))
+        ]
+        await csv_backend.append(new_rows)
+        await sqlite_backend.append(new_rows)
+        written.extend(new_rows)
+
+        size = os.path.getsize(csv_backend.path)
+        print(f"{len(written)} صف، حجم ملف CSV {size / 1024:.0f} KB")
+        for limit in (1, 10, 250):
+            expected = [row[1] for row in written[-limit:]]
+            for backend in (csv_backend, sqlite_backend):
+                names = [row[1] for row in await backend.recent(limit)]
+                check(names == expected, f"{backend.name}.recent({limit}) عند {len(written)} صف", failures)
+
+    if os.path.getsize(csv_backend.path) <= CSVBackend.TAIL_BLOCK_SIZE:
+        failures.append("ملف CSV أصغر من كتلة قراءة واحدة، استخدم --rows أكبر")
+
+    for backend in (csv_backend, sqlite_backend):
+        count = 0
+        async for page in backend.iter_pages(page_size=500):
+            count += len(page)
+        check(count == len(written), f"{backend.name}.iter_pages أعاد {count} من {len(written)}", failures)
+
+    await csv_backend.close()
+    return failures
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='فحص محركات التخزين المحلية')
+    parser.add_argument('--rows', type=int, default=3000, help='عدد الصفوف المكتوبة')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='check-storage-') as data_dir:
+        failures = asyncio.run(run_checks(args.rows, data_dir))
+    if failures:
+        print(f"\n{len(failures)} فحص فاشل")
+        sys.exit(1)
+    print("\nجميع الفحوص ناجحة")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+بديل محلي لـ gspread (Client / Spreadsheet / Worksheet) في الذاكرة
+
+ينفذ الاستدعاءات التي يستخدمها database/sheets.py دون شبكة، مع زمن رد
+محاكى لكل طلب ورفض عشوائي بـ 429 (تجاوز الحصة) لاختبار مسار إعادة المحاولة.
+كل طلب يتم تسجيله في client.calls لمعرفة عدد الطلبات لكل عملية.
+
+الاستخدام:
+    client = FakeClient(latency=0.05, error_rate=0.01)
+    install(client)   # يستبدل عميل Google Sheets في database.sheets
+"""
+import json
+import random
+import re
+import threading
+import time
+from typing import List, Optional
+from gspread.exceptions import APIError, SpreadsheetNotFound, WorksheetNotFound
+
+class FakeResponse:
+    """استجابة HTTP بالحد الأدنى الذي تحتاجه APIError ومسار إعادة المحاولة"""
+
+    def __init__(self, status_code: int, message: str, retry_after: Optional[float] = None):
+        self.status_code = status_code
+        self.headers = {'Retry-After': str(retry_after)} if retry_after is not None else {}
+        self.text = json.dumps({"error": {"code": status_code, "message": message}})
+
+    def json(self) -> dict:
+        return json.loads(self.text)
+
+def _row_bounds(a1_range: str) -> tuple:
+    """(أول صف، آخر صف أو None) من نطاق مثل 'ورقة'!A5:D7 أو A5:D"""
+    cells = a1_range.rsplit('!', 1)[-1]
+    match = re.fullmatch(r"[A-Z]+(\d+)(?::[A-Z]+(\d*))?", cells)
+    if match is None:
+        raise ValueError(f"نطاق غير مدعوم: {a1_range}")
+    return int(match.group(1)), int(match.group(2)) if match.group(2) else None
+
+class FakeWorksheet:
+    """ورقة عمل في الذاكرة"""
+    _next_id = 0
+
+    def __init__(self, spreadsheet: "FakeSpreadsheet", title: str):
+        FakeWorksheet._next_id += 1
+        self.id = FakeWorksheet._next_id
+        self.title = title
+        self.spreadsheet = spreadsheet
+        self.client = spreadsheet.client
+        self.data: List[list] = []
+
+    def _request(self, name: str) -> None:
+        self.client._request(f"{self.title}.{name}")
+
+    def _rows(self, a1_range: str) -> List[list]:
+        start, end = _row_bounds(a1_range)
+        with self.client._lock:
+            return [list(row) for row in self.data[start - 1:end if end else None]]
+
+    def row_values(self, row: int) -> list:
+        self._request('row_values')
+        with self.client._lock:
+            return list(self.data[row - 1]) if row <= len(self.data) else []
+
+    def col_values(self, col: int) -> list:
+        self._request('col_values')
+        with self.client._lock:
+            return [row[col - 1] if len(row) >= col else '' for row in self.data]
+
+    def append_rows(self, rows: list, **kwargs) -> dict:
+        self._request('append_rows')
+        with self.client._lock:
+            start = len(self.data) + 1
+            self.data.extend(list(row) for row in rows)
+            end = len(self.data)
+        return {"updates": {"updatedRange": f"'{self.title}'!A{start}:D{end}", "updatedRows": len(rows)}}
+
+    def append_row(self, row: list, **kwargs) -> dict:
+        return self.append_rows([row], **kwargs)
+
+    def get(self, a1_range: str, **kwargs) -> List[list]:
+        self._request('get')
+        return self._rows(a1_range)
+
+    def batch_get(self, ranges: list, **kwargs) -> List[List[list]]:
+        self._request('batch_get')
+        return [self._rows(a1_range) for a1_range in ranges]
+
+    def get_all_values(self, **kwargs) -> List[list]:
+        self._request('get_all_values')
+        with self.client._lock:
+            return [list(row) for row in self.data]
+
+class FakeSpreadsheet:
+    """جدول بيانات في الذاكرة"""
+
+    def __init__(self, client: "FakeClient", title: str):
+        self.client = client
+        self.title = title
+        self.id = f"fake-{title}"
+        self._worksheets = [FakeWorksheet(self, "Sheet1")]
+
+    @property
+    def sheet1(self) -> FakeWorksheet:
+        self.client._request('sheet1')
+        return self._worksheets[0]
+
+    def worksheet(self, title: str) -> FakeWorksheet:
+        self.client._request('worksheet')
+        for worksheet in self._worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise WorksheetNotFound(title)
+
+    def worksheets(self) -> List[FakeWorksheet]:
+        self.client._request('worksheets')
+        return list(self._worksheets)
+
+    def add_worksheet(self, title: str, rows: int, cols: int, **kwargs) -> FakeWorksheet:
+        self.client._request('add_worksheet')
+        worksheet = FakeWorksheet(self, title)
+        self._worksheets.append(worksheet)
+        return worksheet
+
+    def batch_update(self, body: dict) -> dict:
+        """يدعم طلبات updateCells التي يرسلها _ensure_headers فقط"""
+        self.client._request('batch_update')
+        for request in body.get("requests", []):
+            update = request.get("updateCells")
+            if update is None:
+                continue
+            worksheet = next(w for w in self._worksheets if w.id == update["range"]["sheetId"])
+            with self.client._lock:
+                if "rows" not in update:
+                    worksheet.data = [[] for _ in worksheet.data]
+                    continue
+                start = update["range"].get("startRowIndex", 0)
+                for offset, row in enumerate(update["rows"]):
+                    values = [cell["userEnteredValue"]["stringValue"] for cell in row["values"]]
+                    while len(worksheet.data) <= start + offset:
+                        worksheet.data.append([])
+                    worksheet.data[start + offset] = values
+        return {}
+
+    def values_batch_get(self, ranges: list, params: Optional[dict] = None) -> dict:
+        self.client._request('values_batch_get')
+        value_ranges = []
+        for a1_range in ranges:
+            title = a1_range.rsplit('!', 1)[0].strip("'").replace("''", "'")
+            worksheet = next(w for w in self._worksheets if w.title == title)
+            value_ranges.append({"range": a1_range, "values": worksheet._rows(a1_range)})
+        return {"valueRanges": value_ranges}
+
+class FakeClient:
+    """
+    عميل gspread في الذاكرة
+
+    المعطيات:
+        latency (float): زمن الرد المحاكى لكل طلب بالثواني
+        error_rate (float): نسبة الطلبات التي ترفض بـ 429
+        retry_after (float): قيمة ترويسة Retry-After في رد 429 (None لعدم إرسالها)
+        seed (int): بذرة الأرقام العشوائية لتكرار نفس النتائج
+    """
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 retry_after: Optional[float] = None, seed: Optional[int] = None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.calls: List[str] = []
+        self.rejected = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._spreadsheets = {}
+
+    def _request(self, name: str) -> None:
+        """محاكاة طلب HTTP: الانتظار ثم الرفض بـ 429 أحياناً"""
+        with self._lock:
+            self.calls.append(name)
+            rejected = self.error_rate > 0 and self._random.random() < self.error_rate
+            if rejected:
+                self.rejected += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if rejected:
+            raise APIError(FakeResponse(429, "Quota exceeded", self.retry_after))
+
+    def create(self, title: str) -> FakeSpreadsheet:
+        spreadsheet = self._spreadsheets[title] = FakeSpreadsheet(self, title)
+        return spreadsheet
+
+    def open(self, title: str) -> FakeSpreadsheet:
+        self._request('open')
+        if title not in self._spreadsheets:
+            # مثل جدول بيانات حقيقي موجود مسبقاً
+            self.create(title)
+        return self._spreadsheets[title]
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        self._request('open_by_key')
+        for spreadsheet in self._spreadsheets.values():
+            if spreadsheet.id == key:
+                return spreadsheet
+        raise SpreadsheetNotFound(key)
+
+def install(client: FakeClient) -> None:
+    """
+    استخدام العميل الوهمي بدلاً من Google Sheets في database.sheets
+    """
+    from datetime import datetime
+    import database.sheets as sheets
+
+    def get_client():
+        return client, datetime.now()
+    get_client.cache_clear = lambda: None
+
+    sheets.get_google_sheets_client = get_client
+    sheets._spreadsheet_id = None
+    sheets.invalidate_worksheet_cache()
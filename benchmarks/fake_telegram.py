@@ -0,0 +1,76 @@
+"""
+بديل محلي لـ Telegram Bot API
+
+يستبدل طبقة HTTP في python-telegram-bot بحيث تعمل جميع استدعاءات البوت
+(getMe و sendMessage ...) محلياً دون شبكة، ويوفر دوال لبناء تحديثات صناعية.
+"""
+import json
+import asyncio
+from typing import Optional
+from telegram import Update
+from telegram.request import BaseRequest, RequestData
+
+# رمز بوت وهمي بالصيغة التي تقبلها المكتبة
+FAKE_TOKEN = "123456:FAKE-TOKEN"
+
+class FakeRequest(BaseRequest):
+    """
+    طبقة طلبات وهمية تسجل الرسائل المرسلة وترد بنجاح
+
+    المعطيات:
+        latency (float): زمن الرد المحاكى بالثواني
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.sent = []
+        self.calls = 0
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    async def do_request(self, url: str, method: str, request_data: Optional[RequestData] = None,
+                         read_timeout=None, write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        endpoint = url.rsplit("/", 1)[-1]
+        parameters = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "bot", "username": "purchase_bot"}
+        elif endpoint == "sendMessage":
+            self._message_id += 1
+            self.sent.append(parameters)
+            result = {
+                "message_id": self._message_id,
+                "date": 0,
+                "chat": {"id": parameters["chat_id"], "type": "private"},
+                "text": parameters.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+_update_id = 0
+
+def make_update(chat_id: int, text: str, bot=None) -> Update:
+    """
+    بناء تحديث رسالة نصية صناعي (الأوامر مثل /s يتم تمييزها تلقائياً)
+    """
+    global _update_id
+    _update_id += 1
+    message = {
+        "message_id": _update_id,
+        "date": 0,
+        "chat": {"id": chat_id, "type": "private"},
+        "from": {"id": chat_id, "is_bot": False, "first_name": f"user{chat_id}"},
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return Update.de_json({"update_id": _update_id, "message": message}, bot)
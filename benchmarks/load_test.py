@@ -0,0 +1,284 @@
+"""
+اختبار تحميل شامل بمحادثات تيليجرام صناعية
+
+يحاكي آلاف المستخدمين يرسلون محادثات كاملة عبر معالجات run.py الحقيقية
+(إضافة سريعة، اسم ← سعر ← ملاحظات، التخطي بـ /s، الضغط على زر اقتراح،
+قوائم متعددة الأسطر) بمعدل رسائل محدد في الثانية. Bot API و Google Sheets
+محليان (benchmarks/fake_telegram.py و benchmarks/fake_gspread.py).
+
+زمن الرسالة من طرف إلى طرف: من وضع التحديث في طابور التطبيق حتى إرسال
+الرد (sendMessage) إلى نفس المحادثة. كل مستخدم ينتظر الرد ثم مدة تفكير
+قبل الرسالة التالية، كما في الاستخدام الحقيقي. حدود إرسال تيليجرام
+(OUTGOING_GLOBAL_PER_SECOND و OUTGOING_CHAT_INTERVAL) تبقى مفعلة لأنها جزء
+من زمن الرد الفعلي، ويمكن تعطيلها بـ --no-send-limits لقياس البوت وحده.
+
+في النهاية يتم عرض النسب المئوية لزمن الاستجابة، وعدد طلبات Google Sheets
+لكل عملية شراء، وأقصى استهلاك للذاكرة، لتقدير حجم الخادم المطلوب.
+
+التشغيل:
+    python benchmarks/load_test.py [--users 1000] [--rate 25] [--think-time 2]
+                                   [--sheets-latency-ms 50] [--error-rate 0.01]
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import tracemalloc
+from collections import Counter, defaultdict
+from typing import Dict, List, NamedTuple
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+
+from run_benchmarks import configure_environment, percentile, format_seconds
+
+PRODUCTS = [
+    ("كولا", 23), ("شيبس", 25), ("قهوة", 15), ("شاي", 5), ("خبز", 3),
+    ("عصير برتقال", 8.5), ("حليب", 12), ("بسكويت بالشوكولاتة", 12.5), ("ماء", 2), ("جبنة", 40),
+]
+NOTES = ["حار", "اسبريسو", "علبة كبيرة", "بارد", "عرض خاص"]
+
+# أنواع المحادثات ونسبها
+CONVERSATION_WEIGHTS = {
+    'quick': 35,        # "كولا ٢٣"
+    'quick_notes': 15,  # "شيبس ٢٥ حار"
+    'flow': 20,         # "قهوة" ← "15" ← "اسبريسو"
+    'skip': 10,         # "قهوة" ← "15" ← "/s"
+    'suggestion': 10,   # "قهوة" ← زر "قهوة 15"
+    'multi_line': 10,   # عدة أسطر في رسالة واحدة
+}
+
+# مهلة انتظار رد البوت على رسالة واحدة
+REPLY_TIMEOUT = 30
+
+ARABIC_DIGITS = str.maketrans("0123456789.", "٠١٢٣٤٥٦٧٨٩٫")
+
+class Conversation(NamedTuple):
+    """محادثة صناعية: نوعها ورسائلها وعدد المشتريات المتوقعة"""
+    kind: str
+    messages: List[str]
+    purchases: int
+
+def format_price(price: float, rng: random.Random) -> str:
+    text = f"{price:g}"
+    return text.translate(ARABIC_DIGITS) if rng.random() < 0.5 else text
+
+def build_conversation(rng: random.Random) -> Conversation:
+    """بناء محادثة عشوائية حسب CONVERSATION_WEIGHTS"""
+    kind = rng.choices(list(CONVERSATION_WEIGHTS), weights=list(CONVERSATION_WEIGHTS.values()))[0]
+    name, price = rng.choice(PRODUCTS)
+    note = rng.choice(NOTES)
+    if kind == 'quick':
+        return Conversation(kind, [f"{name} {format_price(price, rng)}"], 1)
+    if kind == 'quick_notes':
+        return Conversation(kind, [f"{name} {format_price(price, rng)} {note}"], 1)
+    if kind == 'flow':
+        return Conversation(kind, [name, format_price(price, rng), note], 1)
+    if kind == 'skip':
+        return Conversation(kind, [name, format_price(price, rng), "/s"], 1)
+    if kind == 'suggestion':
+        return Conversation(kind, [name, f"{name} {price:g}"], 1)
+    lines = [f"{n} {format_price(p, rng)}" for n, p in rng.sample(PRODUCTS, rng.randint(2, 6))]
+    return Conversation(kind, ["\n".join(lines)], len(lines))
+
+class Pacer:
+    """توزيع الرسائل على المعدل المطلوب (رسالة كل 1/rate ثانية على الأكثر)"""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0.0
+        self._next = 0.0
+
+    async def wait(self) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+class LoadTest:
+    """تشغيل المحادثات وجمع النتائج"""
+
+    def __init__(self, application, request, args):
+        self.application = application
+        self.args = args
+        self.pacer = Pacer(args.rate)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts = 0
+        self.messages = 0
+        self.expected_purchases = 0
+        self.conversations = Counter()
+        self._waiting: Dict[int, asyncio.Future] = {}
+        request.on_send = self._on_send
+
+    def _on_send(self, chat_id: int) -> None:
+        future = self._waiting.pop(chat_id, None)
+        if future is not None and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def send(self, chat_id: int, text: str) -> float:
+        """
+        إرسال رسالة وانتظار رد البوت
+
+        تعيد:
+            زمن الرد بالثواني
+        """
+        from fake_telegram import make_update
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[chat_id] = future
+        start = time.perf_counter()
+        await self.application.update_queue.put(make_update(chat_id, text, self.application.bot))
+        self.messages += 1
+        return await asyncio.wait_for(future, REPLY_TIMEOUT) - start
+
+    async def user(self, chat_id: int, rng: random.Random) -> None:
+        """مستخدم واحد يجري عدة محادثات"""
+        # بدء المستخدمين في أوقات متفرقة
+        await asyncio.sleep(rng.uniform(0, self.args.think_time))
+        for _ in range(self.args.conversations):
+            conversation = build_conversation(rng)
+            self.conversations[conversation.kind] += 1
+            self.expected_purchases += conversation.purchases
+            for text in conversation.messages:
+                await self.pacer.wait()
+                try:
+                    latency = await self.send(chat_id, text)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    self._waiting.pop(chat_id, None)
+                    return
+                self.latencies[conversation.kind].append(latency)
+                # مدة التفكير قبل الرسالة التالية
+                await asyncio.sleep(rng.uniform(0.5, 1.5) * self.args.think_time)
+
+async def run_load_test(args) -> None:
+    import run
+    import database.sheets as sheets
+    from fake_gspread import FakeClient, install
+    from fake_telegram import FAKE_TOKEN, FakeRequest
+
+    class ObservedRequest(FakeRequest):
+        """طبقة طلبات وهمية تبلغ عن كل رسالة مرسلة"""
+        on_send = None
+
+        async def do_request(self, url, method, request_data=None, **kwargs):
+            result = await super().do_request(url, method, request_data, **kwargs)
+            if url.endswith("/sendMessage") and self.on_send is not None:
+                self.on_send(int(request_data.parameters["chat_id"]))
+            return result
+
+    client = FakeClient(latency=args.sheets_latency_ms / 1000, error_rate=args.error_rate, seed=args.seed)
+    install(client)
+    worksheet = client.create(sheets.SPREADSHEET_NAME)._worksheets[0]
+    worksheet.data = [list(sheets.HEADERS)] + [
+        [f"2026/01/{i % 28 + 1:02d}", PRODUCTS[i % len(PRODUCTS)][0], str(PRODUCTS[i % len(PRODUCTS)][1]), ""]
+        for i in range(args.rows)
+    ]
+    storage = sheets.get_storage()
+    if storage.name == 'sheets':
+        initial_rows = len(worksheet.data)
+    else:
+        initial_rows = len(await storage.all_rows())
+
+    request = ObservedRequest(args.api_latency_ms / 1000)
+    application = run.build_application(FAKE_TOKEN, request=request)
+    test = LoadTest(application, request, args)
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    await application.initialize()
+    await application.post_init(application)
+    await application.start()
+    client.calls.clear()
+
+    print(f"{args.users} مستخدم، {args.conversations} محادثة لكل مستخدم، المعدل المستهدف {args.rate:g} رسالة/ث")
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        test.user(100000 + i, random.Random(rng.random())) for i in range(args.users)
+    ))
+    elapsed = time.perf_counter() - start
+
+    # إرسال المشتريات المتبقية في صندوق الصادر قبل عد الطلبات
+    flush_start = time.perf_counter()
+    await storage.flush()
+    flush_elapsed = time.perf_counter() - flush_start
+
+    await application.stop()
+    await application.post_stop(application)
+    await application.shutdown()
+    await application.post_shutdown(application)
+
+    # النتائج
+    if storage.name == 'sheets':
+        written = len(worksheet.data) - initial_rows
+    else:
+        written = len(await storage.all_rows()) - initial_rows
+    all_latencies = sorted(latency for values in test.latencies.values() for latency in values)
+    print(f"\nالرسائل: {test.messages} خلال {elapsed:.1f} ث ({test.messages / elapsed:.1f} رسالة/ث)، "
+          f"بدون رد: {test.timeouts}")
+    print("المحادثات: " + "، ".join(f"{kind}={count}" for kind, count in test.conversations.most_common()))
+
+    print(f"\n{'زمن الاستجابة':<16}{'العدد':>8}{'p50':>12}{'p90':>12}{'p99':>12}{'الأقصى':>12}")
+    rows = [('الكل', all_latencies)] + [(kind, sorted(values)) for kind, values in sorted(test.latencies.items())]
+    for name, values in rows:
+        if values:
+            print(f"{name:<16}{len(values):8d}{format_seconds(percentile(values, 0.5)):>12}"
+                  f"{format_seconds(percentile(values, 0.9)):>12}{format_seconds(percentile(values, 0.99)):>12}"
+                  f"{format_seconds(values[-1]):>12}")
+
+    calls = Counter(name.rsplit('.', 1)[-1] for name in client.calls)
+    print(f"\nالمشتريات المكتوبة ({storage.name}): {written} من {test.expected_purchases} "
+          f"(إفراغ صندوق الصادر في النهاية: {flush_elapsed:.2f} ث)")
+    if written:
+        print(f"طلبات Google Sheets لكل عملية شراء: {len(client.calls) / written:.3f} "
+              f"(الإجمالي {len(client.calls)}، منها {client.rejected} رفض 429)")
+        print("    " + "، ".join(f"{name}={count}" for name, count in calls.most_common()))
+    print(f"طلبات Bot API: {request.calls}، الرسائل المرسلة: {len(request.sent)}")
+
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss بالكيلوبايت على لينكس وبالبايت على macOS
+    unit = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    print(f"أقصى استهلاك للذاكرة (RSS): {rss_after / unit:.1f} MB (قبل الاختبار {rss_before / unit:.1f} MB)")
+    if tracemalloc.is_tracing():
+        print(f"أقصى ذاكرة مخصصة من بايثون (tracemalloc): {tracemalloc.get_traced_memory()[1] / 1e6:.1f} MB")
+
+    if test.timeouts or written != test.expected_purchases:
+        sys.exit(1)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='اختبار تحميل بمحادثات تيليجرام صناعية')
+    parser.add_argument('--users', type=int, default=1000, help='عدد المستخدمين')
+    parser.add_argument('--conversations', type=int, default=1, help='عدد المحادثات لكل مستخدم')
+    parser.add_argument('--rate', type=float, default=25, help='الحد الأقصى للرسائل في الثانية (0 بدون حد)')
+    parser.add_argument('--think-time', type=float, default=2, help='متوسط مدة التفكير بين رسائل المستخدم بالثواني')
+    parser.add_argument('--sheets-latency-ms', type=float, default=50, help='زمن رد Google Sheets المحاكى')
+    parser.add_argument('--api-latency-ms', type=float, default=20, help='زمن رد Bot API المحاكى')
+    parser.add_argument('--error-rate', type=float, default=0.01, help='نسبة طلبات Google Sheets المرفوضة بـ 429')
+    parser.add_argument('--rows', type=int, default=1000, help='عدد الصفوف الموجودة في الجدول قبل الاختبار')
+    parser.add_argument('--seed', type=int, default=1, help='بذرة توليد المحادثات')
+    parser.add_argument('--no-send-limits', action='store_true',
+                        help='تعطيل حدود إرسال تيليجرام (رسالة/ث لكل محادثة و30 إجمالاً)')
+    parser.add_argument('--tracemalloc', action='store_true',
+                        help='قياس ذاكرة بايثون بدقة (يبطئ التنفيذ)')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='load-test-')
+    configure_environment(data_dir)
+    os.environ['METRICS_PORT'] = '0'
+    if args.no_send_limits:
+        os.environ['OUTGOING_GLOBAL_PER_SECOND'] = '0'
+        os.environ['OUTGOING_CHAT_INTERVAL'] = '0'
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger().setLevel(logging.CRITICAL)
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    asyncio.run(run_load_test(args))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,284 @@
+"""
+مجموعة قياسات أداء المسار الرئيسي
+
+تقيس تحليل الأسطر وتحويل الأرقام، والإضافة والقراءة عبر database/sheets.py
+الحقيقي مع عميل gspread وهمي في الذاكرة (benchmarks/fake_gspread.py) بزمن
+رد محاكى ونسبة رفض 429، فتعمل بدون شبكة وبدون ملف credentials.json.
+عمليات Google Sheets تقاس مرتين: بالإعدادات الافتراضية (صندوق الصادر
+والنسخة المحلية) وفي الوضع المباشر [direct] حيث ينتظر كل استدعاء الجدول.
+لكل قياس يتم عرض عدد العمليات في الثانية و p50 و p99.
+
+يتم حفظ النتائج في benchmarks/baseline.json بـ --save-baseline، وعند كل تشغيل
+تتم المقارنة بها: إذا انخفض عدد العمليات في الثانية أو ارتفع p50 بأكثر من
+--tolerance ينتهي البرنامج برمز 1 (لاستخدامه قبل النشر). الأرقام تعتمد على
+الجهاز، لذلك يجب إنشاء خط الأساس على نفس الجهاز الذي تتم عليه المقارنة.
+
+التشغيل:
+    python benchmarks/run_benchmarks.py [--latency-ms 20] [--error-rate 0.02]
+                                        [--iterations 100] [--save-baseline]
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCHMARKS_DIR, '..'))
+
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+# عدد تكرارات الدوال المحلية لكل تكرار من الدوال التي تستدعي Google Sheets
+LOCAL_ITERATIONS_FACTOR = 200
+
+# في الوضع المباشر (بدون صندوق الصادر والنسخة المحلية) كل استدعاء ينتظر
+# Google Sheets ومهلة تجميع الدفعة، لذلك يتم تقليل عدد التكرارات
+DIRECT_ITERATIONS_DIVISOR = 5
+
+SAMPLE_LINES = [
+    "كولا ٢٣",
+    "شيبس ٢٥ حار 🌶",
+    "قهوة   ١٥   اسبريسو",
+    "عصير برتقال طبيعي 8.5 بارد جداً",
+    "شاي ٥",
+    "بسكويت بالشوكولاتة والبندق ١٢٫٥ علبة كبيرة",
+    "خبز",
+]
+
+def configure_environment(data_dir: str) -> None:
+    """
+    إعداد البيئة قبل استيراد src.config
+
+    جميع الملفات المحلية في مجلد مؤقت (حتى لا يتم إرسال صندوق الصادر الحقيقي
+    إلى الجدول الوهمي)، ومحددات المعدل مفتوحة لأن الحصة ليست ما نقيسه.
+    """
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'OUTBOX_PATH': os.path.join(data_dir, 'outbox.sqlite3'),
+        'MIRROR_PATH': os.path.join(data_dir, 'mirror.sqlite3'),
+        'AGGREGATES_PATH': os.path.join(data_dir, 'aggregates.sqlite3'),
+        'SEARCH_INDEX_PATH': os.path.join(data_dir, 'search.sqlite3'),
+        'PROFILE_DIR': os.path.join(data_dir, 'profiles'),
+        'PROFILE_SAMPLE_RATE': '0',
+        'PROFILE_CHAT_ID': '',
+        'SHEETS_READS_PER_MINUTE': '1000000000',
+        'SHEETS_WRITES_PER_MINUTE': '1000000000',
+        'SHEETS_RATE_BURST': '1000000',
+        'SHEETS_BACKOFF_BASE': '0.01',
+        'SHEETS_BACKOFF_MAX': '0.05',
+        'SHEETS_MAX_RETRIES': '10',
+    })
+
+def percentile(sorted_values: list, q: float) -> float:
+    """النسبة المئوية بطريقة أقرب رتبة"""
+    index = max(0, min(len(sorted_values) - 1, int(round(q * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: list, elapsed: float) -> dict:
+    """عدد العمليات في الثانية و p50 و p99 بالثواني"""
+    latencies = sorted(latencies)
+    return {
+        'iterations': len(latencies),
+        'ops_per_sec': len(latencies) / elapsed if elapsed > 0 else float('inf'),
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+    }
+
+def best(summaries: list) -> dict:
+    """أفضل محاولة (الأقل تأثراً بالضوضاء من الأجهزة والعمليات الأخرى)"""
+    return max(summaries, key=lambda summary: summary['ops_per_sec'])
+
+def measure_sync(func, iterations: int, repeat: int = 1) -> dict:
+    """قياس دالة متزامنة (كل استدعاء على حدة)"""
+    for i in range(min(100, iterations)):
+        func(i)
+    clock = time.perf_counter
+    summaries = []
+    for _ in range(repeat):
+        latencies = []
+        start = clock()
+        for i in range(iterations):
+            call_start = clock()
+            func(i)
+            latencies.append(clock() - call_start)
+        summaries.append(summarize(latencies, clock() - start))
+    return best(summaries)
+
+async def measure_async(func, iterations: int, repeat: int = 1, warmup: int = 3) -> dict:
+    """قياس دالة غير متزامنة (الاستدعاءات متتالية)"""
+    for i in range(warmup):
+        await func(-1 - i)
+    clock = time.perf_counter
+    summaries = []
+    for _ in range(repeat):
+        latencies = []
+        start = clock()
+        for i in range(iterations):
+            call_start = clock()
+            await func(i)
+            latencies.append(clock() - call_start)
+        summaries.append(summarize(latencies, clock() - start))
+    return best(summaries)
+
+async def run_suite(args) -> dict:
+    """تشغيل جميع القياسات"""
+    from fake_gspread import FakeClient, install
+    from utils.number_converter import convert_to_english_numbers
+    from utils.product_parser import parse_product_line
+    import database.sheets as sheets
+
+    client = FakeClient(latency=args.latency_ms / 1000, error_rate=args.error_rate, seed=args.seed)
+    install(client)
+
+    # جدول بحجم واقعي قبل القياس
+    spreadsheet = client.create(sheets.SPREADSHEET_NAME)
+    worksheet = spreadsheet._worksheets[0]
+    worksheet.data = [list(sheets.HEADERS)] + [
+        [f"2026/01/{i % 28 + 1:02d}", f"منتج {i % 500}", str(i % 90 + 10), ""] for i in range(args.rows)
+    ]
+
+    local_iterations = args.iterations * LOCAL_ITERATIONS_FACTOR
+    message = "\n".join(SAMPLE_LINES * 10)
+    batch = [(f"منتج {i}", 10 + i, "") for i in range(10)]
+
+    async def add_one(i):
+        await sheets.add_to_sheets(f"منتج {i}", 10 + i % 50, "")
+
+    async def add_many(i):
+        await sheets.add_multiple_to_sheets(batch)
+
+    async def get_recent(i):
+        await sheets.get_products(10)
+
+    results = {
+        'parse_product_line': measure_sync(
+            lambda i: parse_product_line(SAMPLE_LINES[i % len(SAMPLE_LINES)]), local_iterations, args.repeat),
+        'convert_to_english_numbers': measure_sync(
+            lambda i: convert_to_english_numbers(message), local_iterations, args.repeat),
+        'add_to_sheets': await measure_async(add_one, args.iterations, args.repeat),
+        'add_multiple_to_sheets': await measure_async(add_many, args.iterations, args.repeat),
+    }
+    # إرسال ما تراكم في صندوق الصادر حتى تقيس القراءة جدولاً مكتملاً
+    await sheets.flush_outbox()
+    results['get_products'] = await measure_async(get_recent, args.iterations, args.repeat)
+
+    # نفس العمليات مع الكتابة والقراءة مباشرة من Google Sheets (زمن الرد ورفض 429)،
+    # مرة واحدة لأن زمنها يحدده زمن الرد المحاكى وليس ضوضاء الجهاز
+    sheets.OUTBOX_ENABLED = False
+    sheets.MIRROR_ENABLED = False
+    direct_iterations = max(1, args.iterations // DIRECT_ITERATIONS_DIVISOR)
+    results['add_to_sheets[direct]'] = await measure_async(add_one, direct_iterations)
+    results['add_multiple_to_sheets[direct]'] = await measure_async(add_many, direct_iterations)
+    results['get_products[direct]'] = await measure_async(get_recent, direct_iterations)
+
+    await sheets.close_outbox_sync()
+    await sheets.close_batch_writer()
+    sheets.shutdown_sheets_executor()
+    print(f"طلبات Google Sheets الوهمية: {len(client.calls)} (منها {client.rejected} رفض 429)")
+    return results
+
+def format_seconds(value: float) -> str:
+    if value < 0.001:
+        return f"{value * 1e6:8.1f}us"
+    return f"{value * 1000:8.2f}ms"
+
+def print_results(results: dict) -> None:
+    print(f"{'القياس':<32}{'عملية/ث':>12}{'p50':>12}{'p99':>12}{'العدد':>9}")
+    print("-" * 77)
+    for name, result in results.items():
+        print(
+            f"{name:<32}{result['ops_per_sec']:12.1f}{format_seconds(result['p50']):>12}"
+            f"{format_seconds(result['p99']):>12}{result['iterations']:9d}"
+        )
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    مقارنة النتائج بخط الأساس
+
+    تعيد:
+        قائمة رسائل التراجع (فارغة إذا لم يوجد تراجع)
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline['results'].get(name)
+        if expected is None:
+            continue
+        if result['ops_per_sec'] < expected['ops_per_sec'] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result['ops_per_sec']:.1f} عملية/ث بدلاً من {expected['ops_per_sec']:.1f}"
+            )
+        if result['p50'] > expected['p50'] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p50 {format_seconds(result['p50']).strip()} بدلاً من {format_seconds(expected['p50']).strip()}"
+            )
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='قياسات أداء المسار الرئيسي مع Google Sheets وهمي')
+    parser.add_argument('--latency-ms', type=float, default=20, help='زمن رد Google Sheets المحاكى لكل طلب')
+    parser.add_argument('--error-rate', type=float, default=0.02, help='نسبة الطلبات المرفوضة بـ 429')
+    parser.add_argument('--rows', type=int, default=5000, help='عدد الصفوف الموجودة في الجدول قبل القياس')
+    parser.add_argument('--iterations', type=int, default=100, help='عدد استدعاءات دوال Google Sheets')
+    parser.add_argument('--repeat', type=int, default=3, help='عدد المحاولات لكل قياس (تؤخذ الأفضل)')
+    parser.add_argument('--seed', type=int, default=1, help='بذرة اختيار الطلبات المرفوضة')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='مسار ملف خط الأساس')
+    parser.add_argument('--save-baseline', action='store_true', help='حفظ النتائج كخط أساس جديد')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='نسبة التراجع المسموحة قبل الفشل')
+    parser.add_argument('--json', dest='json_path', default=None, help='حفظ النتائج بصيغة JSON في هذا المسار')
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='bench-')
+    configure_environment(data_dir)
+    # أخطاء 429 المحاكاة متوقعة وتتم إعادة محاولتها، فلا داعي لعرض سجلاتها
+    logging.basicConfig(level=logging.CRITICAL)
+    logging.getLogger().setLevel(logging.CRITICAL)
+
+    scenario = {
+        'latency_ms': args.latency_ms,
+        'error_rate': args.error_rate,
+        'rows': args.rows,
+        'iterations': args.iterations,
+    }
+    results = asyncio.run(run_suite(args))
+    report = {
+        'scenario': scenario,
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'results': results,
+    }
+    print_results(results)
+
+    if args.json_path:
+        with open(args.json_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"\nتم حفظ خط الأساس في {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("\nلا يوجد خط أساس للمقارنة (استخدم --save-baseline)")
+        return
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('scenario') != scenario:
+        print(f"\nتم تخطي المقارنة: إعدادات خط الأساس مختلفة {baseline.get('scenario')}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\nتراجع في الأداء (أكثر من {args.tolerance:.0%}):")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+    print(f"\nلا يوجد تراجع مقارنة بخط الأساس (السماحية {args.tolerance:.0%})")
+
+if __name__ == '__main__':
+    main()
@@ -3,26 +3,27 @@
 """
 import os
 import sys
+import json
+import time
 import argparse
 import logging
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from utils.logging_setup import setup_logging
+
+# بداية التشغيل لتقرير --timings
+STARTED_AT = time.perf_counter()
 
 # إعداد التسجيل
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler('app.log', encoding='utf-8')
-    ]
-)
+setup_logging('app.log')
 logger = logging.getLogger(__name__)
 
 def setup_argparse():
     """إعداد معالج الأوامر"""
     parser = argparse.ArgumentParser(description='أداة تسجيل المشتريات في Google Sheets')
+    parser.add_argument('--timings', action='store_true',
+                        help='عرض زمن البدء والمصادقة وطلبات Google Sheets بعد تنفيذ الأمر')
     subparsers = parser.add_subparsers(dest='command', help='الأوامر المتاحة')
 
     # أمر إضافة منتج
@@ -34,13 +35,66 @@ def setup_argparse():
     # أمر إضافة عدة منتجات من ملف
     bulk_parser = subparsers.add_parser('add-bulk', help='إضافة عدة منتجات من ملف')
     bulk_parser.add_argument('file', help='مسار ملف المنتجات')
+    bulk_parser.add_argument('--chunk-size', type=int, default=500, help='عدد المنتجات في كل دفعة')
+    bulk_parser.add_argument('--checkpoint', default=None,
+                             help='مسار ملف نقطة الاستئناف (افتراضي: <الملف>.checkpoint)')
+    bulk_parser.add_argument('--restart', action='store_true',
+                             help='تجاهل نقطة الاستئناف والبدء من أول الملف')
 
     # أمر عرض المنتجات
     list_parser = subparsers.add_parser('list', help='عرض المنتجات')
     list_parser.add_argument('--limit', type=int, default=10, help='عدد المنتجات للعرض')
+    list_parser.add_argument('--max-age', type=float, default=None,
+                             help='أقصى عمر للنسخة المحلية بالثواني (0 لإجبار المزامنة)')
+
+    # أمر عرض حالة صندوق الصادر
+    subparsers.add_parser('status', help='عرض حالة صندوق الصادر المحلي')
+
+    # أمر تقرير المصروفات
+    report_parser = subparsers.add_parser('report', help='عرض تقرير المصروفات')
+    report_parser.add_argument('--limit', type=int, default=5, help='عدد الفترات والمنتجات في كل قسم')
+    report_parser.add_argument('--rebuild', action='store_true',
+                               help='إعادة بناء الإحصائيات من Google Sheets قبل العرض')
+
+    # أمر البحث في المشتريات
+    find_parser = subparsers.add_parser('find', help='البحث في أسماء المنتجات والملاحظات')
+    find_parser.add_argument('query', nargs='*', help='نص البحث')
+    find_parser.add_argument('--limit', type=int, default=20, help='الحد الأقصى لعدد النتائج')
+    find_parser.add_argument('--rebuild', action='store_true',
+                             help='إعادة بناء فهرس البحث من Google Sheets قبل البحث')
+
+    # أمر تصدير السجل الكامل
+    export_parser = subparsers.add_parser('export', help='تصدير المشتريات إلى CSV أو JSON Lines')
+    export_parser.add_argument('--format', choices=['csv', 'jsonl'], default='csv', help='صيغة الملف')
+    export_parser.add_argument('--output', '-o', default='-', help='مسار الملف (افتراضي: المخرج القياسي)')
+    export_parser.add_argument('--from', dest='date_from', type=parse_date_argument, default=None,
+                               help='أول تاريخ (YYYY-MM-DD)')
+    export_parser.add_argument('--to', dest='date_to', type=parse_date_argument, default=None,
+                               help='آخر تاريخ (YYYY-MM-DD)')
+    export_parser.add_argument('--page-size', type=int, default=None, help='عدد الصفوف في كل صفحة قراءة')
+
+    # أمر عرض مقاييس البوت
+    stats_parser = subparsers.add_parser('stats', help='عرض مقاييس الأداء من البوت قيد التشغيل')
+    stats_parser.add_argument('--url', default=None,
+                              help='عنوان خادم المقاييس (افتراضي: http://METRICS_HOST:METRICS_PORT)')
+    stats_parser.add_argument('--raw', action='store_true', help='عرض المقاييس بتنسيق Prometheus كما هي')
+
+    # أمر تلخيص ملفات تحليل الأداء
+    profile_parser = subparsers.add_parser('profile', help='تلخيص ملفات تحليل أداء التحديثات حسب الدوال الأبطأ')
+    profile_parser.add_argument('--dir', default=None, help='مجلد ملفات التحليل (افتراضي: PROFILE_DIR)')
+    profile_parser.add_argument('--limit', type=int, default=20, help='عدد الدوال المعروضة')
+    profile_parser.add_argument('--chat', type=int, default=None, help='تحليلات محادثة واحدة فقط')
 
     return parser
 
+def parse_date_argument(value: str):
+    """تحويل تاريخ من سطر الأوامر (YYYY-MM-DD أو YYYY/MM/DD)"""
+    from database.aggregates import parse_date
+    day = parse_date(value)
+    if day is None:
+        raise argparse.ArgumentTypeError(f"تاريخ غير صالح: {value}")
+    return day
+
 async def add_product(product: str, price: float, notes: str = '') -> bool:
     """إضافة منتج جديد"""
     from database.sheets import add_to_sheets
@@ -60,43 +114,127 @@ async def add_product(product: str, price: float, notes: str = '') -> bool:
         logger.error(f"خطأ في إضافة المنتج: {str(e)}")
         return False
 
-async def add_bulk_products(file_path: str) -> bool:
-    """إضافة عدة منتجات من ملف"""
+def iter_file_lines(file_path: str, start_offset: int = 0):
+    """
+    قراءة الملف سطراً سطراً دون تحميله كاملاً في الذاكرة
+
+    تعيد (مولد):
+        أزواج (موضع نهاية السطر بالبايت، نص السطر)
+    """
+    with open(file_path, 'rb') as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for raw_line in f:
+            offset += len(raw_line)
+            line = raw_line.decode('utf-8').strip()
+            if offset == len(raw_line):
+                line = line.lstrip('\ufeff')
+            yield offset, line
+
+def iter_product_chunks(file_path: str, chunk_size: int, start_offset: int = 0):
+    """
+    تحليل أسطر الملف وتجميعها في دفعات ثابتة الحجم
+
+    تعيد (مولد):
+        أزواج (موضع نهاية آخر سطر في الدفعة، قائمة المنتجات)
+    """
+    from utils.product_parser import parse_product_line
+    chunk = []
+    offset = start_offset
+    for offset, line in iter_file_lines(file_path, start_offset):
+        if not line:
+            continue
+        result = parse_product_line(line)
+        if not result or result[1] is None:
+            logger.warning(f"تم تجاهل السطر (لم يتم العثور على السعر): {line}")
+            continue
+        chunk.append(result)
+        if len(chunk) >= chunk_size:
+            yield offset, chunk
+            chunk = []
+    if chunk:
+        yield offset, chunk
+
+def load_checkpoint(checkpoint_path: str, file_path: str) -> dict:
+    """
+    قراءة ملف نقطة الاستئناف إذا كان يخص نفس الملف
+    """
+    if not os.path.exists(checkpoint_path):
+        return {}
+    try:
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"تعذرت قراءة ملف نقطة الاستئناف: {str(e)}")
+        return {}
+    if checkpoint.get('file') != os.path.abspath(file_path) or \
+            checkpoint.get('offset', 0) > os.path.getsize(file_path):
+        logger.warning("ملف نقطة الاستئناف لا يخص هذا الملف، سيتم البدء من البداية")
+        return {}
+    return checkpoint
+
+def save_checkpoint(checkpoint_path: str, checkpoint: dict) -> None:
+    """
+    حفظ نقطة الاستئناف بشكل ذري (كتابة ملف مؤقت ثم استبداله)
+    """
+    temp_path = checkpoint_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, checkpoint_path)
+
+async def add_bulk_products(file_path: str, chunk_size: int = 500,
+                            checkpoint_path: str = None, restart: bool = False) -> bool:
+    """
+    إضافة عدة منتجات من ملف
+
+    تتم قراءة الملف بشكل متدفق وإرسال المنتجات على دفعات بحجم chunk_size.
+    بعد كل دفعة ناجحة يتم حفظ موضع القراءة في ملف نقطة الاستئناف، فإذا توقف
+    الاستيراد يكمل التشغيل التالي من حيث توقف دون تكرار الصفوف.
+    """
     from database.sheets import add_multiple_to_sheets
+    checkpoint_path = checkpoint_path or file_path + '.checkpoint'
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            products = []
-            for line in f:
-                line = line.strip()
-                if line:
-                    parts = line.split()
-                    if len(parts) >= 2:
-                        product = parts[0]
-                        price = float(parts[1])
-                        notes = ' '.join(parts[2:]) if len(parts) > 2 else ''
-                        products.append((product, price, notes))
+        checkpoint = {} if restart else load_checkpoint(checkpoint_path, file_path)
+        offset = checkpoint.get('offset', 0)
+        total_added = checkpoint.get('added', 0)
+        if offset:
+            logger.info(f"استئناف الاستيراد من الموضع {offset} (تمت إضافة {total_added} منتج سابقاً)")
 
-        if products:
+        for offset, products in iter_product_chunks(file_path, chunk_size, offset):
             success_count, errors = await add_multiple_to_sheets(products)
-            if errors:
-                for error in errors:
-                    logger.error(error)
-            if success_count > 0:
-                logger.info(f"تم إضافة {success_count} منتج")
-                return True
-        
+            for error in errors:
+                logger.error(error)
+            total_added += success_count
+            save_checkpoint(checkpoint_path, {
+                'file': os.path.abspath(file_path),
+                'offset': offset,
+                'added': total_added,
+            })
+            logger.info(f"تمت إضافة {total_added} منتج حتى الآن")
+
+        # اكتمل الاستيراد
+        if os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+        if total_added > 0:
+            logger.info(f"تم إضافة {total_added} منتج")
+            return True
+
         logger.error("لم يتم إضافة أي منتجات")
         return False
         
     except Exception as e:
         logger.error(f"خطأ في إضافة المنتجات: {str(e)}")
+        logger.error(f"يمكن استئناف الاستيراد بإعادة تشغيل نفس الأمر (نقطة الاستئناف: {checkpoint_path})")
         return False
 
-async def list_products(limit: int = 10) -> None:
+async def list_products(limit: int = 10, max_age: float = None) -> None:
     """عرض المنتجات"""
     from database.sheets import get_products
     try:
-        products = await get_products(limit)
+        products = await get_products(limit, max_age)
         if products:
             print("\nآخر المنتجات المضافة:")
             print("-" * 50)
@@ -111,29 +249,299 @@ async def list_products(limit: int = 10) -> None:
     except Exception as e:
         logger.error(f"خطأ في عرض المنتجات: {str(e)}")
 
+async def sync_outbox() -> None:
+    """إرسال ما في صندوق الصادر قبل الخروج"""
+    from database.sheets import get_outbox_stats
+    from database.storage import get_storage
+    if not await get_storage().flush():
+        stats = get_outbox_stats()
+        logger.warning(
+            f"تم حفظ {stats['pending']} منتج محلياً وستتم مزامنتها مع Google Sheets لاحقاً"
+        )
+
+def show_status() -> None:
+    """عرض حالة صندوق الصادر"""
+    from database.sheets import get_outbox_stats
+    stats = get_outbox_stats()
+    print(f"المنتجات المنتظرة: {stats['pending']}")
+    print(f"عمر أقدم منتج منتظر: {stats['oldest_age_seconds']:.0f} ثانية")
+
+async def show_report(limit: int = 5, rebuild: bool = False) -> None:
+    """عرض تقرير المصروفات"""
+    from database.sheets import get_spending_report, rebuild_aggregates
+    from utils.report_formatter import format_spending_report
+    try:
+        if rebuild:
+            count = await rebuild_aggregates()
+            print(f"تمت إعادة بناء الإحصائيات من {count} صف\n")
+        print(format_spending_report(await get_spending_report(limit)))
+    except Exception as e:
+        logger.error(f"خطأ في عرض التقرير: {str(e)}")
+
+async def find_products(query: str, limit: int = 20, rebuild: bool = False) -> None:
+    """البحث في المشتريات"""
+    from database.sheets import search_purchases, rebuild_search_index
+    from utils.report_formatter import format_purchases
+    try:
+        if rebuild:
+            count = await rebuild_search_index()
+            print(f"تمت إعادة بناء فهرس البحث من {count} صف")
+        if not query.strip():
+            return
+        results = await search_purchases(query, limit)
+        print(format_purchases(results) if results else "لا توجد نتائج")
+    except Exception as e:
+        logger.error(f"خطأ في البحث: {str(e)}")
+
+def iter_export_lines(rows, output_format: str):
+    """
+    تحويل الصفوف إلى أسطر نصية بالصيغة المطلوبة (مولد، سطر لكل صف)
+    """
+    if output_format == 'jsonl':
+        for row in rows:
+            date, product, price, notes = (list(row) + [''] * 4)[:4]
+            yield json.dumps(
+                {'date': str(date), 'product': product, 'price': price, 'notes': notes},
+                ensure_ascii=False
+            ) + "\n"
+        return
+
+    import csv
+    import io
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((list(row) + [''] * 4)[:4])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+async def export_products(output_format: str = 'csv', output: str = '-', date_from=None,
+                          date_to=None, page_size: int = None) -> bool:
+    """
+    تصدير المشتريات صفحة بصفحة إلى ملف أو إلى المخرج القياسي
+
+    تتم كتابة كل صفحة فور قراءتها، فلا يزيد استهلاك الذاكرة عن صفحة واحدة.
+    """
+    from database.sheets import iter_purchase_pages, HEADERS
+    from src.config import SHEETS_PAGE_SIZE
+    if output == '-':
+        stream = sys.stdout
+    else:
+        # utf-8-sig حتى يعرض Excel النص العربي في ملفات CSV بشكل صحيح
+        encoding = 'utf-8-sig' if output_format == 'csv' else 'utf-8'
+        stream = open(output, 'w', encoding=encoding, newline='')
+
+    count = 0
+    try:
+        if output_format == 'csv':
+            stream.writelines(iter_export_lines([HEADERS], 'csv'))
+        async for page in iter_purchase_pages(date_from, date_to, page_size or SHEETS_PAGE_SIZE):
+            rows = [row for row in page if row]
+            stream.writelines(iter_export_lines(rows, output_format))
+            stream.flush()
+            count += len(rows)
+        logger.info(f"تم تصدير {count} صف")
+        return True
+    except Exception as e:
+        logger.error(f"خطأ في التصدير بعد {count} صف: {str(e)}")
+        return False
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+
+def format_seconds(value) -> str:
+    """تنسيق مدة بالثواني كمللي ثانية"""
+    return "-" if value is None else f"{value * 1000:.1f}ms"
+
+def report_timings(command_started: float, import_seconds: float) -> None:
+    """
+    عرض مراحل زمن تنفيذ الأمر على مخرج الأخطاء (حتى لا يختلط بمخرجات التصدير)
+
+    المعطيات:
+        command_started: وقت بدء تنفيذ الأمر (perf_counter)
+        import_seconds: مدة استيراد وحدات التخزين
+    """
+    from database.sheets import SHEETS_SECONDS, TOKEN_CACHE_RESULTS
+    finished = time.perf_counter()
+    lines = [
+        f"البدء حتى تنفيذ الأمر: {format_seconds(command_started - STARTED_AT)}",
+        f"استيراد وحدات التخزين: {format_seconds(import_seconds)}",
+    ]
+    operations = {sample['labels']['operation']: sample for sample in SHEETS_SECONDS.snapshot()}
+    cache_results = {
+        key[0]: value for key, value in TOKEN_CACHE_RESULTS.samples()
+    }
+    for operation in ('auth', 'open', 'header_check', 'read', 'append'):
+        sample = operations.get(operation)
+        if sample is None:
+            continue
+        line = f"Google Sheets {operation}: {format_seconds(sample['sum'])} ({sample['count']} مرة)"
+        if operation == 'auth' and cache_results:
+            line += " - رمز محفوظ" if cache_results.get('hit') else " - رمز جديد"
+        lines.append(line)
+    lines.append(f"الإجمالي: {format_seconds(finished - STARTED_AT)}")
+    print("\n".join(lines), file=sys.stderr)
+
+def show_stats(url: str = None, raw: bool = False) -> bool:
+    """
+    عرض مقاييس الأداء من خادم مقاييس البوت
+
+    تعيد:
+        bool: False إذا تعذر الاتصال بالبوت
+    """
+    from urllib.request import urlopen
+    from urllib.error import URLError
+    from src.config import METRICS_HOST, METRICS_PORT
+    base_url = (url or f"http://{METRICS_HOST}:{METRICS_PORT}").rstrip('/')
+    try:
+        with urlopen(f"{base_url}/metrics" if raw else f"{base_url}/metrics.json", timeout=5) as response:
+            body = response.read().decode('utf-8')
+    except (URLError, OSError) as e:
+        logger.error(f"تعذر الاتصال بخادم المقاييس على {base_url}: {e}")
+        return False
+
+    if raw:
+        print(body, end='')
+        return True
+
+    for name, metric in json.loads(body).items():
+        if not metric['samples']:
+            continue
+        print(f"{name} ({metric['help']})")
+        for sample in metric['samples']:
+            labels = ", ".join(f"{key}={value}" for key, value in sample['labels'].items())
+            prefix = f"  {labels}: " if labels else "  "
+            if metric['type'] == 'histogram':
+                average = sample['sum'] / sample['count'] if sample['count'] else None
+                print(
+                    f"{prefix}العدد={sample['count']} المتوسط={format_seconds(average)} "
+                    f"p50={format_seconds(sample['p50'])} p95={format_seconds(sample['p95'])} "
+                    f"p99={format_seconds(sample['p99'])}"
+                )
+            else:
+                print(f"{prefix}{sample['value']:g}")
+    return True
+
+def summarize_profiles(directory: str = None, limit: int = 20, chat_id: int = None) -> bool:
+    """
+    تلخيص ملفات تحليل الأداء: مدة التحديثات، الدوال الأكثر ظهوراً في العينات،
+    واستدعاءات Google Sheets
+
+    تعيد:
+        bool: False إذا لم توجد ملفات تحليل
+    """
+    import math
+    from collections import Counter, defaultdict
+    from src.config import PROFILE_DIR
+    directory = directory or PROFILE_DIR
+    profiles = []
+    for path in sorted(Path(directory).glob('*.json')) if os.path.isdir(directory) else []:
+        try:
+            with open(path, encoding='utf-8') as f:
+                profile = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"تعذر قراءة {path}: {str(e)}")
+            continue
+        if chat_id is None or profile.get('chat_id') == chat_id:
+            profiles.append(profile)
+    if not profiles:
+        print(f"لا توجد ملفات تحليل في {directory}")
+        return False
+
+    durations = sorted(profile['duration'] for profile in profiles)
+    print(f"عدد التحديثات المحللة: {len(profiles)}")
+    print(
+        f"مدة التحديث: المتوسط={format_seconds(sum(durations) / len(durations))} "
+        f"p95={format_seconds(durations[math.ceil(0.95 * len(durations)) - 1])} الأقصى={format_seconds(durations[-1])}"
+    )
+
+    # الوقت الذاتي (الدالة في أعلى المكدس) والوقت الكلي (الدالة في أي مكان من المكدس)
+    self_samples: Counter = Counter()
+    total_samples: Counter = Counter()
+    for profile in profiles:
+        for stack, count in profile['stacks'].items():
+            frames = stack.split(';')
+            self_samples[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_samples[frame] += count
+    sample_count = sum(self_samples.values())
+    if sample_count:
+        print(f"\nالدوال الأكثر ظهوراً ({sample_count} عينة):")
+        print(f"{'ذاتي':>7} {'كلي':>7}  الدالة")
+        for frame, count in self_samples.most_common(limit):
+            print(f"{count / sample_count:7.1%} {total_samples[frame] / sample_count:7.1%}  {frame}")
+
+    sheets_calls = defaultdict(list)
+    for profile in profiles:
+        for call in profile['sheets_calls']:
+            # استدعاءات صندوق الصادر تتم بعد الرد على المستخدم فلا تدخل في مدة التحديث
+            name = f"{call['name']} (بعد الرد)" if call.get('after_reply') else call['name']
+            sheets_calls[name].append(call['seconds'])
+    if sheets_calls:
+        print("\nاستدعاءات Google Sheets:")
+        for name, seconds in sorted(sheets_calls.items(), key=lambda item: sum(item[1]), reverse=True):
+            print(
+                f"  {name}: العدد={len(seconds)} المجموع={format_seconds(sum(seconds))} "
+                f"المتوسط={format_seconds(sum(seconds) / len(seconds))} الأقصى={format_seconds(max(seconds))}"
+            )
+    return True
+
 async def main() -> None:
     """الدالة الرئيسية"""
     try:
         # تحميل المتغيرات البيئية
         load_dotenv()
-        
-        # التحقق من وجود ملف credentials.json
-        if not os.path.exists('credentials.json'):
-            logger.error("ملف credentials.json غير موجود!")
-            sys.exit(1)
 
         # إعداد معالج الأوامر
         parser = setup_argparse()
         args = parser.parse_args()
 
-        if args.command == 'add':
-            await add_product(args.product, args.price, args.notes)
-        elif args.command == 'add-bulk':
-            await add_bulk_products(args.file)
-        elif args.command == 'list':
-            await list_products(args.limit)
-        else:
-            parser.print_help()
+        # عرض المقاييس والتحليلات لا يحتاج إلى الاتصال بـ Google Sheets
+        if args.command == 'stats':
+            if not show_stats(args.url, args.raw):
+                sys.exit(1)
+            return
+        if args.command == 'profile':
+            if not summarize_profiles(args.dir, args.limit, args.chat):
+                sys.exit(1)
+            return
+
+        # التحقق من وجود ملف credentials.json (المحركات المحلية لا تحتاجه)
+        from src.config import STORAGE_BACKEND
+        if STORAGE_BACKEND == 'sheets' and not os.path.exists('credentials.json'):
+            logger.error("ملف credentials.json غير موجود!")
+            sys.exit(1)
+
+        # جميع الأوامر التالية تستخدم وحدات التخزين
+        command_started = time.perf_counter()
+        import database.sheets
+        import_seconds = time.perf_counter() - command_started
+
+        try:
+            if args.command == 'add':
+                await add_product(args.product, args.price, args.notes)
+                await sync_outbox()
+            elif args.command == 'add-bulk':
+                await add_bulk_products(args.file, args.chunk_size, args.checkpoint, args.restart)
+                await sync_outbox()
+            elif args.command == 'status':
+                show_status()
+            elif args.command == 'list':
+                await list_products(args.limit, args.max_age)
+            elif args.command == 'report':
+                await show_report(args.limit, args.rebuild)
+            elif args.command == 'export':
+                await sync_outbox()
+                if not await export_products(args.format, args.output, args.date_from, args.date_to, args.page_size):
+                    sys.exit(1)
+            elif args.command == 'find':
+                await find_products(" ".join(args.query), args.limit, args.rebuild)
+            else:
+                parser.print_help()
+        finally:
+            if args.timings:
+                report_timings(command_started, import_seconds)
 
     except Exception as e:
         logger.error(f"خطأ: {str(e)}")
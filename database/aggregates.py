@@ -0,0 +1,168 @@
+"""
+إحصائيات المصروفات المحلية (SQLite)
+
+يتم تحديث مجاميع المصروفات حسب اليوم والأسبوع والشهر والمنتج مع كل صف
+مضاف، وتحفظ محلياً. بهذا تقرأ التقارير عدداً محدوداً من السجلات مهما كان
+حجم السجل الكامل، ولا تعاد قراءة الورقة إلا عند طلب إعادة البناء صراحة.
+"""
+import os
+import sqlite3
+import threading
+from datetime import datetime, date
+from typing import Iterable, List, Optional, Tuple
+
+# أنواع المجاميع
+PERIODS = ('day', 'week', 'month', 'product')
+
+# صيغ التاريخ المقبولة في عمود التاريخ
+DATE_FORMATS = ("%Y/%m/%d", "%Y-%m-%d", "%d/%m/%Y")
+
+def parse_date(value) -> Optional[date]:
+    """تحويل قيمة عمود التاريخ إلى تاريخ (None إذا كانت غير صالحة)"""
+    text = str(value).strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+def period_keys(day: date) -> dict:
+    """
+    مفاتيح الفترات التي ينتمي إليها تاريخ معين
+
+    تعيد:
+        قاموس مثل {'day': '2026/10/17', 'week': '2026-W42', 'month': '2026/10'}
+    """
+    year, week, _ = day.isocalendar()
+    return {
+        'day': day.strftime("%Y/%m/%d"),
+        'week': f"{year}-W{week:02d}",
+        'month': day.strftime("%Y/%m"),
+    }
+
+class SpendingAggregates:
+    """
+    مجاميع المصروفات المحدثة تزايدياً
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """فتح قاعدة البيانات وإنشاء الجدول عند الحاجة"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS totals (
+                    period TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    total REAL NOT NULL DEFAULT 0,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (period, key)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS totals_by_total ON totals (period, total)")
+            self._conn = conn
+        return self._conn
+
+    @staticmethod
+    def _increments(rows: Iterable[list]) -> dict:
+        """حساب الزيادات لكل (فترة، مفتاح) من مجموعة صفوف"""
+        increments: dict = {}
+        for row in rows:
+            cells = list(row) + [''] * 4
+            try:
+                price = float(cells[2])
+            except (TypeError, ValueError):
+                continue
+            product = str(cells[1]).strip()
+            if not product:
+                continue
+
+            keys = {'product': product}
+            day = parse_date(cells[0])
+            if day is not None:
+                keys.update(period_keys(day))
+
+            for period, key in keys.items():
+                total, count = increments.get((period, key), (0.0, 0))
+                increments[(period, key)] = (total + price, count + 1)
+        return increments
+
+    def _apply(self, conn: sqlite3.Connection, rows: Iterable[list]) -> None:
+        """إضافة الصفوف إلى المجاميع داخل معاملة مفتوحة"""
+        conn.executemany(
+            "INSERT INTO totals (period, key, total, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (period, key) DO UPDATE SET "
+            "total = total + excluded.total, count = count + excluded.count",
+            [(period, key, total, count) for (period, key), (total, count) in self._increments(rows).items()]
+        )
+
+    def add(self, rows: list) -> None:
+        """
+        إضافة صفوف جديدة إلى المجاميع في معاملة واحدة
+
+        المعطيات:
+            rows: قائمة صفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات]
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._apply(conn, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def rebuild(self, rows: Iterable[list]) -> None:
+        """
+        إعادة بناء جميع المجاميع من الصفر
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM totals")
+                self._apply(conn, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def total(self, period: str, key: str) -> Tuple[float, int]:
+        """
+        مجموع فترة معينة
+
+        تعيد:
+            (المجموع، عدد المشتريات)
+        """
+        with self._lock:
+            record = self._connect().execute(
+                "SELECT total, count FROM totals WHERE period = ? AND key = ?", (period, key)
+            ).fetchone()
+        return (record[0], record[1]) if record else (0.0, 0)
+
+    def top(self, period: str, limit: int) -> List[Tuple[str, float, int]]:
+        """
+        أحدث الفترات (أو أعلى المنتجات إنفاقاً عند period='product')
+
+        تعيد:
+            قائمة من (المفتاح، المجموع، عدد المشتريات)
+        """
+        if period not in PERIODS:
+            raise ValueError(f"نوع فترة غير معروف: {period}")
+        order = "total DESC" if period == 'product' else "key DESC"
+        with self._lock:
+            records = self._connect().execute(
+                f"SELECT key, total, count FROM totals WHERE period = ? ORDER BY {order} LIMIT ?",
+                (period, limit)
+            ).fetchall()
+        return [tuple(record) for record in records]
@@ -0,0 +1,39 @@
+"""
+مستمعو الصفوف المضافة
+
+تسمح هذه الوحدة للمكونات المحلية (مثل الإحصائيات) بتحديث نفسها كلما تم
+قبول صفوف جديدة عبر add_to_sheets أو add_multiple_to_sheets، بدلاً من
+إعادة قراءة الورقة بالكامل.
+"""
+import logging
+from typing import Callable, List
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# المستمع يستقبل قائمة صفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات]
+AppendListener = Callable[[list], None]
+
+_listeners: List[AppendListener] = []
+
+def add_append_listener(listener: AppendListener) -> None:
+    """تسجيل مستمع (لا يتم تسجيل نفس المستمع مرتين)"""
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def remove_append_listener(listener: AppendListener) -> None:
+    """إلغاء تسجيل مستمع"""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+def notify_appended(rows: list) -> None:
+    """
+    إبلاغ جميع المستمعين بالصفوف المضافة
+
+    فشل أحد المستمعين لا يمنع الآخرين ولا يلغي عملية الإضافة نفسها.
+    """
+    for listener in list(_listeners):
+        try:
+            listener(rows)
+        except Exception as e:
+            logger.warning(f"فشل تحديث {getattr(listener, '__name__', listener)}: {str(e)}")
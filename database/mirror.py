@@ -0,0 +1,164 @@
+"""
+نسخة محلية من ورقة المشتريات (SQLite)
+
+تحتفظ هذه النسخة بصفوف أوراق "المشتريات" ورقم آخر صف تمت مزامنته في كل منها، بحيث
+يتم جلب الصفوف الجديدة فقط في كل مزامنة، وتقرأ الدوال مثل get_products
+من القرص المحلي بدلاً من Google Sheets.
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+
+class SheetMirror:
+    """
+    نسخة محلية تزايدية من أوراق العمل
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """فتح قاعدة البيانات وإنشاء الجداول عند الحاجة"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS rows (
+                    sheet TEXT NOT NULL,
+                    row_number INTEGER NOT NULL,
+                    date,
+                    product,
+                    price,
+                    notes,
+                    PRIMARY KEY (sheet, row_number)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS meta (
+                    sheet TEXT PRIMARY KEY,
+                    last_row INTEGER NOT NULL DEFAULT 1,
+                    header TEXT,
+                    synced_at REAL NOT NULL DEFAULT 0
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def state(self, sheet: str) -> Tuple[int, Optional[list], float]:
+        """
+        حالة المزامنة لورقة عمل
+
+        تعيد:
+            (رقم آخر صف تمت مزامنته، الرؤوس المحفوظة، وقت آخر مزامنة)
+        """
+        with self._lock:
+            record = self._connect().execute(
+                "SELECT last_row, header, synced_at FROM meta WHERE sheet = ?", (sheet,)
+            ).fetchone()
+        if record is None:
+            return 1, None, 0.0
+        return record[0], json.loads(record[1]) if record[1] else None, record[2]
+
+    def sheets(self) -> List[str]:
+        """مفاتيح أوراق العمل الموجودة في النسخة المحلية"""
+        with self._lock:
+            records = self._connect().execute("SELECT sheet FROM meta").fetchall()
+        return [record[0] for record in records]
+
+    def age(self, sheet: str) -> float:
+        """عدد الثواني منذ آخر مزامنة"""
+        return time.time() - self.state(sheet)[2]
+
+    def row(self, sheet: str, row_number: int) -> Optional[list]:
+        """قراءة صف واحد من النسخة المحلية"""
+        with self._lock:
+            record = self._connect().execute(
+                "SELECT date, product, price, notes FROM rows WHERE sheet = ? AND row_number = ?",
+                (sheet, row_number)
+            ).fetchone()
+        return list(record) if record else None
+
+    def apply(self, sheet: str, start_row: int, values: list, header: Optional[list] = None,
+              full: bool = False, synced: bool = True) -> None:
+        """
+        حفظ صفوف في النسخة المحلية ابتداءً من start_row في معاملة واحدة
+
+        المعطيات:
+            full (bool): حذف جميع الصفوف السابقة لهذه الورقة أولاً (مزامنة كاملة)
+            synced (bool): تحديث وقت آخر مزامنة
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if full:
+                    conn.execute("DELETE FROM rows WHERE sheet = ?", (sheet,))
+                else:
+                    # الصفوف الأحدث من start_row سيتم استبدالها
+                    conn.execute(
+                        "DELETE FROM rows WHERE sheet = ? AND row_number >= ?", (sheet, start_row)
+                    )
+                conn.executemany(
+                    "INSERT INTO rows (sheet, row_number, date, product, price, notes) VALUES (?, ?, ?, ?, ?, ?)",
+                    [
+                        (sheet, start_row + i, *(list(row) + [''] * 4)[:4])
+                        for i, row in enumerate(values)
+                    ]
+                )
+                state = conn.execute(
+                    "SELECT header, synced_at FROM meta WHERE sheet = ?", (sheet,)
+                ).fetchone()
+                old_header, synced_at = state if state else (None, 0.0)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (sheet, last_row, header, synced_at) VALUES (?, ?, ?, ?)",
+                    (
+                        sheet,
+                        start_row + len(values) - 1,
+                        json.dumps(header, ensure_ascii=False) if header is not None else old_header,
+                        time.time() if synced else synced_at,
+                    )
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def mark_stale(self, sheet: str) -> None:
+        """إجبار المزامنة في القراءة التالية"""
+        with self._lock:
+            self._connect().execute("UPDATE meta SET synced_at = 0 WHERE sheet = ?", (sheet,))
+
+    def page(self, sheet: str, after_row: int, limit: int) -> List[Tuple[int, list]]:
+        """
+        صفحة من الصفوف بعد after_row بالترتيب (للقراءة المتسلسلة بذاكرة ثابتة)
+
+        تعيد:
+            قائمة من الأزواج (رقم الصف، الصف)
+        """
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT row_number, date, product, price, notes FROM rows "
+                "WHERE sheet = ? AND row_number > ? ORDER BY row_number LIMIT ?",
+                (sheet, after_row, limit)
+            ).fetchall()
+        return [(record[0], list(record[1:])) for record in records]
+
+    def recent(self, sheet: str, limit: int) -> List[list]:
+        """
+        آخر limit صف بالترتيب من الأقدم إلى الأحدث
+        """
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT date, product, price, notes FROM rows WHERE sheet = ? "
+                "ORDER BY row_number DESC LIMIT ?",
+                (sheet, limit)
+            ).fetchall()
+        return [list(record) for record in reversed(records)]
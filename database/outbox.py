@@ -0,0 +1,318 @@
+"""
+صندوق الصادر المحلي (SQLite)
+
+يتم حفظ كل عملية شراء مقبولة أولاً في قاعدة بيانات SQLite محلية، ثم يتم
+إرسالها إلى Google Sheets على دفعات بواسطة مهمة خلفية. بهذا لا تضيع أي
+عملية عند تعطل Google Sheets، وتبقى الصفوف المنتظرة محفوظة بعد إعادة التشغيل.
+"""
+import os
+import time
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from utils.profiler import UpdateProfile, current_profile, use_profile
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# مدة حجز الصفوف أثناء إرسالها (بالثواني) حتى لا ترسلها عملية أخرى في نفس الوقت
+CLAIM_SECONDS = 120
+
+# أقصى مدة انتظار بين محاولات الإرسال الفاشلة (بالثواني)
+MAX_RETRY_DELAY = 300
+
+class Outbox:
+    """
+    طابور دائم للصفوف التي لم ترسل بعد إلى Google Sheets
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """فتح قاعدة البيانات وإنشاء الجدول عند الحاجة"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    created_at REAL NOT NULL,
+                    date TEXT NOT NULL,
+                    product TEXT NOT NULL,
+                    price REAL NOT NULL,
+                    notes TEXT NOT NULL DEFAULT '',
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL DEFAULT 0,
+                    claimed_until REAL NOT NULL DEFAULT 0,
+                    last_error TEXT
+                )
+            """)
+            self._conn = conn
+        return self._conn
+
+    def enqueue(self, rows: list) -> List[int]:
+        """
+        حفظ صفوف جديدة في معاملة واحدة
+
+        المعطيات:
+            rows: قائمة صفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات]
+
+        تعيد:
+            قائمة بمعرفات الصفوف المحفوظة
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                ids = []
+                for date, product, price, notes in rows:
+                    cursor = conn.execute(
+                        "INSERT INTO outbox (created_at, date, product, price, notes) VALUES (?, ?, ?, ?, ?)",
+                        (now, date, product, price, notes)
+                    )
+                    ids.append(cursor.lastrowid)
+                conn.execute("COMMIT")
+                return ids
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def claim(self, limit: int) -> List[Tuple[int, list]]:
+        """
+        حجز أقدم الصفوف الجاهزة للإرسال
+
+        تعيد:
+            قائمة من الأزواج (المعرف، الصف)
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                records = conn.execute(
+                    "SELECT id, date, product, price, notes FROM outbox "
+                    "WHERE next_attempt_at <= ? AND claimed_until <= ? ORDER BY id LIMIT ?",
+                    (now, now, limit)
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+                    [(now + CLAIM_SECONDS, record[0]) for record in records]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return [(record[0], list(record[1:])) for record in records]
+
+    def mark_sent(self, ids: List[int]) -> None:
+        """حذف الصفوف التي تم إرسالها بنجاح"""
+        with self._lock:
+            self._connect().executemany("DELETE FROM outbox WHERE id = ?", [(i,) for i in ids])
+
+    def extend_claim(self, ids: List[int]) -> None:
+        """تمديد حجز صفوف ما زال إرسالها جارياً"""
+        until = time.time() + CLAIM_SECONDS
+        with self._lock:
+            self._connect().executemany(
+                "UPDATE outbox SET claimed_until = ? WHERE id = ?", [(until, i) for i in ids]
+            )
+
+    def mark_failed(self, ids: List[int], error: str) -> None:
+        """تسجيل فشل الإرسال وتأجيل المحاولة التالية (تراجع أسي)"""
+        now = time.time()
+        with self._lock:
+            self._connect().executemany(
+                "UPDATE outbox SET attempts = attempts + 1, last_error = ?, claimed_until = 0, "
+                "next_attempt_at = ? + MIN(?, 1 << MIN(attempts, 16)) WHERE id = ?",
+                [(error, now, MAX_RETRY_DELAY, i) for i in ids]
+            )
+
+    def pending_rows(self) -> List[list]:
+        """جميع الصفوف التي لم ترسل بعد بالترتيب"""
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT date, product, price, notes FROM outbox ORDER BY id"
+            ).fetchall()
+        return [list(record) for record in records]
+
+    def stats(self) -> dict:
+        """
+        إحصائيات الطابور
+
+        تعيد:
+            قاموس يحتوي على عدد الصفوف المنتظرة وعمر أقدمها بالثواني
+        """
+        with self._lock:
+            count, oldest = self._connect().execute(
+                "SELECT COUNT(*), MIN(created_at) FROM outbox"
+            ).fetchone()
+        return {
+            'pending': count,
+            'oldest_age_seconds': time.time() - oldest if oldest is not None else 0.0,
+        }
+
+    def next_attempt_delay(self) -> Optional[float]:
+        """المدة حتى يصبح أقرب صف جاهزاً للإرسال (None إذا كان الطابور فارغاً)"""
+        with self._lock:
+            (next_at,) = self._connect().execute(
+                "SELECT MIN(MAX(next_attempt_at, claimed_until)) FROM outbox"
+            ).fetchone()
+        if next_at is None:
+            return None
+        return max(0.0, next_at - time.time())
+
+class OutboxSyncer:
+    """
+    مهمة خلفية ترسل محتوى صندوق الصادر إلى Google Sheets على دفعات
+    """
+
+    def __init__(self, outbox: Outbox, send: Callable[[list], Awaitable[object]], batch_size: int):
+        self.outbox = outbox
+        self.send = send
+        self.batch_size = max(1, batch_size)
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # تحليل أداء التحديث الذي أضاف كل صف (للصفوف المضافة أثناء التحليل فقط)
+        self._profiles: Dict[int, UpdateProfile] = {}
+        # يحجز أثناء إرسال كل دفعة، انظر paused
+        self._sending = asyncio.Lock()
+
+    async def _call(self, func, *args):
+        """تشغيل استدعاء SQLite خارج حلقة الأحداث"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    def start(self) -> None:
+        """بدء المهمة الخلفية إذا لم تكن تعمل"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+
+    async def enqueue(self, rows: list) -> None:
+        """حفظ الصفوف محلياً ثم تنبيه المهمة الخلفية"""
+        profile = current_profile()
+        ids = await self._call(self.outbox.enqueue, rows)
+        if profile is not None:
+            # يبقى التحليل مفتوحاً حتى إرسال صفوفه، فتنسب استدعاءات الإرسال إليه
+            for row_id in ids:
+                profile.hold()
+                self._profiles[row_id] = profile
+        self.start()
+
+    def paused(self) -> asyncio.Lock:
+        """
+        إيقاف الإرسال داخل كتلة async with (بعد انتظار الدفعة الجارية)
+
+        أثناء إرسال دفعة تكون صفوفها في الصندوق وقد تكون وصلت إلى الورقة، فمن
+        يقرأ الورقة ثم الصفوف المنتظرة يجب أن يفعل ذلك والإرسال متوقف.
+        """
+        return self._sending
+
+    async def drain_once(self) -> int:
+        """
+        إرسال دفعة واحدة من الصفوف المنتظرة
+
+        تعيد:
+            عدد الصفوف التي تم إرسالها
+
+        ترفع:
+            الاستثناء الذي رفعه الإرسال إذا فشل
+        """
+        async with self._sending:
+            return await self._drain_once()
+
+    async def _drain_once(self) -> int:
+        claimed = await self._call(self.outbox.claim, self.batch_size)
+        if not claimed:
+            return 0
+
+        ids = [row_id for row_id, _ in claimed]
+        profiles = [self._profiles.pop(row_id) for row_id in ids if row_id in self._profiles]
+        try:
+            # نسب الطلب إلى أول تحديث جاري تحليله في الدفعة (إن وجد)
+            with use_profile(profiles[0] if profiles else None):
+                await self.send([row for _, row in claimed])
+        except Exception as e:
+            # بعد انتهاء المهلة قد يكون الطلب ما زال يعمل وقد يكتمل، فلا تعاد
+            # الصفوف إلى الطابور قبل معرفة نتيجته (وإلا تكررت في الجدول)
+            pending = getattr(e, 'pending', None)
+            if pending is not None and await self._wait_pending(pending, ids):
+                logger.warning(f"اكتمل إرسال {len(ids)} صف من صندوق الصادر بعد انتهاء المهلة")
+                await self._call(self.outbox.mark_sent, ids)
+                return len(ids)
+            await self._call(self.outbox.mark_failed, ids, str(e))
+            raise
+        finally:
+            for profile in profiles:
+                profile.release()
+        await self._call(self.outbox.mark_sent, ids)
+        logger.debug(f"تمت مزامنة {len(ids)} صف من صندوق الصادر")
+        return len(ids)
+
+    async def _wait_pending(self, pending, ids: List[int]) -> bool:
+        """
+        انتظار إرسال انتهت مهلته مع تمديد حجز صفوفه حتى ينتهي
+
+        تعيد:
+            bool: True إذا نجح الإرسال
+        """
+        result = asyncio.wrap_future(pending)
+        while True:
+            try:
+                await asyncio.wait_for(asyncio.shield(result), CLAIM_SECONDS / 2)
+            except asyncio.TimeoutError:
+                await self._call(self.outbox.extend_claim, ids)
+            except Exception:
+                return False
+            else:
+                return True
+
+    async def flush(self) -> bool:
+        """
+        إرسال جميع الصفوف الجاهزة
+
+        تعيد:
+            bool: True إذا أصبح الطابور فارغاً
+        """
+        try:
+            while await self.drain_once():
+                pass
+        except Exception as e:
+            logger.warning(f"تعذرت مزامنة صندوق الصادر: {str(e)}")
+            return False
+        return (await self._call(self.outbox.stats))['pending'] == 0
+
+    async def _run(self) -> None:
+        """حلقة المزامنة الخلفية"""
+        while True:
+            self._wakeup.clear()
+            try:
+                while await self.drain_once():
+                    pass
+            except Exception as e:
+                logger.warning(f"تعذرت مزامنة صندوق الصادر، ستتم إعادة المحاولة لاحقاً: {str(e)}")
+
+            # الانتظار حتى وصول صفوف جديدة أو حلول موعد إعادة المحاولة
+            delay = await self._call(self.outbox.next_attempt_delay)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self) -> None:
+        """إيقاف المهمة الخلفية (الصفوف المنتظرة تبقى محفوظة)"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        for profile in self._profiles.values():
+            profile.release()
+        self._profiles.clear()
@@ -0,0 +1,155 @@
+"""
+فهرس أسماء المنتجات في الذاكرة (للإكمال التلقائي واقتراح السعر)
+
+يحتفظ لكل منتج سبق شراؤه بآخر الأسعار، ويبحث عن الأسماء بالبادئة (بحث
+ثنائي في قائمة مرتبة) أو بالتشابه التقريبي (مقاطع من ثلاثة حروف). جميع
+العمليات في الذاكرة وتستغرق أقل من مللي ثانية، فلا تضيف تأخيراً للمحادثة.
+"""
+import bisect
+import statistics
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+from utils.arabic_normalizer import normalize_arabic
+
+# عدد الأسعار المحفوظة لكل منتج لحساب الوسيط
+PRICE_HISTORY = 50
+
+# أقل نسبة تشابه لاعتبار الاسم قريباً
+MIN_SIMILARITY = 0.3
+
+# الحد الأقصى للأسماء التي يتم تقييمها في البحث بالبادئة والبحث التقريبي
+MAX_PREFIX_SCAN = 200
+MAX_FUZZY_CANDIDATES = 100
+
+class ProductSuggestion(NamedTuple):
+    """اقتراح منتج"""
+    name: str
+    last_price: float
+    median_price: float
+    purchases: int
+
+class _ProductStats:
+    """إحصائيات منتج واحد"""
+    __slots__ = ("name", "prices", "purchases")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.prices: deque = deque(maxlen=PRICE_HISTORY)
+        self.purchases = 0
+
+def _key(name: str) -> str:
+    """المفتاح الموحد لاسم منتج"""
+    return ' '.join(normalize_arabic(name).split())
+
+def _trigrams(key: str) -> Set[str]:
+    """المقاطع الثلاثية لاسم موحد (مع حدود الكلمة)"""
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductIndex:
+    """
+    فهرس أسماء المنتجات وأسعارها
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._products: Dict[str, _ProductStats] = {}
+        self._sorted_keys: List[str] = []
+        self._trigram_index: Dict[str, Set[str]] = {}
+        self._key_trigrams: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def add(self, rows: Iterable[list]) -> None:
+        """
+        إضافة مشتريات إلى الفهرس
+
+        المعطيات:
+            rows: صفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات]
+        """
+        with self._lock:
+            for row in rows:
+                cells = list(row) + [''] * 4
+                name = ' '.join(str(cells[1]).split())
+                try:
+                    price = float(cells[2])
+                except (TypeError, ValueError):
+                    continue
+                key = _key(name)
+                if not key:
+                    continue
+
+                stats = self._products.get(key)
+                if stats is None:
+                    stats = self._products[key] = _ProductStats(name)
+                    bisect.insort(self._sorted_keys, key)
+                    trigrams = self._key_trigrams[key] = _trigrams(key)
+                    for trigram in trigrams:
+                        self._trigram_index.setdefault(trigram, set()).add(key)
+                # آخر كتابة للاسم هي التي تعرض
+                stats.name = name
+                stats.prices.append(price)
+                stats.purchases += 1
+
+    def _suggestion(self, key: str) -> ProductSuggestion:
+        stats = self._products[key]
+        return ProductSuggestion(
+            stats.name, stats.prices[-1], statistics.median(stats.prices), stats.purchases
+        )
+
+    def lookup(self, name: str) -> Optional[ProductSuggestion]:
+        """اقتراح منتج بنفس الاسم تماماً (بعد التوحيد)"""
+        key = _key(name)
+        with self._lock:
+            return self._suggestion(key) if key in self._products else None
+
+    def suggest(self, text: str, limit: int = 3) -> List[ProductSuggestion]:
+        """
+        اقتراح منتجات قريبة من النص
+
+        الترتيب: الاسم المطابق، ثم الأسماء التي تبدأ بالنص (الأكثر شراءً أولاً)،
+        ثم الأسماء المتشابهة تقريبياً (الأكثر تشابهاً أولاً).
+        """
+        key = _key(text)
+        if not key or limit <= 0:
+            return []
+
+        with self._lock:
+            found: List[str] = []
+            if key in self._products:
+                found.append(key)
+
+            # البحث بالبادئة
+            start = bisect.bisect_left(self._sorted_keys, key)
+            end = bisect.bisect_left(self._sorted_keys, key + '\U0010FFFF')
+            end = min(end, start + MAX_PREFIX_SCAN)
+            prefix = [k for k in self._sorted_keys[start:end] if k != key]
+            prefix.sort(key=lambda k: self._products[k].purchases, reverse=True)
+            found.extend(prefix[:limit])
+
+            # البحث التقريبي (لتصحيح الأخطاء الإملائية): المرشحون من أندر المقاطع
+            # فقط، حتى لا تمر المقاطع الشائعة (مثل بداية كلمة متكررة) على كل الأسماء
+            if len(found) < limit:
+                trigrams = _trigrams(key)
+                postings = sorted(
+                    (self._trigram_index[t] for t in trigrams if t in self._trigram_index), key=len
+                )
+                candidates: Set[str] = set()
+                for posting in postings:
+                    if len(candidates) + len(posting) > MAX_FUZZY_CANDIDATES:
+                        break
+                    candidates |= posting
+
+                scored = []
+                for candidate in candidates.difference(found):
+                    # تشابه جاكارد بين مجموعتي المقاطع
+                    other = self._key_trigrams[candidate]
+                    similarity = len(trigrams & other) / len(trigrams | other)
+                    if similarity >= MIN_SIMILARITY:
+                        scored.append((similarity, candidate))
+                scored.sort(reverse=True)
+                found.extend(candidate for _, candidate in scored)
+
+            return [self._suggestion(k) for k in found[:limit]]
@@ -0,0 +1,146 @@
+"""
+فهرس البحث في سجل المشتريات (SQLite)
+
+فهرس مقلوب: لكل كلمة موحدة (انظر utils/arabic_normalizer.py) من اسم المنتج
+والملاحظات قائمة بأرقام المشتريات التي تحتويها. يتم تحديثه مع كل صف مضاف،
+ويجيب على الاستعلامات محلياً بدون الاتصال بـ Google Sheets.
+"""
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+from utils.arabic_normalizer import tokenize
+
+# نهاية نطاق البادئة: كل كلمة تبدأ بالبادئة أصغر من البادئة + هذا الحرف
+_PREFIX_END = '\U0010FFFF'
+
+class SearchIndex:
+    """
+    فهرس مقلوب لأسماء المنتجات والملاحظات
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """فتح قاعدة البيانات وإنشاء الجداول عند الحاجة"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS purchases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date,
+                    product,
+                    price,
+                    notes
+                )
+            """)
+            # مرتب حسب (الكلمة، رقم الشراء) فيكفي بحث نطاق واحد لكل كلمة أو بادئة
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS postings (
+                    term TEXT NOT NULL,
+                    purchase_id INTEGER NOT NULL,
+                    PRIMARY KEY (term, purchase_id)
+                ) WITHOUT ROWID
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _insert(self, conn: sqlite3.Connection, rows: Iterable[list]) -> int:
+        """إضافة الصفوف وكلماتها داخل معاملة مفتوحة"""
+        count = 0
+        for row in rows:
+            date, product, price, notes = (list(row) + [''] * 4)[:4]
+            cursor = conn.execute(
+                "INSERT INTO purchases (date, product, price, notes) VALUES (?, ?, ?, ?)",
+                (date, product, price, notes)
+            )
+            terms = set(tokenize(f"{product} {notes}"))
+            conn.executemany(
+                "INSERT OR IGNORE INTO postings (term, purchase_id) VALUES (?, ?)",
+                [(term, cursor.lastrowid) for term in terms]
+            )
+            count += 1
+        return count
+
+    def add(self, rows: list) -> None:
+        """
+        فهرسة صفوف جديدة في معاملة واحدة
+
+        المعطيات:
+            rows: قائمة صفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات]
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._insert(conn, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def rebuild(self, rows: Iterable[list]) -> int:
+        """
+        إعادة بناء الفهرس بالكامل
+
+        تعيد:
+            عدد الصفوف المفهرسة
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute("DELETE FROM postings")
+                conn.execute("DELETE FROM purchases")
+                count = self._insert(conn, rows)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return count
+
+    def search(self, query: str, limit: int = 20) -> List[list]:
+        """
+        البحث عن المشتريات التي تحتوي على جميع كلمات الاستعلام
+
+        كل كلمة في الاستعلام تطابق الكلمات التي تبدأ بها ("قهو" تطابق "قهوة").
+
+        تعيد:
+            قائمة صفوف [التاريخ، المنتج، السعر، الملاحظات] من الأحدث إلى الأقدم
+        """
+        terms = sorted(set(tokenize(query)), key=len, reverse=True)
+        if not terms or limit <= 0:
+            return []
+
+        # تقاطع نطاقات البادئات (الأطول أولاً لأنها عادة الأكثر تحديداً)
+        ranges = " INTERSECT ".join(
+            ["SELECT purchase_id FROM postings WHERE term >= ? AND term < ?"] * len(terms)
+        )
+        parameters = [bound for term in terms for bound in (term, term + _PREFIX_END)]
+        with self._lock:
+            records = self._connect().execute(
+                f"SELECT date, product, price, notes FROM purchases WHERE id IN ({ranges}) "
+                "ORDER BY id DESC LIMIT ?",
+                (*parameters, limit)
+            ).fetchall()
+        return [list(record) for record in records]
+
+    def rows(self) -> List[list]:
+        """جميع المشتريات المفهرسة بترتيب إضافتها"""
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT date, product, price, notes FROM purchases ORDER BY id"
+            ).fetchall()
+        return [list(record) for record in records]
+
+    def count(self) -> int:
+        """عدد المشتريات المفهرسة"""
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM purchases").fetchone()[0]
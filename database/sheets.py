@@ -4,19 +4,70 @@
 هذا الملف يحتوي على الدوال المسؤولة عن التعامل مع Google Sheets.
 يستخدم مكتبة gspread للاتصال بـ Google Sheets API.
 
+الدوال العامة (add_to_sheets و get_products و iter_purchase_pages ...) تعمل
+مع أي محرك تخزين (انظر database/storage.py)، و SheetsBackend هو محرك Google Sheets.
+
 المتطلبات:
     - ملف credentials.json يحتوي على بيانات اعتماد Google Sheets API
     - ورقة عمل باسم "المشتريات" في Google Sheets
+
+يتم استيراد gspread و google-auth عند أول اتصال فقط، حتى لا تدفع الأوامر
+التي لا تحتاج Google Sheets (أو المحركات المحلية) ثمن استيرادها.
 """
+from __future__ import annotations
+
 import os
+import time
+import random
+import asyncio
 import logging
-from typing import Optional, Tuple
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from gspread.exceptions import SpreadsheetNotFound, WorksheetNotFound
+import functools
+import threading
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import re
 import traceback
 from functools import lru_cache
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
+from src.config import (
+    SHEETS_MAX_WORKERS,
+    SHEETS_TIMEOUT,
+    SHEETS_BATCH_SIZE,
+    SHEETS_BATCH_INTERVAL_MS,
+    OUTBOX_ENABLED,
+    OUTBOX_PATH,
+    MIRROR_ENABLED,
+    MIRROR_PATH,
+    MIRROR_MAX_STALENESS,
+    AGGREGATES_PATH,
+    SHEETS_PARTITIONING,
+    SHEETS_PAGE_SIZE,
+    SEARCH_INDEX_PATH,
+    SHEETS_READS_PER_MINUTE,
+    SHEETS_WRITES_PER_MINUTE,
+    SHEETS_RATE_BURST,
+    SHEETS_MAX_RETRIES,
+    SHEETS_BACKOFF_BASE,
+    SHEETS_BACKOFF_MAX,
+    SHEETS_BREAKER_THRESHOLD,
+    SHEETS_BREAKER_RESET,
+    TOKEN_CACHE_ENABLED,
+    TOKEN_CACHE_PATH,
+)
+from database.outbox import Outbox, OutboxSyncer
+from database.mirror import SheetMirror
+from database.aggregates import SpendingAggregates, parse_date, period_keys
+from database.search_index import SearchIndex
+from database.product_index import ProductIndex, ProductSuggestion
+from database.hooks import add_append_listener, notify_appended
+from database.storage import HEADERS, StorageBackend, get_storage
+from database.token_cache import TokenCache
+from utils.metrics import ERRORS, counter, gauge, histogram
+from utils.profiler import current_profile, use_profile
+
+if TYPE_CHECKING:
+    import gspread
 
 # إعداد التسجيل
 logger = logging.getLogger(__name__)
@@ -24,6 +75,17 @@ logger = logging.getLogger(__name__)
 # اسم ملف جدول البيانات
 SPREADSHEET_NAME = "المشتريات"
 
+# صلاحيات حساب الخدمة
+SCOPES = ['https://spreadsheets.google.com/feeds',
+          'https://www.googleapis.com/auth/drive']
+
+# خيارات القراءة: القيم بدون تنسيق والتواريخ كنص
+# (قيم gspread.utils.ValueRenderOption.unformatted و DateTimeOption.formatted_string)
+READ_OPTIONS = {
+    "value_render_option": "UNFORMATTED_VALUE",
+    "date_time_render_option": "FORMATTED_STRING",
+}
+
 # حدود السعر
 MIN_PRICE = 0.01
 MAX_PRICE = 1000000
@@ -32,59 +94,1353 @@ class SheetsError(Exception):
     """فئة مخصصة للأخطاء المتعلقة بـ Google Sheets"""
     pass
 
+class SheetsTimeoutError(SheetsError):
+    """
+    انتهت مهلة استدعاء Google Sheets
+
+    pending هو الاستدعاء الذي ما زال يعمل في منفذ الخيوط (None إذا لم يبدأ بعد)،
+    فقد يكتمل الطلب فعلاً بعد رفع الخطأ.
+    """
+    pending: Optional[Future] = None
+
+# جدول البيانات وأوراق العمل المخزنة مؤقتاً
+# المفتاح هو عنوان القسم الشهري، أو None للورقة الأولى (بدون تقسيم)
+_spreadsheet: Optional[gspread.Spreadsheet] = None
+_spreadsheet_id: Optional[str] = None
+_worksheets: Dict[Optional[str], gspread.Worksheet] = {}
+# رقم آخر صف يحتوي على بيانات في كل ورقة (بما في ذلك صف الرؤوس)
+_last_rows: Dict[Optional[str], int] = {}
+# عناوين الأقسام الشهرية الموجودة (مرتبة تصاعدياً)
+_partition_titles: Optional[List[str]] = None
+_worksheet_lock = threading.RLock()
+
+# منفذ الخيوط الخاص باستدعاءات Google Sheets المتزامنة
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# إشارة لكل حلقة أحداث تحد من عدد الاستدعاءات الجارية في نفس الوقت
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# المقاييس
+SHEETS_SECONDS = histogram(
+    'sheets_operation_seconds', 'مدة عمليات Google Sheets (auth, open, header_check, append, read)', ('operation',)
+)
+TOKEN_CACHE_RESULTS = counter(
+    'sheets_token_cache_total', 'نتائج البحث في ذاكرة رموز الوصول المؤقتة (hit, miss)', ('result',)
+)
+SHEETS_ROWS_WRITTEN = counter('sheets_rows_written_total', 'عدد الصفوف المكتوبة في Google Sheets')
+SHEETS_RETRIES = counter('sheets_retries_total', 'عدد مرات إعادة محاولة استدعاءات Google Sheets', ('status',))
+SHEETS_RATE_LIMIT_WAIT = counter(
+    'sheets_rate_limit_wait_seconds_total', 'مجموع مدة انتظار محدد المعدل', ('kind',)
+)
+
+def get_sheets_executor() -> ThreadPoolExecutor:
+    """
+    الحصول على منفذ الخيوط المحدود الخاص بـ Google Sheets
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=SHEETS_MAX_WORKERS,
+                thread_name_prefix="sheets"
+            )
+        return _executor
+
+def shutdown_sheets_executor(wait: bool = True) -> None:
+    """
+    إيقاف منفذ الخيوط (يستخدم عند إغلاق البرنامج)
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+
+async def run_blocking(func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+    """
+    تشغيل دالة متزامنة (استدعاء gspread) في منفذ Google Sheets دون حجب حلقة الأحداث
+
+    المعطيات:
+        func: الدالة المتزامنة المراد تنفيذها
+        timeout (float): المهلة بالثواني (افتراضي: SHEETS_TIMEOUT، و 0 لتعطيلها)
+
+    تعيد:
+        نتيجة الدالة
+
+    ترفع:
+        SheetsTimeoutError: إذا انتهت المهلة قبل اكتمال الاستدعاء
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(SHEETS_MAX_WORKERS)
+
+    if timeout is None:
+        timeout = SHEETS_TIMEOUT
+    call = functools.partial(func, *args, **kwargs)
+    profile = current_profile()
+    if profile is not None:
+        call = profile.wrap_call(call, getattr(func, '__name__', repr(func)))
+
+    worker: Optional[Future] = None
+
+    async def _call():
+        nonlocal worker
+        # الانتظار هنا قابل للإلغاء، لذلك لا يبدأ الاستدعاء إذا ألغي الطلب قبل دوره
+        async with semaphore:
+            worker = get_sheets_executor().submit(call)
+            return await asyncio.wrap_future(worker, loop=loop)
+
+    try:
+        return await asyncio.wait_for(_call(), timeout if timeout > 0 else None)
+    except asyncio.TimeoutError:
+        logger.error(f"انتهت مهلة استدعاء Google Sheets بعد {timeout} ثانية")
+        error = SheetsTimeoutError("انتهت مهلة الاتصال بخدمة Google Sheets")
+        # الإلغاء لا يوقف استدعاءً بدأ في خيط المنفذ
+        if worker is not None and not worker.cancelled():
+            error.pending = worker
+        raise error
+
+class TokenBucket:
+    """
+    محدد معدل (دلو الرموز) آمن للاستخدام من عدة خيوط
+
+    كل استدعاء يحجز رمزاً، وإذا لم يتوفر رمز ينتظر المستدعي حتى موعد توفره.
+    """
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = max(rate_per_minute, 0.001) / 60
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """
+        حجز رمز واحد
+
+        تعيد:
+            مدة الانتظار بالثواني قبل استخدام الرمز (0 إذا كان متوفراً)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def penalize(self, seconds: float) -> None:
+        """إيقاف الإصدار لمدة محددة (عند تجاوز الحصة)"""
+        with self._lock:
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+    async def acquire(self) -> float:
+        """
+        انتظار رمز متاح
+
+        تعيد:
+            مدة الانتظار بالثواني
+        """
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+class CircuitBreaker:
+    """
+    قاطع دائرة يوقف الاستدعاءات مؤقتاً عندما تكون خدمة Google Sheets متعطلة
+
+    بعد failure_threshold فشل متتالٍ يفتح القاطع لمدة reset_timeout ثانية
+    وترفض الاستدعاءات فوراً، ثم يسمح باستدعاء تجريبي واحد.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """هل القاطع مفتوح حالياً"""
+        return self._opened_at is not None
+
+    def before_call(self) -> None:
+        """
+        التحقق قبل الاستدعاء
+
+        ترفع:
+            SheetsError: إذا كان القاطع مفتوحاً
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at >= self.reset_timeout and not self._trial_running:
+                # السماح باستدعاء تجريبي واحد
+                self._trial_running = True
+                return
+        raise SheetsError("خدمة Google Sheets غير متاحة حالياً، الرجاء المحاولة لاحقاً")
+
+    def record_success(self) -> None:
+        """تسجيل استدعاء ناجح"""
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("عادت خدمة Google Sheets للعمل")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        """تسجيل فشل ناتج عن تعطل الخدمة"""
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_running:
+                    logger.error(f"تم إيقاف الاتصال بـ Google Sheets لمدة {self.reset_timeout} ثانية بعد {self._failures} فشل متتالٍ")
+                self._opened_at = time.monotonic()
+                self._trial_running = False
+
+    def release_trial(self) -> None:
+        """إنهاء الاستدعاء التجريبي دون نتيجة حاسمة"""
+        with self._lock:
+            self._trial_running = False
+
+# محددات المعدل (حصص القراءة والكتابة منفصلة في Google Sheets)
+_rate_limiters = {
+    'read': TokenBucket(SHEETS_READS_PER_MINUTE, SHEETS_RATE_BURST),
+    'write': TokenBucket(SHEETS_WRITES_PER_MINUTE, SHEETS_RATE_BURST),
+}
+
+# الرموز المحجوزة مسبقاً في call_sheets للاستدعاء الجاري في كل خيط
+_prepaid = threading.local()
+
+def _charge_request(method: str) -> None:
+    """
+    حجز رمز من محدد المعدل لطلب HTTP واحد (يستدعى في خيط المنفذ قبل كل طلب)
+
+    الدوال المركبة (مثل الإضافة مع التحقق من الرؤوس) ترسل عدة طلبات، وحصة
+    Google Sheets تحسب لكل طلب: طلبات GET من حصة القراءة والباقي من حصة الكتابة.
+    أول طلب من نوع الاستدعاء محجوز مسبقاً في call_sheets دون شغل خيط بالانتظار.
+    """
+    kind = 'read' if method.lower() == 'get' else 'write'
+    prepaid = getattr(_prepaid, 'kinds', None)
+    if prepaid and kind in prepaid:
+        prepaid.discard(kind)
+        return
+    delay = _rate_limiters[kind].reserve()
+    if delay > 0:
+        SHEETS_RATE_LIMIT_WAIT.inc(delay, kind=kind)
+        time.sleep(delay)
+
+def _rate_limit_requests(client: gspread.Client) -> gspread.Client:
+    """تمرير كل طلب HTTP يرسله العميل عبر محدد المعدل"""
+    request = client.request
+
+    @functools.wraps(request)
+    def limited_request(method, *args, **kwargs):
+        _charge_request(method)
+        return request(method, *args, **kwargs)
+
+    client.request = limited_request
+    return client
+
+def _with_prepaid(kind: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    """تنفيذ func مع اعتبار أول طلب من نوع kind محجوزاً مسبقاً"""
+    @functools.wraps(func)
+    def call(*args, **kwargs):
+        _prepaid.kinds = {kind}
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _prepaid.kinds = None
+    return call
+
+_circuit_breaker = CircuitBreaker(SHEETS_BREAKER_THRESHOLD, SHEETS_BREAKER_RESET)
+gauge('sheets_circuit_open', 'هل قاطع الدائرة مفتوح (1) أم لا (0)', callback=lambda: int(_circuit_breaker.is_open))
+
+# رموز الحالة التي تستحق إعادة المحاولة
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def _error_status(error: BaseException) -> Optional[int]:
+    """
+    استخراج رمز حالة HTTP من الخطأ أو من سببه
+    """
+    while error is not None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+        if status is not None:
+            return status
+        error = error.__cause__
+    return None
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """قراءة ترويسة Retry-After إن وجدت"""
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+def _is_connection_error(error: BaseException) -> bool:
+    """هل الخطأ ناتج عن تعذر الوصول إلى الخدمة"""
+    from requests.exceptions import ConnectionError as RequestsConnectionError, Timeout as RequestsTimeout
+    while error is not None:
+        if isinstance(error, (ConnectionError, RequestsConnectionError, RequestsTimeout)):
+            return True
+        error = error.__cause__
+    return False
+
+async def call_sheets(kind: str, func: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    تنفيذ استدعاء Google Sheets عبر محدد المعدل وقاطع الدائرة
+
+    عند رفض الطلب بسبب الحصة (429) أو تعطل الخادم (5xx) تتم إعادة المحاولة
+    مع تراجع أسي عشوائي، وعند 429 يتم إبطاء جميع الطلبات من نفس النوع.
+    يتم حجز رمز لأول طلب قبل التنفيذ، وكل طلب HTTP إضافي ترسله func يحجز
+    رمزه في خيط المنفذ (انظر _charge_request).
+
+    المعطيات:
+        kind (str): نوع الاستدعاء 'read' أو 'write'
+        func: الدالة المتزامنة المراد تنفيذها في منفذ Google Sheets
+
+    ترفع:
+        SheetsError: إذا كان القاطع مفتوحاً أو فشلت جميع المحاولات
+    """
+    limiter = _rate_limiters[kind]
+    func = _with_prepaid(kind, func)
+    attempt = 0
+    while True:
+        _circuit_breaker.before_call()
+        try:
+            waited = await limiter.acquire()
+            if waited:
+                SHEETS_RATE_LIMIT_WAIT.inc(waited, kind=kind)
+            if kind == 'read':
+                with SHEETS_SECONDS.time(operation='read'):
+                    result = await run_blocking(func, *args, **kwargs)
+            else:
+                result = await run_blocking(func, *args, **kwargs)
+        except asyncio.CancelledError:
+            _circuit_breaker.release_trial()
+            raise
+        except Exception as e:
+            status = _error_status(e)
+            timed_out = isinstance(e, SheetsTimeoutError)
+            unhealthy = timed_out or _is_connection_error(e) or (status is not None and status >= 500)
+
+            if unhealthy:
+                _circuit_breaker.record_failure()
+            else:
+                _circuit_breaker.release_trial()
+
+            # لا نعيد المحاولة بعد انتهاء المهلة حتى لا تتراكم المعالجات المعلقة
+            retryable = not timed_out and (status in RETRYABLE_STATUS_CODES or _is_connection_error(e))
+            if not retryable or attempt >= SHEETS_MAX_RETRIES or _circuit_breaker.is_open:
+                ERRORS.inc(component='sheets', type=type(e).__name__)
+                raise
+
+            delay = random.uniform(0, min(SHEETS_BACKOFF_MAX, SHEETS_BACKOFF_BASE * (2 ** attempt)))
+            if status == 429:
+                delay = max(delay, _retry_after(e) or 0)
+                limiter.penalize(delay)
+            attempt += 1
+            SHEETS_RETRIES.inc(status=status or type(e).__name__)
+            logger.warning(f"فشل استدعاء Google Sheets ({status or type(e).__name__})، إعادة المحاولة {attempt} بعد {delay:.1f} ثانية")
+            await asyncio.sleep(delay)
+        else:
+            _circuit_breaker.record_success()
+            return result
+
+_token_cache: Optional[TokenCache] = None
+
+def get_token_cache() -> Optional[TokenCache]:
+    """
+    الحصول على ذاكرة رموز الوصول المؤقتة (None إذا كانت معطلة)
+    """
+    global _token_cache
+    if not TOKEN_CACHE_ENABLED:
+        return None
+    if _token_cache is None:
+        _token_cache = TokenCache(TOKEN_CACHE_PATH)
+    return _token_cache
+
+def _cache_account(client: gspread.Client) -> str:
+    """مفتاح الحساب في الذاكرة المؤقتة (بريد حساب الخدمة)"""
+    return getattr(getattr(client, 'auth', None), 'service_account_email', '') or ''
+
 @lru_cache(maxsize=1)
 def get_google_sheets_client() -> Tuple[gspread.Client, datetime]:
     """
     الحصول على عميل Google Sheets مع تخزين مؤقت
+
+    يتم استخدام رمز الوصول المحفوظ على القرص إذا كان صالحاً، وإلا يتم طلب
+    رمز جديد وحفظه. عند انتهاء الرمز أثناء التشغيل يجدده العميل تلقائياً.
     """
-    scope = ['https://spreadsheets.google.com/feeds',
-            'https://www.googleapis.com/auth/drive']
-    
     creds_path = os.path.join(os.path.dirname(__file__), '..', 'credentials.json')
     
     if not os.path.exists(creds_path):
         raise SheetsError("ملف الاعتمادات غير موجود")
-        
-    creds = ServiceAccountCredentials.from_json_keyfile_name(creds_path, scope)
-    client = gspread.authorize(creds)
+
+    with SHEETS_SECONDS.time(operation='auth'):
+        import gspread
+        from google.oauth2.service_account import Credentials
+        from google.auth.transport.requests import Request
+
+        creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+        cache = get_token_cache()
+        account = f"{creds.service_account_email} {' '.join(sorted(SCOPES))}"
+        cached = cache.get_token(account) if cache is not None else None
+        if cached is not None:
+            creds.token, creds.expiry = cached
+            TOKEN_CACHE_RESULTS.inc(result='hit')
+        else:
+            creds.refresh(Request())
+            if cache is not None:
+                cache.set_token(account, creds.token, creds.expiry)
+                TOKEN_CACHE_RESULTS.inc(result='miss')
+        client = _rate_limit_requests(gspread.Client(auth=creds))
     return client, datetime.now()
 
-def get_worksheet() -> gspread.Worksheet:
+def _ensure_headers(worksheet: gspread.Worksheet) -> None:
+    """
+    التحقق من رؤوس الأعمدة وإصلاحها إذا لزم الأمر
+
+    يتم المسح والكتابة والتنسيق في طلب batchUpdate واحد بدلاً من ثلاثة طلبات
+    """
+    headers = worksheet.row_values(1)
+    if headers == HEADERS:
+        return
+
+    logger.warning("رؤوس الأعمدة غير صحيحة، جاري إعادة إنشائها")
+    header_format = {
+        "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
+        "horizontalAlignment": "CENTER",
+        "textFormat": {"bold": True}
+    }
+    worksheet.spreadsheet.batch_update({
+        "requests": [
+            # مسح جميع القيم
+            {
+                "updateCells": {
+                    "range": {"sheetId": worksheet.id},
+                    "fields": "userEnteredValue"
+                }
+            },
+            # كتابة الرؤوس وتنسيقها
+            {
+                "updateCells": {
+                    "range": {
+                        "sheetId": worksheet.id,
+                        "startRowIndex": 0,
+                        "endRowIndex": 1,
+                        "startColumnIndex": 0,
+                        "endColumnIndex": len(HEADERS)
+                    },
+                    "rows": [{
+                        "values": [
+                            {
+                                "userEnteredValue": {"stringValue": header},
+                                "userEnteredFormat": header_format
+                            }
+                            for header in HEADERS
+                        ]
+                    }],
+                    "fields": "userEnteredValue,userEnteredFormat"
+                }
+            }
+        ]
+    })
+
+def invalidate_worksheet_cache() -> None:
+    """
+    مسح أوراق العمل المخزنة مؤقتاً لإجبار إعادة الاتصال في الطلب التالي
+    """
+    global _spreadsheet, _partition_titles
+    with _worksheet_lock:
+        _spreadsheet = None
+        _partition_titles = None
+        _worksheets.clear()
+        _last_rows.clear()
+
+def _get_client() -> gspread.Client:
+    """الحصول على العميل مع إعادة إنشائه إذا مر أكثر من 30 دقيقة"""
+    client, created_time = get_google_sheets_client()
+    if datetime.now() - created_time > timedelta(minutes=30):
+        get_google_sheets_client.cache_clear()
+        client, _ = get_google_sheets_client()
+    return client
+
+def _get_spreadsheet(client: gspread.Client) -> gspread.Spreadsheet:
+    """
+    فتح جدول البيانات (يجب استدعاؤها مع _worksheet_lock)
+
+    البحث بالاسم في Drive يتم مرة واحدة فقط (ويحفظ المعرف في ذاكرة الرموز
+    المؤقتة للتشغيلات التالية)، ثم الفتح بالمعرف مباشرة
+    """
+    from gspread.exceptions import SpreadsheetNotFound
+    global _spreadsheet, _spreadsheet_id
+    if _spreadsheet is not None and _spreadsheet.client is client:
+        return _spreadsheet
+
+    cache = get_token_cache()
+    account = _cache_account(client)
+    cached_id = None
+    if not _spreadsheet_id and cache is not None:
+        cached_id = _spreadsheet_id = cache.get_spreadsheet_id(account, SPREADSHEET_NAME)
+
+    try:
+        with SHEETS_SECONDS.time(operation='open'):
+            spreadsheet = None
+            if _spreadsheet_id:
+                try:
+                    spreadsheet = client.open_by_key(_spreadsheet_id)
+                except (SpreadsheetNotFound, PermissionError):
+                    if not cached_id:
+                        raise
+                    # المعرف المحفوظ لم يعد صالحاً (حذف الجدول أو تغيرت الصلاحيات)
+                    logger.info("معرف جدول البيانات المحفوظ غير صالح، سيتم البحث بالاسم")
+            if spreadsheet is None:
+                spreadsheet = client.open(SPREADSHEET_NAME)
+                _spreadsheet_id = spreadsheet.id
+                if cache is not None:
+                    cache.set_spreadsheet_id(account, SPREADSHEET_NAME, _spreadsheet_id)
+    except SpreadsheetNotFound:
+        _spreadsheet_id = None
+        if cache is not None:
+            cache.set_spreadsheet_id(account, SPREADSHEET_NAME, None)
+        raise SheetsError(f"جدول البيانات '{SPREADSHEET_NAME}' غير موجود")
+
+    # أوراق العمل السابقة مرتبطة بالعميل القديم
+    _spreadsheet = spreadsheet
+    _worksheets.clear()
+    _last_rows.clear()
+    return spreadsheet
+
+def get_worksheet(partition: Optional[str] = None) -> gspread.Worksheet:
     """
     الحصول على ورقة العمل مع التعامل مع الأخطاء
+
+    المعطيات:
+        partition (str): عنوان القسم الشهري، أو None للورقة الأولى.
+            يتم إنشاء القسم مع رؤوس الأعمدة عند أول استخدام.
+
+    يتم تخزين معرف جدول البيانات وأوراق العمل مؤقتاً، ولا يتم التحقق من
+    رؤوس الأعمدة إلا عند أول اتصال أو بعد إعادة الاتصال.
     """
+    from gspread.exceptions import WorksheetNotFound
     try:
-        client, created_time = get_google_sheets_client()
-        
-        # إعادة إنشاء العميل إذا مر أكثر من 30 دقيقة
-        if datetime.now() - created_time > timedelta(minutes=30):
-            get_google_sheets_client.cache_clear()
-            client, _ = get_google_sheets_client()
-        
-        try:
-            spreadsheet = client.open(SPREADSHEET_NAME)
-            worksheet = spreadsheet.sheet1
-            
-            # التحقق من رؤوس الأعمدة
-            headers = worksheet.row_values(1)
-            if not headers or headers != ["التاريخ", "المنتج", "السعر", "ملاحظات"]:
-                worksheet.clear()
-                worksheet.update('A1:D1', [["التاريخ", "المنتج", "السعر", "ملاحظات"]])
-                worksheet.format('A1:D1', {
-                    "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9},
-                    "horizontalAlignment": "CENTER",
-                    "textFormat": {"bold": True}
-                })
-            
+        client = _get_client()
+        with _worksheet_lock:
+            spreadsheet = _get_spreadsheet(client)
+            worksheet = _worksheets.get(partition)
+            if worksheet is not None:
+                return worksheet
+
+            if partition is None:
+                worksheet = spreadsheet.sheet1
+            else:
+                try:
+                    worksheet = spreadsheet.worksheet(partition)
+                except WorksheetNotFound:
+                    logger.info(f"إنشاء ورقة العمل '{partition}'")
+                    worksheet = spreadsheet.add_worksheet(partition, rows=1000, cols=len(HEADERS))
+                    if _partition_titles is not None and partition not in _partition_titles:
+                        _partition_titles.append(partition)
+                        _partition_titles.sort()
+            with SHEETS_SECONDS.time(operation='header_check'):
+                _ensure_headers(worksheet)
+
+            _worksheets[partition] = worksheet
+            _last_rows.pop(partition, None)
             return worksheet
             
-        except SpreadsheetNotFound:
-            raise SheetsError(f"جدول البيانات '{SPREADSHEET_NAME}' غير موجود")
-            
     except Exception as e:
         logger.error(f"خطأ في الاتصال بـ Google Sheets: {str(e)}")
         logger.error(traceback.format_exc())
-        raise SheetsError("حدث خطأ في الاتصال بخدمة Google Sheets")
+        raise SheetsError("حدث خطأ في الاتصال بخدمة Google Sheets") from e
+
+# عنوان القسم الشهري، مثل "المشتريات 2026-10"
+_PARTITION_RE = re.compile(re.escape(SPREADSHEET_NAME) + r" \d{4}-\d{2}")
+
+def partition_for(date_value) -> Optional[str]:
+    """
+    القسم الذي يكتب فيه صف بتاريخ معين
+
+    تعيد:
+        عنوان القسم الشهري، أو None إذا كان التقسيم معطلاً (الكتابة في الورقة الأولى)
+    """
+    if SHEETS_PARTITIONING != 'monthly':
+        return None
+    day = parse_date(date_value) or datetime.now().date()
+    return f"{SPREADSHEET_NAME} {day.strftime('%Y-%m')}"
+
+def _list_partitions_sync() -> List[str]:
+    """
+    عناوين الأقسام الشهرية الموجودة مرتبة تصاعدياً (طلب واحد، ثم من الذاكرة)
+    """
+    global _partition_titles
+    with _worksheet_lock:
+        if _partition_titles is None:
+            spreadsheet = _get_spreadsheet(_get_client())
+            _partition_titles = sorted(
+                worksheet.title for worksheet in spreadsheet.worksheets()
+                if _PARTITION_RE.fullmatch(worksheet.title)
+            )
+        return list(_partition_titles)
+
+def _read_order_sync() -> List[Optional[str]]:
+    """
+    أوراق العمل من الأحدث إلى الأقدم: الأقسام الشهرية ثم الورقة الأولى
+    (التي تحتوي على البيانات السابقة لتفعيل التقسيم)
+    """
+    if SHEETS_PARTITIONING != 'monthly':
+        return [None]
+    partitions = _list_partitions_sync()
+    order: List[Optional[str]] = list(reversed(partitions))
+    if get_worksheet().title not in partitions:
+        order.append(None)
+    return order
+
+async def _get_read_order() -> List[Optional[str]]:
+    """ترتيب القراءة، بدون طلب إلى Google Sheets إذا كانت الأقسام معروفة"""
+    if SHEETS_PARTITIONING != 'monthly':
+        return [None]
+    if _partition_titles is not None and None in _worksheets:
+        return _read_order_sync()
+    return await call_sheets('read', _read_order_sync)
+
+def _update_last_row(partition: Optional[str], row: int) -> None:
+    """تحديث رقم آخر صف معروف"""
+    with _worksheet_lock:
+        if partition in _last_rows and row > _last_rows[partition]:
+            _last_rows[partition] = row
+
+def _range_end_row(a1_range: str) -> Optional[int]:
+    """
+    استخراج رقم آخر صف من نطاق بصيغة A1 مثل 'المشتريات'!A5:D7
+    """
+    match = re.search(r"(\d+)$", a1_range or "")
+    return int(match.group(1)) if match else None
+
+def _append_partition_sync(partition: Optional[str], rows: list) -> None:
+    """إضافة صفوف إلى ورقة عمل واحدة"""
+    from gspread.exceptions import APIError
+    worksheet = get_worksheet(partition)
+    try:
+        with SHEETS_SECONDS.time(operation='append'):
+            if len(rows) == 1:
+                response = worksheet.append_row(rows[0])
+            else:
+                response = worksheet.append_rows(rows)
+    except APIError:
+        # قد تكون الورقة حذفت أو تغيرت، لذلك نعيد الاتصال في المرة القادمة
+        invalidate_worksheet_cache()
+        raise
+
+    SHEETS_ROWS_WRITTEN.inc(len(rows))
+
+    # الاستجابة تحتوي على النطاق الذي تمت كتابته، فنعرف منه عدد الصفوف دون طلب إضافي
+    end_row = _range_end_row((response or {}).get("updates", {}).get("updatedRange", ""))
+    if end_row:
+        _update_last_row(partition, end_row)
+        if MIRROR_ENABLED:
+            _mirror_appended(partition, end_row - len(rows) + 1, rows)
+
+def _append_rows_sync(rows: list) -> None:
+    """
+    إضافة صفوف إلى ورقة العمل (استدعاء متزامن يعمل داخل منفذ Google Sheets)
+
+    عند تفعيل التقسيم الشهري يكتب كل صف في قسم شهر تاريخه، بطلب واحد لكل قسم.
+    """
+    groups: Dict[Optional[str], list] = {}
+    for row in rows:
+        groups.setdefault(partition_for(row[0]), []).append(row)
+    for partition, partition_rows in groups.items():
+        _append_partition_sync(partition, partition_rows)
+
+def _get_last_row_sync(worksheet: gspread.Worksheet, partition: Optional[str] = None) -> int:
+    """
+    الحصول على رقم آخر صف يحتوي على بيانات
+
+    يتم جلب العمود الأول مرة واحدة فقط، ثم يبقى الرقم محدثاً من استجابات الإضافة
+    """
+    last_row = _last_rows.get(partition)
+    if last_row is None:
+        last_row = max(1, len(worksheet.col_values(1)))
+        with _worksheet_lock:
+            last_row = _last_rows.setdefault(partition, last_row)
+    return last_row
+
+# النسخة المحلية من ورقة المشتريات
+_mirror: Optional[SheetMirror] = None
+
+# مفتاح الورقة الأولى في النسخة المحلية (الأقسام الشهرية مفتاحها عنوانها)
+MIRROR_KEY = SPREADSHEET_NAME
+
+def _mirror_key(partition: Optional[str]) -> str:
+    """مفتاح ورقة العمل في النسخة المحلية"""
+    return MIRROR_KEY if partition is None else partition
+
+def get_mirror() -> SheetMirror:
+    """
+    الحصول على النسخة المحلية من ورقة المشتريات
+    """
+    global _mirror
+    if _mirror is None:
+        _mirror = SheetMirror(MIRROR_PATH)
+    return _mirror
+
+def _normalize_cells(row: Optional[list]) -> list:
+    """توحيد قيم الصف للمقارنة (5.0 و 5 متساويان)"""
+    cells = (list(row or []) + [''] * 4)[:4]
+    return [
+        str(int(cell)) if isinstance(cell, float) and cell.is_integer() else str(cell)
+        for cell in cells
+    ]
+
+def _mirror_appended(partition: Optional[str], start_row: int, rows: list) -> None:
+    """
+    إضافة الصفوف المكتوبة إلى النسخة المحلية مباشرة إذا كانت متصلة بآخر صف فيها
+    """
+    key = _mirror_key(partition)
+    try:
+        mirror = get_mirror()
+        last_row, _, _ = mirror.state(key)
+        if start_row == last_row + 1:
+            mirror.apply(key, start_row, rows, synced=False)
+        else:
+            mirror.mark_stale(key)
+    except Exception as e:
+        logger.warning(f"تعذر تحديث النسخة المحلية: {str(e)}")
+
+def _sync_mirror_sync(partition: Optional[str] = None, page_size: int = SHEETS_PAGE_SIZE) -> int:
+    """
+    مزامنة النسخة المحلية مع ورقة عمل (استدعاء متزامن)
+
+    يتم جلب صف الرؤوس وآخر صف تمت مزامنته وما بعده في طلب واحد. إذا تغيرت
+    الرؤوس أو لم يعد آخر صف مطابقاً (حذف أو تعديل) تتم مزامنة كاملة.
+
+    الصفوف الجديدة تجلب بنوافذ من page_size صف وتحفظ كل نافذة قبل جلب
+    التالية، فلا يتم الاحتفاظ بأكثر من نافذة في الذاكرة مهما كان حجم الورقة.
+
+    تعيد:
+        عدد الصفوف الجديدة
+    """
+    key = _mirror_key(partition)
+    mirror = get_mirror()
+    worksheet = get_worksheet(partition)
+    page_size = max(1, page_size)
+    last_row, header, _ = mirror.state(key)
+    first = max(2, last_row)
+    header_range, tail = worksheet.batch_get(["A1:D1", f"A{first}:D{first + page_size}"], **READ_OPTIONS)
+    current_header = [str(cell) for cell in (header_range[0] if header_range else [])]
+    tail = list(tail)
+    window_full = len(tail) > page_size
+
+    consistent = header is None or header == current_header
+    if consistent and last_row >= 2:
+        consistent = bool(tail) and _normalize_cells(tail[0]) == _normalize_cells(mirror.row(key, last_row))
+        tail = tail[1:]
+
+    if consistent:
+        start_row = last_row + 1
+        full = False
+    else:
+        logger.info(f"النسخة المحلية من '{worksheet.title}' غير متطابقة مع الورقة، جاري إجراء مزامنة كاملة")
+        start_row = 2
+        full = True
+        tail = list(worksheet.get(f"A2:D{page_size + 1}", **READ_OPTIONS))
+        window_full = len(tail) >= page_size
+
+    new_rows = 0
+    while True:
+        mirror.apply(key, start_row, tail, current_header, full=full, synced=not window_full)
+        new_rows += len(tail)
+        if not window_full:
+            break
+        start_row += len(tail)
+        full = False
+        tail = list(worksheet.get(f"A{start_row}:D{start_row + page_size - 1}", **READ_OPTIONS))
+        window_full = len(tail) >= page_size
+
+    with _worksheet_lock:
+        _last_rows[partition] = mirror.state(key)[0]
+    return new_rows
+
+async def sync_mirror(partition: Optional[str] = None) -> int:
+    """
+    جلب الصفوف الجديدة من Google Sheets إلى النسخة المحلية
+
+    المعطيات:
+        partition (str): القسم الشهري، أو None للورقة الأولى
+
+    تعيد:
+        عدد الصفوف الجديدة
+    """
+    return await call_sheets('read', _sync_mirror_sync, partition)
+
+async def _get_recent_from_mirror(limit: int, max_staleness: float) -> list:
+    """
+    قراءة آخر الصفوف من النسخة المحلية بعد مزامنتها إذا تجاوز عمرها الحد المسموح
+
+    يتم المرور على الأقسام من الأحدث إلى الأقدم والتوقف عند اكتمال العدد.
+    """
+    mirror = get_mirror()
+    try:
+        order = await _get_read_order()
+    except Exception as e:
+        # عند تعذر الاتصال نعتمد على الأوراق الموجودة في النسخة المحلية
+        logger.warning(f"تعذر الحصول على قائمة أوراق العمل، سيتم عرض بيانات محلية: {str(e)}")
+        order = [
+            None if key == MIRROR_KEY else key
+            for key in sorted(mirror.sheets(), reverse=True)
+        ]
+
+    rows: list = []
+    for partition in order:
+        key = _mirror_key(partition)
+        if mirror.age(key) > max_staleness:
+            try:
+                await sync_mirror(partition)
+            except Exception as e:
+                # عند تعذر الاتصال نعرض آخر نسخة محلية متوفرة
+                logger.warning(f"تعذرت مزامنة النسخة المحلية، سيتم عرض بيانات قديمة: {str(e)}")
+        rows = mirror.recent(key, limit - len(rows)) + rows
+        if len(rows) >= limit:
+            break
+    return rows
+
+def _get_tail_rows_sync(limit: int, partition: Optional[str] = None) -> list:
+    """
+    قراءة آخر limit صف من ورقة عمل باستخدام نطاق محدود (استدعاء متزامن)
+
+    يتم قراءة نافذة تمتد بعد آخر صف معروف لالتقاط الصفوف التي أضافها
+    آخرون، وتكرار القراءة فقط إذا امتلأت النافذة بالكامل. إذا أعادت النافذة
+    الأولى صفوفاً أقل من المعروف (حذف صفوف يدوياً) يعاد حساب آخر صف من
+    العمود الأول مرة واحدة.
+    """
+    worksheet = get_worksheet(partition)
+    last_row = _get_last_row_sync(worksheet, partition)
+    rows: list = []
+    start = max(2, last_row - limit + 1)
+    # عدد الصفوف التي يجب أن تعيدها النافذة الأولى حسب آخر صف معروف
+    expected = last_row - start + 1
+
+    while True:
+        end = max(start, last_row) + limit
+        values = worksheet.get(
+            f"A{start}:D{end}",
+            **READ_OPTIONS,
+        )
+        if len(values) < expected:
+            # آخر صف المحفوظ بعد نهاية الورقة الفعلية
+            logger.info(f"رقم آخر صف في '{worksheet.title}' قديم، جاري إعادة حسابه")
+            last_row = max(1, len(worksheet.col_values(1)))
+            start = max(2, last_row - limit + 1)
+            expected = 0
+            continue
+        expected = 0
+        rows = (rows + list(values))[-limit:]
+        last_row = start + len(values) - 1
+        if len(values) < end - start + 1:
+            break
+        # النافذة ممتلئة: توجد صفوف أخرى بعدها
+        start = end + 1
+
+    with _worksheet_lock:
+        _last_rows[partition] = max(1, last_row)
+    return rows
+
+def _get_recent_rows_sync(limit: int) -> list:
+    """
+    قراءة آخر limit صف عبر الأقسام من الأحدث إلى الأقدم، والتوقف عند اكتمال العدد
+    """
+    rows: list = []
+    for partition in _read_order_sync():
+        rows = _get_tail_rows_sync(limit - len(rows), partition) + rows
+        if len(rows) >= limit:
+            break
+    return rows
+
+def _get_page_sync(partition: Optional[str], start: int, size: int) -> list:
+    """قراءة صفحة من الصفوف ابتداءً من start (استدعاء متزامن)"""
+    return list(get_worksheet(partition).get(
+        f"A{start}:D{start + size - 1}",
+        **READ_OPTIONS,
+    ))
+
+def _partition_in_range(partition: Optional[str], date_from: Optional[date], date_to: Optional[date]) -> bool:
+    """هل يمكن أن يحتوي القسم الشهري على تواريخ داخل النطاق (الورقة الأولى دائماً نعم)"""
+    if partition is None:
+        return True
+    month = partition[len(SPREADSHEET_NAME) + 1:]
+    return not (
+        (date_from is not None and month < date_from.strftime('%Y-%m'))
+        or (date_to is not None and month > date_to.strftime('%Y-%m'))
+    )
+
+def _filter_by_date(rows: list, date_from: Optional[date], date_to: Optional[date]) -> list:
+    """الصفوف التي يقع تاريخها داخل النطاق (بدون نطاق تعاد جميع الصفوف)"""
+    if date_from is None and date_to is None:
+        return rows
+    selected = []
+    for row in rows:
+        day = parse_date(row[0]) if row else None
+        if day is None:
+            continue
+        if (date_from is None or day >= date_from) and (date_to is None or day <= date_to):
+            selected.append(row)
+    return selected
+
+async def _iter_sheet_pages(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                            page_size: int = SHEETS_PAGE_SIZE) -> AsyncIterator[list]:
+    """
+    قراءة جميع المشتريات من Google Sheets من الأقدم إلى الأحدث على شكل صفحات
+
+    عند تفعيل النسخة المحلية تتم مزامنتها ثم القراءة منها، وإلا تتم القراءة
+    من Google Sheets بنطاقات محدودة. لا يتم الاحتفاظ بأكثر من صفحة واحدة في
+    الذاكرة، والأقسام الشهرية خارج نطاق التاريخ لا تتم قراءتها.
+
+    المعطيات:
+        date_from (date): أول تاريخ (اختياري)
+        date_to (date): آخر تاريخ (اختياري)
+        page_size (int): عدد الصفوف في كل صفحة
+
+    تعيد:
+        مولد غير متزامن لقوائم صفوف [التاريخ، المنتج، السعر، الملاحظات]
+    """
+    loop = asyncio.get_running_loop()
+    page_size = max(1, page_size)
+    order = await _get_read_order()
+    for partition in reversed(order):
+        if not _partition_in_range(partition, date_from, date_to):
+            continue
+
+        if MIRROR_ENABLED:
+            key = _mirror_key(partition)
+            try:
+                await sync_mirror(partition)
+            except Exception as e:
+                logger.warning(f"تعذرت مزامنة '{key}'، سيتم تصدير النسخة المحلية المتوفرة: {str(e)}")
+            mirror = get_mirror()
+            after_row = 1
+            while True:
+                records = await loop.run_in_executor(None, mirror.page, key, after_row, page_size)
+                if not records:
+                    break
+                after_row = records[-1][0]
+                rows = _filter_by_date([row for _, row in records], date_from, date_to)
+                if rows:
+                    yield rows
+        else:
+            start = 2
+            while True:
+                values = await call_sheets('read', _get_page_sync, partition, start, page_size)
+                rows = _filter_by_date(values, date_from, date_to)
+                if rows:
+                    yield rows
+                if len(values) < page_size:
+                    break
+                start += page_size
+
+class SheetsBatchWriter:
+    """
+    كاتب خلفي يجمع الصفوف القادمة من جميع المستخدمين ويرسلها في طلب append_rows واحد
+
+    يتم الإرسال عندما يصل عدد الصفوف المنتظرة إلى max_rows أو عند مرور
+    interval_ms من وصول أول صف، أيهما أسبق. كل مستدعٍ ينتظر نتيجة دفعته الخاصة.
+    """
+
+    def __init__(self, max_rows: int = SHEETS_BATCH_SIZE, interval_ms: float = SHEETS_BATCH_INTERVAL_MS):
+        self.max_rows = max(1, max_rows)
+        self.interval = max(0.0, interval_ms / 1000)
+        self._pending: list = []  # (الصفوف، المستقبل، تحليل الأداء الجاري للمستدعي)
+        self._pending_rows = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def pending_rows(self) -> int:
+        """عدد الصفوف التي تنتظر الإرسال"""
+        return self._pending_rows
+
+    async def submit(self, rows: list) -> int:
+        """
+        إضافة صفوف إلى الدفعة التالية وانتظار نتيجة إرسالها
+
+        تعيد:
+            int: عدد الصفوف التي تمت إضافتها
+
+        ترفع:
+            نفس الاستثناء الذي رفعه طلب append_rows إذا فشل
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((rows, future, current_profile()))
+        self._pending_rows += len(rows)
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        if len(self._pending) == 1 or self._pending_rows >= self.max_rows:
+            self._wakeup.set()
+
+        return await future
+
+    async def _run(self) -> None:
+        """حلقة الكاتب الخلفي"""
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # انتظار امتلاء الدفعة أو انتهاء المهلة (إلا عند الإغلاق)
+            if self._pending_rows < self.max_rows and self.interval > 0 and not self._closing:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            await self._flush()
+
+    async def _flush(self) -> None:
+        """إرسال الصفوف المنتظرة في طلب واحد"""
+        # أخذ مجموعات كاملة حتى الحد الأقصى، والباقي ينتظر الدورة التالية
+        batch = []
+        batch_rows = 0
+        while self._pending and (not batch or batch_rows + len(self._pending[0][0]) <= self.max_rows):
+            rows, future, profile = self._pending.pop(0)
+            batch.append((rows, future, profile))
+            batch_rows += len(rows)
+        self._pending_rows -= batch_rows
+        if not batch:
+            return
+
+        # نسب الطلب إلى أول تحديث جاري تحليله في الدفعة (إن وجد)
+        profile = next((profile for _, _, profile in batch if profile is not None), None)
+        try:
+            with use_profile(profile):
+                await call_sheets('write', _append_rows_sync, [row for rows, _, _ in batch for row in rows])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            logger.debug(f"تم إرسال دفعة من {batch_rows} صف إلى Google Sheets")
+            for rows, future, _ in batch:
+                if not future.done():
+                    future.set_result(len(rows))
+
+    async def close(self) -> None:
+        """إرسال ما تبقى من صفوف وإيقاف الكاتب"""
+        # الإلغاء قد يقطع دفعة أثناء إرسالها فتضيع صفوفها، لذلك يتم تنبيه المهمة
+        # وانتظارها حتى تنهي الدفعة الجارية وما تبقى ثم تتوقف من تلقاء نفسها
+        self._closing = True
+        self._wakeup.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        while self._pending:
+            await self._flush()
+
+# كاتب واحد لكل حلقة أحداث
+_batch_writers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, SheetsBatchWriter]" = weakref.WeakKeyDictionary()
+
+def get_batch_writer() -> SheetsBatchWriter:
+    """
+    الحصول على الكاتب الخلفي الخاص بحلقة الأحداث الحالية
+    """
+    loop = asyncio.get_running_loop()
+    writer = _batch_writers.get(loop)
+    if writer is None:
+        writer = _batch_writers[loop] = SheetsBatchWriter()
+    return writer
+
+gauge(
+    'sheets_batch_pending_rows', 'عدد الصفوف المنتظرة في الكاتب الخلفي',
+    callback=lambda: sum(writer.pending_rows for writer in list(_batch_writers.values()))
+)
+
+async def close_batch_writer() -> None:
+    """
+    إرسال الصفوف المتبقية وإيقاف الكاتب الخلفي (يستخدم عند إغلاق البرنامج)
+    """
+    writer = _batch_writers.pop(asyncio.get_running_loop(), None)
+    if writer is not None:
+        await writer.close()
+
+# صندوق الصادر المحلي (مشترك بين جميع حلقات الأحداث)
+_outbox: Optional[Outbox] = None
+
+# مهمة مزامنة واحدة لكل حلقة أحداث
+_outbox_syncers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OutboxSyncer]" = weakref.WeakKeyDictionary()
+
+def get_outbox() -> Outbox:
+    """
+    الحصول على صندوق الصادر المحلي
+    """
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(OUTBOX_PATH)
+    return _outbox
+
+def get_outbox_syncer() -> OutboxSyncer:
+    """
+    الحصول على مهمة مزامنة صندوق الصادر الخاصة بحلقة الأحداث الحالية
+    """
+    loop = asyncio.get_running_loop()
+    syncer = _outbox_syncers.get(loop)
+    if syncer is None:
+        syncer = _outbox_syncers[loop] = OutboxSyncer(
+            get_outbox(),
+            lambda rows: get_batch_writer().submit(rows),
+            SHEETS_BATCH_SIZE
+        )
+    return syncer
+
+def start_outbox_sync() -> None:
+    """
+    بدء مزامنة صندوق الصادر في الخلفية (لإرسال ما تبقى من التشغيل السابق)
+    """
+    if OUTBOX_ENABLED:
+        get_outbox_syncer().start()
+
+async def flush_outbox() -> bool:
+    """
+    محاولة إرسال جميع الصفوف المنتظرة في صندوق الصادر الآن
+
+    تعيد:
+        bool: True إذا لم يتبق أي صف منتظر
+    """
+    if not OUTBOX_ENABLED:
+        return True
+    return await get_outbox_syncer().flush()
+
+async def close_outbox_sync() -> None:
+    """
+    إيقاف مزامنة صندوق الصادر (يستخدم عند إغلاق البرنامج)
+    """
+    syncer = _outbox_syncers.pop(asyncio.get_running_loop(), None)
+    if syncer is not None:
+        await syncer.close()
+
+def get_outbox_stats() -> dict:
+    """
+    الحصول على عدد الصفوف المنتظرة وعمر أقدمها بالثواني
+    """
+    return get_outbox().stats()
+
+if OUTBOX_ENABLED:
+    gauge('outbox_pending_rows', 'عدد الصفوف المنتظرة في صندوق الصادر المحلي',
+          callback=lambda: get_outbox_stats()['pending'])
+    gauge('outbox_oldest_age_seconds', 'عمر أقدم صف منتظر في صندوق الصادر',
+          callback=lambda: get_outbox_stats()['oldest_age_seconds'])
+
+# مجاميع المصروفات المحلية
+_aggregates: Optional[SpendingAggregates] = None
+
+def get_aggregates() -> SpendingAggregates:
+    """
+    الحصول على مجاميع المصروفات المحلية
+    """
+    global _aggregates
+    if _aggregates is None:
+        _aggregates = SpendingAggregates(AGGREGATES_PATH)
+    return _aggregates
+
+def _update_aggregates(rows: list) -> None:
+    """تحديث المجاميع بالصفوف المقبولة"""
+    get_aggregates().add(rows)
+
+add_append_listener(_update_aggregates)
+
+def _get_all_rows_sync() -> list:
+    """
+    قراءة جميع صفوف البيانات (بدون صف العناوين) من جميع الأقسام في طلب واحد
+    (استدعاء متزامن)
+    """
+    titles = [
+        partition if partition is not None else get_worksheet().title
+        for partition in reversed(_read_order_sync())
+    ]
+    with _worksheet_lock:
+        spreadsheet = _get_spreadsheet(_get_client())
+    response = spreadsheet.values_batch_get(
+        ["'{}'!A2:D".format(title.replace("'", "''")) for title in titles],
+        params={
+            "valueRenderOption": READ_OPTIONS["value_render_option"],
+            "dateTimeRenderOption": READ_OPTIONS["date_time_render_option"],
+        },
+    )
+    rows: list = []
+    for value_range in response.get("valueRanges", []):
+        rows.extend(value_range.get("values", []))
+    return rows
+
+async def _get_sheet_history_rows() -> list:
+    """
+    جميع المشتريات: صفوف ورقة العمل ثم الصفوف التي ما زالت في صندوق الصادر
+    (لأنها لم تصل إلى الورقة بعد)
+    """
+    if not OUTBOX_ENABLED:
+        return await call_sheets('read', _get_all_rows_sync)
+    # الدفعة الجارية إرسالها قد تكون في الورقة وفي الصندوق معاً، فتتم القراءتان
+    # والإرسال متوقف حتى لا تحسب صفوفها مرتين
+    async with get_outbox_syncer().paused():
+        rows = await call_sheets('read', _get_all_rows_sync)
+        rows += await asyncio.get_running_loop().run_in_executor(None, get_outbox().pending_rows)
+    return rows
+
+async def rebuild_aggregates() -> int:
+    """
+    إعادة بناء مجاميع المصروفات من ورقة العمل
+
+    تعيد:
+        عدد الصفوف التي تمت معالجتها
+    """
+    rows = await get_storage().all_rows()
+    await asyncio.get_running_loop().run_in_executor(None, get_aggregates().rebuild, rows)
+    logger.info(f"تمت إعادة بناء الإحصائيات من {len(rows)} صف")
+    return len(rows)
+
+def _get_spending_report_sync(limit: int) -> dict:
+    """قراءة التقرير من المجاميع المحلية (استدعاء متزامن)"""
+    aggregates = get_aggregates()
+    current = period_keys(datetime.now().date())
+    return {
+        'today': aggregates.total('day', current['day']),
+        'this_week': aggregates.total('week', current['week']),
+        'this_month': aggregates.total('month', current['month']),
+        'days': aggregates.top('day', limit),
+        'weeks': aggregates.top('week', limit),
+        'months': aggregates.top('month', limit),
+        'products': aggregates.top('product', limit),
+    }
+
+async def get_spending_report(limit: int = 5) -> dict:
+    """
+    الحصول على تقرير المصروفات حسب اليوم والأسبوع والشهر والمنتج
+
+    المعطيات:
+        limit (int): عدد الفترات والمنتجات في كل قسم
+
+    تعيد:
+        قاموس يحتوي على مجاميع اليوم والأسبوع والشهر الحالي بالشكل (المجموع، العدد)،
+        وقوائم days و weeks و months و products بالشكل (المفتاح، المجموع، العدد)
+    """
+    return await asyncio.get_running_loop().run_in_executor(None, _get_spending_report_sync, limit)
+
+# فهرس البحث المحلي
+_search_index: Optional[SearchIndex] = None
+
+def get_search_index() -> SearchIndex:
+    """
+    الحصول على فهرس البحث المحلي
+    """
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex(SEARCH_INDEX_PATH)
+    return _search_index
+
+def _update_search_index(rows: list) -> None:
+    """فهرسة الصفوف المقبولة"""
+    get_search_index().add(rows)
+
+add_append_listener(_update_search_index)
+
+async def rebuild_search_index() -> int:
+    """
+    إعادة بناء فهرس البحث من ورقة العمل
+
+    تعيد:
+        عدد الصفوف المفهرسة
+    """
+    rows = await get_storage().all_rows()
+    count = await asyncio.get_running_loop().run_in_executor(None, get_search_index().rebuild, rows)
+    logger.info(f"تمت إعادة بناء فهرس البحث من {count} صف")
+    await load_product_index()
+    return count
+
+async def search_purchases(query: str, limit: int = 20) -> list:
+    """
+    البحث في أسماء المنتجات والملاحظات (محلياً، بدون الاتصال بـ Google Sheets)
+
+    المعطيات:
+        query (str): نص البحث (يتم توحيد الحروف العربية والأرقام)
+        limit (int): الحد الأقصى لعدد النتائج
+
+    تعيد:
+        قائمة بالمنتجات بنفس شكل get_products، من الأحدث إلى الأقدم
+    """
+    rows = await asyncio.get_running_loop().run_in_executor(None, get_search_index().search, query, limit)
+    products = []
+    for row in rows:
+        try:
+            products.append(_row_to_product(row))
+        except (IndexError, ValueError) as e:
+            logger.warning(f"خطأ في تحويل الصف {row}: {str(e)}")
+    return products
+
+# فهرس أسماء المنتجات في الذاكرة (يتم تحميله من فهرس البحث عند بدء التشغيل)
+_product_index = ProductIndex()
+
+def get_product_index() -> ProductIndex:
+    """
+    الحصول على فهرس أسماء المنتجات
+    """
+    return _product_index
+
+def _update_product_index(rows: list) -> None:
+    """إضافة الصفوف المقبولة إلى فهرس أسماء المنتجات"""
+    _product_index.add(rows)
+
+add_append_listener(_update_product_index)
+
+async def load_product_index() -> int:
+    """
+    بناء فهرس أسماء المنتجات من فهرس البحث المحلي (بدون الاتصال بـ Google Sheets)
+
+    تعيد:
+        عدد المنتجات المختلفة
+    """
+    global _product_index
+    rows = await asyncio.get_running_loop().run_in_executor(None, get_search_index().rows)
+    index = ProductIndex()
+    index.add(rows)
+    _product_index = index
+    logger.info(f"تم تحميل {len(index)} منتج لاقتراحات الإكمال التلقائي")
+    return len(index)
+
+def suggest_products(text: str, limit: int = 3) -> List[ProductSuggestion]:
+    """
+    اقتراح منتجات سبق شراؤها قريبة من النص مع آخر سعر والسعر الوسيط
+    (في الذاكرة، أقل من مللي ثانية)
+    """
+    return _product_index.suggest(text, limit)
+
+async def _append_to_sheets(rows: list) -> None:
+    """
+    إرسال صفوف إلى Google Sheets
+
+    عند تفعيل صندوق الصادر يتم حفظها محلياً والرد فوراً، وإلا يتم إرسالها
+    مباشرة عبر الكاتب الخلفي.
+    """
+    if OUTBOX_ENABLED:
+        await get_outbox_syncer().enqueue(rows)
+    else:
+        await get_batch_writer().submit(rows)
+
+async def _write_rows(rows: list) -> None:
+    """
+    كتابة صفوف تم التحقق منها في محرك التخزين ثم إبلاغ المستمعين (مثل الإحصائيات)
+    """
+    await get_storage().append(rows)
+    await asyncio.get_running_loop().run_in_executor(None, notify_appended, rows)
 
 def validate_product_data(product: str, price: float) -> None:
     """
@@ -108,6 +1464,9 @@ def format_date(dt: datetime) -> str:
 async def add_to_sheets(product: str, price: float, notes: str = "") -> bool:
     """
     إضافة منتج جديد إلى Google Sheets
+
+    عند تفعيل صندوق الصادر (OUTBOX_ENABLED) يتم حفظ المنتج محلياً والرد
+    فوراً، ثم يتم إرساله إلى Google Sheets في الخلفية.
     
     المعطيات:
         product (str): اسم المنتج
@@ -125,12 +1484,9 @@ async def add_to_sheets(product: str, price: float, notes: str = "") -> bool:
         # التحقق من صحة البيانات
         validate_product_data(product, price)
         
-        # الحصول على ورقة العمل
-        worksheet = get_worksheet()
-        
-        # إضافة البيانات
+        # إضافة البيانات (عبر صندوق الصادر أو الكاتب الخلفي)
         date = format_date(datetime.now())
-        worksheet.append_row([date, product, price, notes])
+        await _write_rows([[date, product, price, notes]])
         logger.info(f"تمت إضافة المنتج: {product} بسعر {price}")
         return True
         
@@ -157,7 +1513,6 @@ async def add_multiple_to_sheets(products: list) -> Tuple[int, list]:
     تعيد:
         عدد المنتجات التي تمت إضافتها بنجاح وقائمة بالأخطاء
     """
-    worksheet = get_worksheet()
     success_count = 0
     errors = []
     
@@ -175,37 +1530,50 @@ async def add_multiple_to_sheets(products: list) -> Tuple[int, list]:
             errors.append(f"خطأ في المنتج {product}: {str(e)}")
     
     if rows_to_add:
-        worksheet.append_rows(rows_to_add)
+        await _write_rows(rows_to_add)
     
     return success_count, errors
 
-async def get_products(limit: int = 10) -> list:
+def _row_to_product(row: list) -> dict:
+    """
+    تحويل صف [التاريخ، المنتج، السعر، الملاحظات] إلى قاموس
+
+    ترفع:
+        IndexError, ValueError: إذا كان الصف غير صالح
+    """
+    return {
+        'date': str(row[0]),
+        'name': str(row[1]),
+        'price': float(row[2]),
+        'notes': str(row[3]) if len(row) > 3 else ''
+    }
+
+async def get_products(limit: int = 10, max_staleness: Optional[float] = None) -> list:
     """
     الحصول على آخر المنتجات المضافة
+
+    عند تفعيل النسخة المحلية (MIRROR_ENABLED) تتم القراءة منها، ولا يتم
+    الاتصال بـ Google Sheets إلا إذا كان عمرها أكبر من max_staleness.
     
     المعطيات:
         limit (int): عدد المنتجات التي يجب إرجاعها (افتراضي: 10)
+        max_staleness (float): أقصى عمر مسموح للنسخة المحلية بالثواني (افتراضي: MIRROR_MAX_STALENESS)
         
     تعيد:
         قائمة بالمنتجات
     """
     try:
-        worksheet = get_worksheet()
-        
-        # الحصول على جميع القيم
-        values = worksheet.get_all_values()
+        if limit <= 0:
+            return []
+
+        # قراءة آخر الصفوف فقط (بدون صف العناوين)
+        values = await get_storage().recent(limit, max_staleness)
         
         # تحويل القيم إلى قائمة من القواميس
         products = []
-        # تخطي الصف الأول (العناوين)
-        for row in values[-limit:]:
+        for row in values:
             try:
-                products.append({
-                    'date': row[0],
-                    'name': row[1],
-                    'price': float(row[2]),
-                    'notes': row[3] if len(row) > 3 else ''
-                })
+                products.append(_row_to_product(row))
             except (IndexError, ValueError) as e:
                 logger.warning(f"خطأ في تحويل الصف {row}: {str(e)}")
                 continue
@@ -215,3 +1583,57 @@ async def get_products(limit: int = 10) -> list:
     except Exception as e:
         logger.error(f"خطأ في الحصول على المنتجات: {str(e)}")
         return []
+
+async def iter_purchase_pages(date_from: Optional[date] = None, date_to: Optional[date] = None,
+                              page_size: int = SHEETS_PAGE_SIZE) -> AsyncIterator[list]:
+    """
+    قراءة جميع المشتريات من الأقدم إلى الأحدث على شكل صفحات (من محرك التخزين المستخدم)
+
+    المعطيات:
+        date_from (date): أول تاريخ (اختياري)
+        date_to (date): آخر تاريخ (اختياري)
+        page_size (int): عدد الصفوف في كل صفحة
+
+    تعيد:
+        مولد غير متزامن لقوائم صفوف [التاريخ، المنتج، السعر، الملاحظات]
+    """
+    async for page in get_storage().iter_pages(date_from, date_to, page_size):
+        yield page
+
+class SheetsBackend(StorageBackend):
+    """
+    محرك تخزين Google Sheets
+
+    الكتابة عبر صندوق الصادر أو الكاتب الخلفي، والقراءة من النسخة المحلية
+    عند تفعيلها (MIRROR_ENABLED).
+    """
+
+    name = 'sheets'
+
+    async def append(self, rows: list) -> None:
+        await _append_to_sheets(rows)
+
+    async def recent(self, limit: int, max_staleness: Optional[float] = None) -> list:
+        if MIRROR_ENABLED:
+            if max_staleness is None:
+                max_staleness = MIRROR_MAX_STALENESS
+            return await _get_recent_from_mirror(limit, max_staleness)
+        return await call_sheets('read', _get_recent_rows_sync, limit)
+
+    def iter_pages(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                   page_size: int = SHEETS_PAGE_SIZE) -> AsyncIterator[list]:
+        return _iter_sheet_pages(date_from, date_to, page_size)
+
+    async def all_rows(self) -> list:
+        return await _get_sheet_history_rows()
+
+    def start(self) -> None:
+        # إرسال المشتريات التي بقيت في صندوق الصادر من التشغيل السابق
+        start_outbox_sync()
+
+    async def flush(self) -> bool:
+        return await flush_outbox()
+
+    async def close(self) -> None:
+        await close_outbox_sync()
+        await close_batch_writer()
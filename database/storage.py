@@ -0,0 +1,345 @@
+"""
+واجهة تخزين المشتريات
+
+تستدعي المعالجات و cli.py نفس الدوال (add_to_sheets و get_products و
+iter_purchase_pages في database/sheets.py) أياً كان مكان التخزين، وهذه
+الدوال تمرر القراءة والكتابة إلى المحرك المختار في STORAGE_BACKEND:
+    - sheets: Google Sheets (مع صندوق الصادر والنسخة المحلية)، انظر SheetsBackend
+    - sqlite: قاعدة بيانات SQLite محلية مفهرسة حسب التاريخ والمنتج
+    - csv: ملف CSV محلي تتم الإضافة إلى نهايته فقط
+
+المحركات المحلية لا تتصل بالشبكة، فتكون الكتابة أسرع بكثير من Google Sheets.
+"""
+import os
+import csv
+import asyncio
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import AsyncIterator, Iterator, List, Optional
+from src.config import STORAGE_BACKEND, STORAGE_SQLITE_PATH, STORAGE_CSV_PATH
+from database.aggregates import parse_date
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# رؤوس الأعمدة في الملفات المحلية
+HEADERS = ["التاريخ", "المنتج", "السعر", "ملاحظات"]
+
+def _cells(row: list) -> list:
+    """خلايا الصف الأربع [التاريخ، المنتج، السعر، الملاحظات]"""
+    return (list(row) + [''] * 4)[:4]
+
+def _in_range(day: Optional[date], date_from: Optional[date], date_to: Optional[date]) -> bool:
+    if day is None:
+        return False
+    return (date_from is None or day >= date_from) and (date_to is None or day <= date_to)
+
+class StorageBackend(ABC):
+    """
+    محرك تخزين المشتريات
+
+    الصفوف بالشكل [التاريخ، المنتج، السعر، الملاحظات] وتم التحقق منها مسبقاً.
+    """
+
+    name = ''
+
+    @abstractmethod
+    async def append(self, rows: list) -> None:
+        """حفظ صفوف جديدة"""
+
+    @abstractmethod
+    async def recent(self, limit: int, max_staleness: Optional[float] = None) -> list:
+        """آخر limit صف بالترتيب من الأقدم إلى الأحدث"""
+
+    @abstractmethod
+    def iter_pages(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                   page_size: int = 1000) -> AsyncIterator[list]:
+        """جميع الصفوف من الأقدم إلى الأحدث على شكل صفحات (لا يحتفظ بأكثر من صفحة في الذاكرة)"""
+
+    @abstractmethod
+    async def all_rows(self) -> list:
+        """جميع الصفوف (لإعادة بناء الإحصائيات وفهرس البحث)"""
+
+    def start(self) -> None:
+        """بدء المهام الخلفية بعد تشغيل البوت"""
+
+    async def flush(self) -> bool:
+        """
+        إرسال ما لم يحفظ نهائياً بعد
+
+        تعيد:
+            bool: True إذا لم يتبق أي صف منتظر
+        """
+        return True
+
+    async def close(self) -> None:
+        """حفظ ما تبقى وإيقاف المهام الخلفية (عند إغلاق البرنامج)"""
+
+class _LocalBackend(StorageBackend):
+    """محرك محلي: ينفذ الدوال المتزامنة *_sync في منفذ الخيوط الافتراضي"""
+
+    async def _run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def append(self, rows: list) -> None:
+        await self._run(self.append_sync, rows)
+
+    async def recent(self, limit: int, max_staleness: Optional[float] = None) -> list:
+        return await self._run(self.recent_sync, limit)
+
+    async def all_rows(self) -> list:
+        return await self._run(self.all_rows_sync)
+
+    async def iter_pages(self, date_from: Optional[date] = None, date_to: Optional[date] = None,
+                         page_size: int = 1000) -> AsyncIterator[list]:
+        pages = self.pages_sync(date_from, date_to, max(1, page_size))
+        while True:
+            page = await self._run(next, pages, None)
+            if page is None:
+                break
+            yield page
+
+    @abstractmethod
+    def append_sync(self, rows: list) -> None: ...
+
+    @abstractmethod
+    def recent_sync(self, limit: int) -> list: ...
+
+    @abstractmethod
+    def all_rows_sync(self) -> list: ...
+
+    @abstractmethod
+    def pages_sync(self, date_from: Optional[date], date_to: Optional[date], page_size: int) -> Iterator[list]: ...
+
+class SQLiteBackend(_LocalBackend):
+    """
+    تخزين المشتريات في SQLite مع فهرس على التاريخ وفهرس على اسم المنتج
+
+    يحفظ التاريخ كما أدخل، ومعه عمود day بصيغة YYYY-MM-DD للاستعلام بنطاق تاريخ.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """فتح قاعدة البيانات وإنشاء الجدول عند الحاجة"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS purchases (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    date,
+                    day TEXT,
+                    product,
+                    price,
+                    notes
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS purchases_by_day ON purchases (day)")
+            conn.execute("CREATE INDEX IF NOT EXISTS purchases_by_product ON purchases (product)")
+            self._conn = conn
+        return self._conn
+
+    def append_sync(self, rows: list) -> None:
+        records = []
+        for row in rows:
+            date_value, product, price, notes = _cells(row)
+            day = parse_date(date_value)
+            records.append((date_value, day.isoformat() if day else None, product, price, notes))
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "INSERT INTO purchases (date, day, product, price, notes) VALUES (?, ?, ?, ?, ?)",
+                    records
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def recent_sync(self, limit: int) -> list:
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT date, product, price, notes FROM purchases ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [list(record) for record in reversed(records)]
+
+    def all_rows_sync(self) -> list:
+        with self._lock:
+            records = self._connect().execute(
+                "SELECT date, product, price, notes FROM purchases ORDER BY id"
+            ).fetchall()
+        return [list(record) for record in records]
+
+    def pages_sync(self, date_from: Optional[date], date_to: Optional[date], page_size: int) -> Iterator[list]:
+        # الصفوف بتاريخ غير صالح لا تظهر في التصدير (مثل القراءة من Google Sheets)
+        conditions = ["id > ?", "day IS NOT NULL"]
+        params: list = []
+        if date_from is not None:
+            conditions.append("day >= ?")
+            params.append(date_from.isoformat())
+        if date_to is not None:
+            conditions.append("day <= ?")
+            params.append(date_to.isoformat())
+        query = (
+            "SELECT id, date, product, price, notes FROM purchases "
+            f"WHERE {' AND '.join(conditions)} ORDER BY id LIMIT ?"
+        )
+        after_id = 0
+        while True:
+            with self._lock:
+                records = self._connect().execute(query, (after_id, *params, page_size)).fetchall()
+            if not records:
+                return
+            after_id = records[-1][0]
+            yield [list(record[1:]) for record in records]
+            if len(records) < page_size:
+                return
+
+class CSVBackend(_LocalBackend):
+    """
+    تخزين المشتريات في ملف CSV تتم الإضافة إلى نهايته فقط
+
+    كل شراء في سطر واحد (الأسطر الجديدة داخل الخلايا تستبدل بمسافات)، لذلك
+    تتم قراءة آخر المشتريات من نهاية الملف دون قراءته بالكامل.
+    """
+
+    name = 'csv'
+
+    # حجم الكتلة عند القراءة من نهاية الملف
+    TAIL_BLOCK_SIZE = 64 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _open(self):
+        """فتح الملف للإضافة وكتابة الرؤوس إذا كان جديداً"""
+        if self._file is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self.path, 'a', encoding='utf-8', newline='')
+            if self._file.tell() == 0:
+                csv.writer(self._file).writerow(HEADERS)
+        return self._file
+
+    def append_sync(self, rows: list) -> None:
+        with self._lock:
+            stream = self._open()
+            csv.writer(stream).writerows(
+                [str(cell).replace('\r', ' ').replace('\n', ' ') for cell in _cells(row)]
+                for row in rows
+            )
+            stream.flush()
+            os.fsync(stream.fileno())
+
+    def _read_rows(self) -> Iterator[list]:
+        """قراءة جميع الصفوف (بدون الرؤوس) من الأقدم إلى الأحدث"""
+        try:
+            with open(self.path, encoding='utf-8', newline='') as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                yield from reader
+        except FileNotFoundError:
+            return
+
+    def _tail_lines(self, limit: int) -> List[str]:
+        """آخر limit سطر من الملف بقراءة كتل من النهاية"""
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return []
+        with f:
+            position = f.seek(0, os.SEEK_END)
+            data = b''
+            while position > 0 and data.count(b'\n') <= limit:
+                size = min(self.TAIL_BLOCK_SIZE, position)
+                position -= size
+                f.seek(position)
+                data = f.read(size) + data
+        # التقسيم قبل فك الترميز: الكتلة قد تبدأ في منتصف حرف عربي (عدة بايتات)،
+        # لكن كل سطر بعد أول فاصل أسطر كامل
+        lines = data.splitlines()
+        # أول سطر هو الرؤوس (بداية الملف) أو جزء من سطر
+        lines = lines[1:]
+        if limit <= 0:
+            return []
+        return [line.decode('utf-8') for line in lines[-limit:]]
+
+    def recent_sync(self, limit: int) -> list:
+        with self._lock:
+            lines = self._tail_lines(limit)
+        return [row for row in csv.reader(lines) if row]
+
+    def all_rows_sync(self) -> list:
+        return [row for row in self._read_rows() if row]
+
+    def pages_sync(self, date_from: Optional[date], date_to: Optional[date], page_size: int) -> Iterator[list]:
+        page = []
+        for row in self._read_rows():
+            if row and _in_range(parse_date(row[0]), date_from, date_to):
+                page.append(row)
+                if len(page) >= page_size:
+                    yield page
+                    page = []
+        if page:
+            yield page
+
+    async def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+# المحرك المستخدم (مشترك بين جميع حلقات الأحداث)
+_storage: Optional[StorageBackend] = None
+_storage_lock = threading.Lock()
+
+def create_storage(name: str) -> StorageBackend:
+    """
+    إنشاء محرك تخزين حسب الاسم
+
+    ترفع:
+        ValueError: إذا كان الاسم غير معروف
+    """
+    if name == 'sheets':
+        from database.sheets import SheetsBackend
+        return SheetsBackend()
+    if name == 'sqlite':
+        return SQLiteBackend(STORAGE_SQLITE_PATH)
+    if name == 'csv':
+        return CSVBackend(STORAGE_CSV_PATH)
+    raise ValueError(f"محرك تخزين غير معروف: {name} (المتاح: sheets, sqlite, csv)")
+
+def get_storage() -> StorageBackend:
+    """
+    الحصول على محرك التخزين المحدد في STORAGE_BACKEND
+    """
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            _storage = create_storage(STORAGE_BACKEND)
+            logger.debug(f"محرك التخزين: {_storage.name}")
+        return _storage
+
+def set_storage(storage: Optional[StorageBackend]) -> None:
+    """استبدال محرك التخزين (None للعودة إلى STORAGE_BACKEND)"""
+    global _storage
+    with _storage_lock:
+        _storage = storage
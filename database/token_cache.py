@@ -0,0 +1,116 @@
+"""
+ذاكرة مؤقتة على القرص لرمز الوصول (OAuth) ومعرف جدول البيانات
+
+كل تشغيل جديد لـ cli.py كان يطلب رمز وصول جديداً من Google ثم يبحث عن
+جدول البيانات بالاسم في Drive قبل أي قراءة أو كتابة. يتم حفظ الرمز مع وقت
+انتهائه ومعرف جدول البيانات في ملف JSON لا يقرؤه إلا المستخدم الحالي (0600)،
+فيبدأ التشغيل التالي مباشرة بالطلب المطلوب ما دام الرمز صالحاً.
+
+الرموز مرتبطة بحساب الخدمة والصلاحيات، فتغيير credentials.json لا يستخدم رمزاً قديماً.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Optional, Tuple
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# لا يستخدم الرمز إذا بقي على انتهائه أقل من هذه المدة (بالثواني)
+EXPIRY_MARGIN = 300
+
+class TokenCache:
+    """
+    ملف JSON بالشكل:
+        {"tokens": {الحساب: {"token": ..., "expires_at": ...}},
+         "spreadsheets": {الحساب/الاسم: المعرف}}
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"تعذرت قراءة ذاكرة الرموز المؤقتة، سيتم تجاهلها: {str(e)}")
+            return {}
+
+    def _save(self, data: dict) -> None:
+        """كتابة الملف بصلاحيات 0600 ثم استبدال القديم (لا يرى أحد ملفاً نصف مكتوب)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            logger.warning(f"تعذر حفظ ذاكرة الرموز المؤقتة: {str(e)}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _update(self, section: str, key: str, value) -> None:
+        with self._lock:
+            data = self._load()
+            entries = data.setdefault(section, {})
+            if value is None:
+                entries.pop(key, None)
+            else:
+                entries[key] = value
+            self._save(data)
+
+    def get_token(self, account: str) -> Optional[Tuple[str, datetime]]:
+        """
+        الرمز المحفوظ إذا كان صالحاً لمدة EXPIRY_MARGIN على الأقل
+
+        تعيد:
+            (الرمز، وقت الانتهاء بتوقيت UTC بدون منطقة زمنية كما في google-auth) أو None
+        """
+        with self._lock:
+            entry = self._load().get('tokens', {}).get(account)
+        try:
+            expires_at = float(entry['expires_at'])
+            token = entry['token']
+        except (TypeError, KeyError, ValueError):
+            return None
+        if expires_at - time.time() < EXPIRY_MARGIN:
+            return None
+        return token, datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+
+    def set_token(self, account: str, token: str, expiry: Optional[datetime]) -> None:
+        """حفظ رمز جديد (expiry بتوقيت UTC بدون منطقة زمنية)"""
+        if not token or expiry is None:
+            return
+        expires_at = expiry.replace(tzinfo=timezone.utc).timestamp()
+        self._update('tokens', account, {'token': token, 'expires_at': expires_at})
+
+    def get_spreadsheet_id(self, account: str, name: str) -> Optional[str]:
+        with self._lock:
+            return self._load().get('spreadsheets', {}).get(f"{account}/{name}")
+
+    def set_spreadsheet_id(self, account: str, name: str, spreadsheet_id: Optional[str]) -> None:
+        """حفظ معرف جدول البيانات (None لحذفه)"""
+        self._update('spreadsheets', f"{account}/{name}", spreadsheet_id)
+
+    def clear(self) -> None:
+        """حذف الملف"""
+        with self._lock:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
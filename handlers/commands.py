@@ -1,10 +1,18 @@
 """
 معالجات الأوامر
 """
+import logging
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
 from src.config import WELCOME_MESSAGE as welcome_message
-from database.sheets import add_to_sheets
+from src.message_queue import reply
+from handlers.suggestions import ask_price, handle_price_input
+from database.sheets import add_to_sheets, get_spending_report, search_purchases
+from utils.report_formatter import format_spending_report, format_purchases
+from utils.metrics import HANDLER_SECONDS, timed
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
 
 # كلمات تخطي الملاحظات
 SKIP_NOTES_WORDS = [".", "لا", "-", "/s", "s", "لأ"]
@@ -19,8 +27,8 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     # مسح أي بيانات سابقة
     context.user_data.clear()
     
-    await update.message.reply_text("تم إلغاء العملية السابقة ")
-    await update.message.reply_text(welcome_message)
+    reply(update, "تم إلغاء العملية السابقة ")
+    reply(update, welcome_message)
     return PRODUCT  # العودة لحالة إدخال اسم المنتج
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -32,6 +40,8 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 /start - بدء محادثة جديدة
 /s - تخطي الملاحظات
 /cancel - إلغاء العملية الحالية
+/report - تقرير المصروفات
+/find - البحث في المشتريات السابقة (مثال: /find قهوة)
 /help - عرض هذه المساعدة
 
 يمكنك أيضاً تخطي الملاحظات عن طريق:
@@ -39,8 +49,35 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 - إرسال 'لا'
 - إرسال '-'
 """
-    await update.message.reply_text(help_text)
+    reply(update, help_text)
+
+async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالج أمر /report (يقرأ المجاميع المحلية دون الاتصال بـ Google Sheets)"""
+    try:
+        report = await get_spending_report()
+        reply(update, format_spending_report(report))
+    except Exception as e:
+        logger.error(f"خطأ في إنشاء التقرير: {str(e)}")
+        reply(update, f"حدث خطأ: {str(e)}")
+
+async def find_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """معالج أمر /find (يبحث في الفهرس المحلي دون الاتصال بـ Google Sheets)"""
+    query = " ".join(context.args or [])
+    if not query.strip():
+        reply(update, "اكتب ما تريد البحث عنه بعد الأمر، مثال: /find قهوة")
+        return
+
+    try:
+        results = await search_purchases(query)
+        if results:
+            reply(update, f"🔎 نتائج البحث عن \"{query}\":\n\n{format_purchases(results)}")
+        else:
+            reply(update, f"لا توجد مشتريات تطابق \"{query}\"")
+    except Exception as e:
+        logger.error(f"خطأ في البحث: {str(e)}")
+        reply(update, f"حدث خطأ: {str(e)}")
 
+@timed(HANDLER_SECONDS, 'handler', handler='skip_command')
 async def skip_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج أمر التخطي"""
     logger.debug("تم استدعاء skip_command") # إضافة تسجيل للتتبع
@@ -54,27 +91,27 @@ async def skip_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
             logger.debug(f"تخطي الملاحظات للمنتج: {product} بسعر {price}")
             
             await add_to_sheets(product, price, '')
-            await update.message.reply_text(f"تم إضافة {product} بسعر {price} بدون ملاحظات")
+            reply(update, f"تم إضافة {product} بسعر {price} بدون ملاحظات")
             
             context.user_data.clear()
-            await update.message.reply_text(welcome_message)
+            reply(update, welcome_message)
             return ConversationHandler.END
             
         # إذا كنا في مرحلة السعر
         elif context.user_data.get('product'):
             print("DEBUG: لدينا منتج فقط - لا يمكن تخطي السعر")
-            await update.message.reply_text("لا يمكن تخطي إدخال السعر. الرجاء إدخال السعر:")
+            reply(update, "لا يمكن تخطي إدخال السعر. الرجاء إدخال السعر:")
             return PRICE
             
         # إذا كنا في مرحلة المنتج
         else:
             print("DEBUG: لا يوجد منتج - لا يمكن تخطي اسم المنتج")
-            await update.message.reply_text("لا يمكن تخطي إدخال اسم المنتج. الرجاء إدخال اسم المنتج:")
+            reply(update, "لا يمكن تخطي إدخال اسم المنتج. الرجاء إدخال اسم المنتج:")
             return PRODUCT
             
     except Exception as e:
         print(f"DEBUG: حدث خطأ: {str(e)}")
-        await update.message.reply_text(f"حدث خطأ: {str(e)}")
+        reply(update, f"حدث خطأ: {str(e)}")
         return ConversationHandler.END
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -82,7 +119,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     بداية المحادثة مع البوت
     يتم تنفيذ هذه الدالة عند إرسال الأمر /start
     """
-    await update.message.reply_text(welcome_message)
+    reply(update, welcome_message)
     return ConversationHandler.END
 
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
@@ -90,39 +127,20 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     إلغاء المحادثة الحالية
     يتم تنفيذ هذه الدالة عند إرسال الأمر /cancel
     """
-    await update.message.reply_text("تم إلغاء العملية الحالية. يمكنك البدء من جديد.")
+    reply(update, "تم إلغاء العملية الحالية. يمكنك البدء من جديد.")
     return ConversationHandler.END
 
+@timed(HANDLER_SECONDS, 'handler', handler='handle_product')
 async def handle_product(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج إدخال اسم المنتج"""
-    product = update.message.text
-    context.user_data['product'] = product
-    await update.message.reply_text(f"تم استلام اسم المنتج: {product}\nالآن أدخل السعر:")
-    return PRICE
+    return ask_price(update, context, update.message.text)
 
+@timed(HANDLER_SECONDS, 'handler', handler='handle_price')
 async def handle_price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج إدخال السعر"""
-    try:
-        price = float(update.message.text)
-        if price <= 0:
-            await update.message.reply_text("السعر يجب أن يكون أكبر من صفر. الرجاء إدخال السعر مرة أخرى:")
-            return PRICE
-            
-        context.user_data['price'] = price
-        await update.message.reply_text(
-            f"تم استلام السعر: {price}\n"
-            "هل تريد إضافة ملاحظة؟\n"
-            "يمكنك تخطي الملاحظات عن طريق:\n"
-            "- إرسال '.' (نقطة)\n"
-            "- إرسال 'لا'\n"
-            "- إرسال '-'\n"
-            "- إرسال '/s'"
-        )
-        return NOTES
-    except ValueError:
-        await update.message.reply_text("الرجاء إدخال رقم صحيح للسعر:")
-        return PRICE
+    return await handle_price_input(update, context)
 
+@timed(HANDLER_SECONDS, 'handler', handler='handle_notes')
 async def handle_notes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج إدخال الملاحظات"""
     # تجاهل الرسالة إذا كان المستخدم قد استخدم skip
@@ -141,15 +159,15 @@ async def handle_notes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     try:
         await add_to_sheets(product, price, notes)
         if notes:
-            await update.message.reply_text(f"تم إضافة {product} بسعر {price} مع ملاحظة: {notes}")
+            reply(update, f"تم إضافة {product} بسعر {price} مع ملاحظة: {notes}")
         else:
-            await update.message.reply_text(f"تم إضافة {product} بسعر {price}")
+            reply(update, f"تم إضافة {product} بسعر {price}")
         
         # مسح بيانات المستخدم
         context.user_data.clear()
         
-        await update.message.reply_text(welcome_message)
+        reply(update, welcome_message)
         return ConversationHandler.END
     except Exception as e:
-        await update.message.reply_text(f"حدث خطأ: {str(e)}")
+        reply(update, f"حدث خطأ: {str(e)}")
         return ConversationHandler.END
@@ -4,9 +4,12 @@
 import logging
 from telegram import Update
 from telegram.ext import ContextTypes, ConversationHandler
-from src.config import WELCOME_MESSAGE as welcome_message, PRICE, NOTES
-from utils.number_converter import convert_to_english_numbers
-from database.sheets import add_to_sheets, add_multiple_to_sheets, SheetsError
+from src.config import WELCOME_MESSAGE as welcome_message
+from src.message_queue import reply
+from handlers.suggestions import ask_price, handle_price_input
+from utils.product_parser import parse_product_line, parse_product_lines
+from database.sheets import add_to_sheets, add_multiple_to_sheets, validate_product_data
+from utils.metrics import HANDLER_SECONDS, timed
 import traceback
 
 # إعداد التسجيل
@@ -15,50 +18,57 @@ logger = logging.getLogger(__name__)
 # كلمات تخطي الملاحظات
 SKIP_NOTES_WORDS = [".", "لا", "-", "/s", "s", "لأ"]
 
-def parse_product_line(line: str) -> tuple:
-    """تحليل سطر منتج واحد"""
-    try:
-        # تنظيف النص من المسافات الزائدة
-        line = ' '.join(line.split())
-        
-        # تحويل الأرقام العربية إلى إنجليزية
-        line = convert_to_english_numbers(line.strip())
-        if not line:
-            return None
-            
-        # تقسيم النص إلى كلمات
-        parts = line.split()
-        if len(parts) < 1:  
-            return None
-            
-        # البحث عن السعر (أول رقم نجده)
-        price_index = -1
-        for i, part in enumerate(parts):
-            try:
-                float(part)
-                price_index = i
-                break
-            except ValueError:
-                continue
-                
-        # إذا لم يتم العثور على سعر
-        if price_index == -1:
-            return " ".join(parts), None, ""
-            
-        # كل ما بعد السعر يعتبر ملاحظات
-        product = " ".join(parts[:price_index])
-        price = float(parts[price_index])
-        notes = " ".join(parts[price_index + 1:])
-        
-        return product.strip(), price, notes.strip()
+async def handle_multiple_lines(update: Update, text: str) -> int:
+    """
+    معالج رسالة تحتوي على عدة منتجات (منتج في كل سطر)
 
-    except Exception as e:
-        logger.error(f"خطأ في تحليل السطر {line}: {str(e)}")
-        return None
+    يتم تحليل كل سطر على حدة وإضافة المنتجات الصحيحة في طلب واحد،
+    ثم إرسال رد واحد يلخص ما تمت إضافته والأسطر المرفوضة.
+    """
+    products = []
+    rejected = []
+    for line, result in parse_product_lines(text):
+        if result[1] is None:
+            rejected.append(f"{line} (لم يتم العثور على السعر)")
+            continue
+        try:
+            validate_product_data(result[0], result[1])
+            products.append(result)
+        except ValueError as e:
+            rejected.append(f"{line} ({str(e)})")
 
+    summary = []
+    if products:
+        try:
+            success_count, errors = await add_multiple_to_sheets(products)
+        except Exception as e:
+            logger.error(f"خطأ في إضافة المنتجات: {str(e)}")
+            reply(update, f"حدث خطأ: {str(e)}")
+            return ConversationHandler.END
+
+        summary.append(f"تم إضافة {success_count} منتج:")
+        for product, price, notes in products:
+            summary.append(f"- {product} بسعر {price}" + (f" ({notes})" if notes else ""))
+        rejected.extend(errors)
+
+    if rejected:
+        if summary:
+            summary.append("")
+        summary.append("لم تتم إضافة الأسطر التالية:")
+        summary.extend(f"- {line}" for line in rejected)
+
+    reply(update, "\n".join(summary))
+    return ConversationHandler.END
+
+@timed(HANDLER_SECONDS, 'handler', handler='handle_any_message')
 async def handle_any_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج أي رسالة نصية"""
     text = update.message.text.strip()
+
+    # رسالة متعددة الأسطر: كل سطر منتج مستقل
+    if sum(1 for line in text.splitlines() if line.strip()) > 1:
+        return await handle_multiple_lines(update, text)
+
     # محاولة تحليل النص كإدخال سريع
     result = parse_product_line(text)
     
@@ -67,50 +77,31 @@ async def handle_any_message(update: Update, context: ContextTypes.DEFAULT_TYPE)
         try:
             await add_to_sheets(product, price, notes)
             if notes:
-                await update.message.reply_text(f"تم إضافة {product} بسعر {price} مع ملاحظة: {notes}")
+                reply(update, f"تم إضافة {product} بسعر {price} مع ملاحظة: {notes}")
             else:
-                await update.message.reply_text(f"تم إضافة {product} بسعر {price}")
+                reply(update, f"تم إضافة {product} بسعر {price}")
             return ConversationHandler.END
         except Exception as e:
             logger.error(f"خطأ في إضافة المنتج: {str(e)}")
     
-    # إذا لم ننجح في تحليل النص، نتعامل معه كاسم منتج فقط
+    # إذا لم ننجح في تحليل النص، نتعامل معه كاسم منتج فقط مع اقتراح الأسعار السابقة
     context.user_data.clear()
-    context.user_data['product'] = text
-    await update.message.reply_text(f"تم استلام اسم المنتج: {text}\nالآن أدخل السعر:")
-    return PRICE
+    return ask_price(update, context, text)
 
+@timed(HANDLER_SECONDS, 'handler', handler='price')
 async def price(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج إدخال السعر"""
-    try:
-        price = float(update.message.text)
-        if price <= 0:
-            await update.message.reply_text("السعر يجب أن يكون أكبر من صفر. الرجاء إدخال السعر مرة أخرى:")
-            return PRICE
-            
-        context.user_data['price'] = price
-        await update.message.reply_text(
-            f"تم استلام السعر: {price}\n"
-            "هل تريد إضافة ملاحظة؟\n"
-            "يمكنك تخطي الملاحظات عن طريق:\n"
-            "- إرسال '.' (نقطة)\n"
-            "- إرسال 'لا'\n"
-            "- إرسال '-'\n"
-            "- إرسال '/s'"
-        )
-        return NOTES
-    except ValueError:
-        await update.message.reply_text("الرجاء إدخال رقم صحيح للسعر:")
-        return PRICE
+    return await handle_price_input(update, context)
 
+@timed(HANDLER_SECONDS, 'handler', handler='notes')
 async def notes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """معالج إدخال الملاحظات"""
     logger.debug("تم استدعاء معالج الملاحظات") # إضافة تسجيل للتتبع
     
     # تحقق من وجود البيانات الأساسية
-    if 'product' not in context.user_data أو 'price' not in context.user_data:
+    if 'product' not in context.user_data or 'price' not in context.user_data:
         logger.error("لا توجد بيانات للمنتج أو السعر")
-        await update.message.reply_text("حدث خطأ. الرجاء البدء من جديد.")
+        reply(update, "حدث خطأ. الرجاء البدء من جديد.")
         return ConversationHandler.END
         
     # تجاهل الرسالة إذا كان المستخدم قد استخدم skip
@@ -129,15 +120,15 @@ async def notes(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
         await add_to_sheets(product, price, text)
         
         if text:
-            await update.message.reply_text(f"تم إضافة {product} بسعر {price} مع ملاحظة: {text}")
+            reply(update, f"تم إضافة {product} بسعر {price} مع ملاحظة: {text}")
         else:
-            await update.message.reply_text(f"تم إضافة {product} بسعر {price}")
+            reply(update, f"تم إضافة {product} بسعر {price}")
         
         # مسح بيانات المستخدم
         context.user_data.clear()
         
-        await update.message.reply_text(WELCOME_MESSAGE)
+        reply(update, welcome_message)
         return ConversationHandler.END
     except Exception as e:
-        await update.message.reply_text(f"حدث خطأ: {str(e)}")
+        reply(update, f"حدث خطأ: {str(e)}")
         return ConversationHandler.END
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+مرحلة إدخال السعر واقتراحات الأسعار
+
+عند استلام اسم منتج بدون سعر، يتم عرض أزرار بالمنتجات القريبة من الاسم
+مع آخر سعر والسعر الوسيط، بحيث تصبح معظم الإدخالات ضغطة واحدة. الزر
+يرسل نصاً بالشكل "المنتج السعر"، ويتم التعرف عليه في معالج السعر فقط إذا
+طابق أحد الأزرار المعروضة، ويؤخذ المنتج والسعر من الزر نفسه دون تحليل النص
+(اسم المنتج قد يحتوي على رقم مثل "بيبسي 330").
+
+معالج السعر مشترك بين handlers/conversation.py و handlers/commands.py.
+"""
+from typing import Dict, Optional, Tuple
+from telegram import KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove, Update
+from telegram.ext import ContextTypes, ConversationHandler
+from src.config import WELCOME_MESSAGE as welcome_message, PRICE, NOTES
+from src.message_queue import reply
+from database.sheets import add_to_sheets, suggest_products, validate_product_data, SheetsError
+from utils.product_parser import parse_product_line
+from utils.report_formatter import format_amount
+
+# عدد المنتجات المقترحة
+MAX_SUGGESTIONS = 3
+
+# إزالة لوحة الاقتراحات بعد انتهاء مرحلة السعر
+REMOVE_KEYBOARD = ReplyKeyboardRemove()
+
+def price_prompt(product: str) -> Tuple[str, Optional[ReplyKeyboardMarkup], Dict[str, Tuple[str, float]]]:
+    """
+    رسالة طلب السعر ولوحة الاقتراحات لمنتج
+
+    تعيد:
+        (نص الرسالة، لوحة الأزرار أو None إذا لم توجد اقتراحات،
+         نص كل زر ← (المنتج، السعر))
+    """
+    text = f"تم استلام اسم المنتج: {product}\nالآن أدخل السعر:"
+    suggestions = suggest_products(product, MAX_SUGGESTIONS)
+    if not suggestions:
+        return text, None, {}
+
+    rows = []
+    choices: Dict[str, Tuple[str, float]] = {}
+    for suggestion in suggestions:
+        prices = [suggestion.last_price]
+        if suggestion.median_price != suggestion.last_price:
+            prices.append(suggestion.median_price)
+        row = []
+        for price in prices:
+            label = f"{suggestion.name} {format_amount(price)}"
+            choices.setdefault(label, (suggestion.name, price))
+            row.append(KeyboardButton(label))
+        rows.append(row)
+
+    best = suggestions[0]
+    text += (
+        f"\n\nآخر سعر لـ {best.name}: {format_amount(best.last_price)}"
+        f"، الوسيط: {format_amount(best.median_price)}\n"
+        "اختر من الأزرار أو أدخل السعر:"
+    )
+    return text, ReplyKeyboardMarkup(rows, resize_keyboard=True, one_time_keyboard=True), choices
+
+def ask_price(update: Update, context: ContextTypes.DEFAULT_TYPE, product: str) -> int:
+    """
+    حفظ اسم المنتج وطلب السعر مع لوحة الاقتراحات
+
+    تعيد:
+        حالة المحادثة PRICE
+    """
+    prompt, keyboard, choices = price_prompt(product)
+    context.user_data['product'] = product
+    # الأزرار المعروضة (النص ← المنتج والسعر)، للتمييز بين ضغطة زر وسعر مع ملاحظات
+    context.user_data['suggestions'] = choices
+    reply(update, prompt, reply_markup=keyboard)
+    return PRICE
+
+def parse_price_input(text: str) -> Tuple[Optional[float], str]:
+    """
+    تحليل سعر مكتوب في مرحلة السعر (ليس ضغطة زر)
+
+    يقبل سعراً (بأرقام عربية أو إنجليزية)، وما حوله من نص يعتبر ملاحظات.
+
+    تعيد:
+        (السعر أو None، الملاحظات)
+    """
+    result = parse_product_line(text)
+    if result is None or result[1] is None:
+        return None, ""
+    before, price, after = result
+    return price, ' '.join(part for part in (before, after) if part)
+
+async def handle_price_input(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    معالج مرحلة السعر
+
+    ضغطة زر اقتراح أو سعر مع ملاحظات تتم إضافتها مباشرة، والسعر وحده
+    يتم حفظه ثم السؤال عن الملاحظات. اسم المنتج المحفوظ لا يتغير إلا بضغطة زر.
+    """
+    text = update.message.text
+    choice = context.user_data.get('suggestions', {}).get(text.strip())
+    tapped = choice is not None
+    if tapped:
+        product, price = choice
+        notes = ""
+    else:
+        price, notes = parse_price_input(text)
+        if price is None:
+            reply(update, "الرجاء إدخال رقم صحيح للسعر:")
+            return PRICE
+        product = context.user_data.get('product')
+    if not product:
+        reply(update, "حدث خطأ. الرجاء البدء من جديد.", reply_markup=REMOVE_KEYBOARD)
+        return ConversationHandler.END
+    try:
+        validate_product_data(product, price)
+    except ValueError as e:
+        reply(update, f"{str(e)}. الرجاء إدخال السعر مرة أخرى:")
+        return PRICE
+
+    if not tapped and not notes:
+        context.user_data['price'] = price
+        reply(update,
+            f"تم استلام السعر: {price}\n"
+            "هل تريد إضافة ملاحظة؟\n"
+            "يمكنك تخطي الملاحظات عن طريق:\n"
+            "- إرسال '.' (نقطة)\n"
+            "- إرسال 'لا'\n"
+            "- إرسال '-'\n"
+            "- إرسال '/s'",
+            reply_markup=REMOVE_KEYBOARD
+        )
+        return NOTES
+
+    try:
+        await add_to_sheets(product, price, notes)
+    except (ValueError, SheetsError) as e:
+        reply(update, f"حدث خطأ: {str(e)}", reply_markup=REMOVE_KEYBOARD)
+        return ConversationHandler.END
+
+    context.user_data.clear()
+    if notes:
+        reply(update, f"تم إضافة {product} بسعر {price} مع ملاحظة: {notes}")
+    else:
+        reply(update, f"تم إضافة {product} بسعر {price}")
+    reply(update, welcome_message, reply_markup=REMOVE_KEYBOARD)
+    return ConversationHandler.END
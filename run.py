@@ -10,11 +10,10 @@
 
 import os
 import sys
+import asyncio
 import logging
-import logging.handlers
 import atexit
 import tempfile
-from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
 from telegram.ext import (
@@ -27,9 +26,18 @@ from telegram.ext import (
 
 # استيراد الوحدات المحلية
 try:
-    from src.config import WELCOME_MESSAGE, PRICE, NOTES
+    from src.config import WELCOME_MESSAGE, BOT_MODE, MAX_CONCURRENT_UPDATES, PRODUCT, PRICE, NOTES, METRICS_HOST, METRICS_PORT, STORAGE_BACKEND
+    from src.webhook import run_webhook
+    from src.update_processor import PerChatUpdateProcessor, register_update_metrics
+    from utils.metrics import start_metrics_server, stop_metrics_server
+    from src.message_queue import close_outgoing_queue
     from handlers.conversation import handle_any_message, price, notes
-    from handlers.commands import start, cancel, skip_command
+    from handlers.commands import start, start_command, cancel, skip_command, report_command, find_command
+    from database.sheets import (
+        load_product_index,
+        shutdown_sheets_executor,
+    )
+    from database.storage import get_storage
 except ImportError as e:
     # سيتم استيراد الوحدات لاحقاً بعد إضافة المجلد الرئيسي إلى مسار البحث
     print(f"خطأ في الاستيراد: {e}")
@@ -61,8 +69,8 @@ def check_credentials():
         """)
         sys.exit(1)
 
-    # التحقق من وجود ملف credentials.json
-    if not os.path.exists('credentials.json'):
+    # التحقق من وجود ملف credentials.json (المحركات المحلية لا تحتاجه)
+    if STORAGE_BACKEND == 'sheets' and not os.path.exists('credentials.json'):
         logger.error("ملف credentials.json غير موجود!")
         print("""
         يجب وضع ملف credentials.json في المجلد الرئيسي
@@ -71,36 +79,12 @@ def check_credentials():
         sys.exit(1)
 
 def setup_logging():
-    """إعداد السجلات"""
-    # إنشاء مجلد للسجلات إذا لم يكن موجوداً
-    log_dir = Path("logs")
-    if not log_dir.exists():
-        print("تم إنشاء مجلد السجلات")
-        log_dir.mkdir()
-
-    # تنسيق اسم ملف السجل
-    log_file = log_dir / f"bot_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
-    
-    print(f"مجلد السجلات: {log_dir.absolute()}")
-
-    # إعداد تنسيق السجلات
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    """إعداد السجلات (الكتابة إلى الملف ووحدة التحكم في خيط منفصل)"""
+    from utils.logging_setup import setup_logging as setup_queue_logging
+    from src.config import LOG_DIR
 
-    # إعداد معالج الملف
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
-    file_handler.setFormatter(formatter)
-
-    # إعداد معالج وحدة التحكم
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-
-    # إعداد السجل الرئيسي
-    root_logger = logging.getLogger()
-    root_logger.setLevel(logging.INFO)
-    root_logger.addHandler(file_handler)
-    root_logger.addHandler(console_handler)
+    setup_queue_logging('bot.log')
+    print(f"مجلد السجلات: {Path(LOG_DIR).absolute()}")
 
 def is_bot_running():
     """التحقق مما إذا كان البوت يعمل بالفعل"""
@@ -138,6 +122,78 @@ def is_bot_running():
 async def post_init(application: Application) -> None:
     """يتم تنفيذ هذه الدالة بعد بدء البوت"""
     logger.info("تم بدء تشغيل البوت!")
+    # مقاييس الأداء على خادم محلي
+    register_update_metrics(application)
+    await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    # بدء المهام الخلفية لمحرك التخزين (مثل إرسال ما بقي في صندوق الصادر)
+    get_storage().start()
+    # تحميل أسماء المنتجات السابقة لاقتراحات الأسعار
+    try:
+        await load_product_index()
+    except Exception as e:
+        logger.warning(f"تعذر تحميل اقتراحات المنتجات: {str(e)}")
+
+async def post_stop(application: Application) -> None:
+    """يتم تنفيذ هذه الدالة بعد إيقاف استقبال التحديثات وقبل إغلاق البوت"""
+    # إرسال الردود المتبقية في الطابور ما دام البوت متصلاً
+    await close_outgoing_queue()
+    await stop_metrics_server()
+
+async def post_shutdown(application: Application) -> None:
+    """يتم تنفيذ هذه الدالة عند إيقاف البوت"""
+    await get_storage().close()
+    shutdown_sheets_executor(wait=False)
+
+def build_conversation_handler() -> ConversationHandler:
+    """
+    إنشاء معالج المحادثة (PRODUCT ← PRICE ← NOTES)
+    """
+    return ConversationHandler(
+        entry_points=[
+            CommandHandler('start', start_command),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, handle_any_message),
+        ],
+        states={
+            PRODUCT: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_any_message),
+            ],
+            PRICE: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, price),
+                CommandHandler('s', skip_command),
+            ],
+            NOTES: [
+                MessageHandler(filters.TEXT & ~filters.COMMAND, notes),
+                CommandHandler('s', skip_command),
+            ],
+        },
+        fallbacks=[CommandHandler('cancel', cancel)],
+    )
+
+def build_application(token: str, **builder_options) -> Application:
+    """
+    إنشاء التطبيق وإضافة المعالجات
+
+    المعطيات:
+        token (str): رمز البوت
+        builder_options: إعدادات إضافية لـ ApplicationBuilder (مثل request للاختبار)
+    """
+    builder = (
+        Application.builder()
+        .token(token)
+        .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_stop(post_stop)
+        .post_shutdown(post_shutdown)
+    )
+    for option, value in builder_options.items():
+        builder = getattr(builder, option)(value)
+    application = builder.build()
+    
+    # إضافة معالج المحادثة
+    application.add_handler(build_conversation_handler())
+    application.add_handler(CommandHandler('report', report_command))
+    application.add_handler(CommandHandler('find', find_command))
+    return application
 
 def main() -> None:
     """
@@ -164,36 +220,15 @@ def main() -> None:
             sys.exit(1)
             
         # إنشاء التطبيق
-        application = Application.builder().token(TELEGRAM_TOKEN).post_init(post_init).build()
-        
-        # إعداد المحادثة
-        conv_handler = ConversationHandler(
-            entry_points=[
-                CommandHandler('start', start_command),
-                MessageHandler(filters.TEXT & ~filters.COMMAND, handle_any_message),
-            ],
-            states={
-                PRODUCT: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, handle_any_message),
-                ],
-                PRICE: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, price),
-                    CommandHandler('s', skip_command),
-                ],
-                NOTES: [
-                    MessageHandler(filters.TEXT & ~filters.COMMAND, notes),
-                    CommandHandler('s', skip_command),
-                ],
-            },
-            fallbacks=[CommandHandler('cancel', cancel)],
-        )
-        
-        # إضافة معالج المحادثة
-        application.add_handler(conv_handler)
+        application = build_application(TELEGRAM_TOKEN)
         
         # بدء البوت
-        logger.info("جاري بدء البوت...")
-        application.run_polling()
+        if BOT_MODE == 'webhook':
+            logger.info("جاري بدء البوت في وضع webhook...")
+            asyncio.run(run_webhook(application))
+        else:
+            logger.info("جاري بدء البوت...")
+            application.run_polling()
         
     except Exception as e:
         logger.error(f"خطأ: {str(e)}")
@@ -11,7 +11,112 @@ load_dotenv()
 # توكن البوت
 TOKEN: Final = os.getenv('TELEGRAM_TOKEN')
 
+# إعدادات Google Sheets
+# الحد الأقصى لعدد الخيوط التي تنفذ استدعاءات Google Sheets
+SHEETS_MAX_WORKERS: Final = int(os.getenv('SHEETS_MAX_WORKERS', '4'))
+# مهلة استدعاء Google Sheets بالثواني (0 لتعطيل المهلة)
+SHEETS_TIMEOUT: Final = float(os.getenv('SHEETS_TIMEOUT', '30'))
+# الحد الأقصى لعدد الصفوف في طلب append_rows واحد
+SHEETS_BATCH_SIZE: Final = int(os.getenv('SHEETS_BATCH_SIZE', '50'))
+# أقصى مدة انتظار (بالمللي ثانية) قبل إرسال الصفوف المنتظرة
+SHEETS_BATCH_INTERVAL_MS: Final = float(os.getenv('SHEETS_BATCH_INTERVAL_MS', '200'))
+# حصص Google Sheets: عدد طلبات القراءة والكتابة في الدقيقة
+# (المعدل + الدفعة يجب ألا يتجاوزا حصة الدقيقة، الافتراضي 50 + 10 = 60)
+SHEETS_READS_PER_MINUTE: Final = float(os.getenv('SHEETS_READS_PER_MINUTE', '50'))
+SHEETS_WRITES_PER_MINUTE: Final = float(os.getenv('SHEETS_WRITES_PER_MINUTE', '50'))
+SHEETS_RATE_BURST: Final = int(os.getenv('SHEETS_RATE_BURST', '10'))
+# إعادة المحاولة عند 429 و 5xx (تراجع أسي عشوائي بالثواني)
+SHEETS_MAX_RETRIES: Final = int(os.getenv('SHEETS_MAX_RETRIES', '5'))
+SHEETS_BACKOFF_BASE: Final = float(os.getenv('SHEETS_BACKOFF_BASE', '1'))
+SHEETS_BACKOFF_MAX: Final = float(os.getenv('SHEETS_BACKOFF_MAX', '32'))
+# قاطع الدائرة: عدد مرات الفشل المتتالية ومدة الإيقاف بالثواني
+SHEETS_BREAKER_THRESHOLD: Final = int(os.getenv('SHEETS_BREAKER_THRESHOLD', '5'))
+SHEETS_BREAKER_RESET: Final = float(os.getenv('SHEETS_BREAKER_RESET', '30'))
+# عدد الصفوف في كل صفحة عند القراءة المتسلسلة (التصدير)
+SHEETS_PAGE_SIZE: Final = int(os.getenv('SHEETS_PAGE_SIZE', '1000'))
+# تقسيم المشتريات: none (الورقة الأولى فقط) أو monthly (ورقة لكل شهر مثل "المشتريات 2026-10")
+SHEETS_PARTITIONING: Final = os.getenv('SHEETS_PARTITIONING', 'none').lower()
+
+# مجلد البيانات المحلية
+DATA_DIR: Final = os.getenv('DATA_DIR', 'data')
+# مكان تخزين المشتريات: sheets (Google Sheets) أو sqlite أو csv (محلياً بدون Google Sheets)
+STORAGE_BACKEND: Final = os.getenv('STORAGE_BACKEND', 'sheets').lower()
+STORAGE_SQLITE_PATH: Final = os.getenv('STORAGE_SQLITE_PATH', os.path.join(DATA_DIR, 'purchases.sqlite3'))
+STORAGE_CSV_PATH: Final = os.getenv('STORAGE_CSV_PATH', os.path.join(DATA_DIR, 'purchases.csv'))
+# حفظ المشتريات في صندوق صادر محلي (SQLite) قبل إرسالها إلى Google Sheets
+OUTBOX_ENABLED: Final = os.getenv('OUTBOX_ENABLED', '1') == '1'
+OUTBOX_PATH: Final = os.getenv('OUTBOX_PATH', os.path.join(DATA_DIR, 'outbox.sqlite3'))
+# نسخة محلية من ورقة المشتريات تستخدم للقراءة
+MIRROR_ENABLED: Final = os.getenv('MIRROR_ENABLED', '1') == '1'
+MIRROR_PATH: Final = os.getenv('MIRROR_PATH', os.path.join(DATA_DIR, 'mirror.sqlite3'))
+# أقصى عمر للنسخة المحلية (بالثواني) قبل مزامنتها عند القراءة
+MIRROR_MAX_STALENESS: Final = float(os.getenv('MIRROR_MAX_STALENESS', '60'))
+# حفظ رمز الوصول ومعرف جدول البيانات على القرص (0600) لتجنب المصادقة في كل تشغيل
+TOKEN_CACHE_ENABLED: Final = os.getenv('TOKEN_CACHE_ENABLED', '1') == '1'
+TOKEN_CACHE_PATH: Final = os.getenv('TOKEN_CACHE_PATH', os.path.join(DATA_DIR, 'token_cache.json'))
+# مجاميع المصروفات المستخدمة في التقارير
+AGGREGATES_PATH: Final = os.getenv('AGGREGATES_PATH', os.path.join(DATA_DIR, 'aggregates.sqlite3'))
+# فهرس البحث في سجل المشتريات
+SEARCH_INDEX_PATH: Final = os.getenv('SEARCH_INDEX_PATH', os.path.join(DATA_DIR, 'search.sqlite3'))
+
+# إعدادات السجلات
+LOG_LEVEL: Final = os.getenv('LOG_LEVEL', 'INFO').upper()
+LOG_DIR: Final = os.getenv('LOG_DIR', 'logs')
+# تنسيق السجلات: text أو json (سطر JSON لكل سجل)
+LOG_FORMAT: Final = os.getenv('LOG_FORMAT', 'text').lower()
+# تدوير ملف السجل: size (حسب الحجم) أو time (حسب الوقت) أو none
+LOG_ROTATION: Final = os.getenv('LOG_ROTATION', 'size').lower()
+LOG_MAX_BYTES: Final = int(os.getenv('LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+# وقت التدوير بصيغة TimedRotatingFileHandler (مثل midnight أو H أو W0)
+LOG_ROTATE_WHEN: Final = os.getenv('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT: Final = int(os.getenv('LOG_BACKUP_COUNT', '7'))
+# ضغط ملفات السجل القديمة بـ gzip
+LOG_COMPRESS: Final = os.getenv('LOG_COMPRESS', '1') == '1'
+
+# خادم المقاييس المحلي بتنسيق Prometheus (0 لتعطيله)
+METRICS_HOST: Final = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT: Final = int(os.getenv('METRICS_PORT', '9108'))
+
+# تحليل أداء التحديثات (معطل افتراضياً): نسبة التحديثات المحللة (0 إلى 1)
+# أو معرف محادثة واحدة يتم تحليل جميع تحديثاتها
+PROFILE_SAMPLE_RATE: Final = float(os.getenv('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_CHAT_ID: Final = int(os.getenv('PROFILE_CHAT_ID')) if os.getenv('PROFILE_CHAT_ID') else None
+PROFILE_DIR: Final = os.getenv('PROFILE_DIR', os.path.join(DATA_DIR, 'profiles'))
+# الفاصل بين العينات بالمللي ثانية
+PROFILE_INTERVAL_MS: Final = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+# الحد الأقصى لعدد ملفات التحليل المحفوظة (يتم حذف الأقدم)
+PROFILE_MAX_FILES: Final = int(os.getenv('PROFILE_MAX_FILES', '500'))
+
+# طريقة استقبال التحديثات: polling أو webhook
+BOT_MODE: Final = os.getenv('BOT_MODE', 'polling').lower()
+
+# الحد الأقصى لعدد التحديثات المعالجة في نفس الوقت (من محادثات مختلفة)
+MAX_CONCURRENT_UPDATES: Final = int(os.getenv('MAX_CONCURRENT_UPDATES', '64'))
+
+# إعدادات وضع webhook
+# العنوان العام الذي يرسل إليه تيليجرام (إذا كان فارغاً لا يتم التسجيل لدى تيليجرام)
+WEBHOOK_URL: Final = os.getenv('WEBHOOK_URL', '')
+# عنوان الاستماع: محلي افتراضياً (خلف وكيل عكسي)، وأي عنوان آخر يتطلب WEBHOOK_SECRET
+WEBHOOK_LISTEN: Final = os.getenv('WEBHOOK_LISTEN', '127.0.0.1')
+WEBHOOK_PORT: Final = int(os.getenv('WEBHOOK_PORT', '8443'))
+WEBHOOK_PATH: Final = os.getenv('WEBHOOK_PATH', '/telegram')
+# الرمز السري الذي يرسله تيليجرام في ترويسة X-Telegram-Bot-Api-Secret-Token
+# (إلزامي إلا عند الاختبار المحلي بدون WEBHOOK_URL على عنوان محلي)
+WEBHOOK_SECRET: Final = os.getenv('WEBHOOK_SECRET', '')
+# الحد الأقصى لعدد التحديثات المنتظرة قبل رفض الجديدة برمز 503
+WEBHOOK_QUEUE_SIZE: Final = int(os.getenv('WEBHOOK_QUEUE_SIZE', '1000'))
+
+# إعدادات الرسائل الصادرة (حدود تيليجرام: رسالة في الثانية لكل محادثة و30 إجمالاً)
+# مدة انتظار الردود التالية لنفس المحادثة لدمجها في رسالة واحدة
+OUTGOING_COALESCE_MS: Final = int(os.getenv('OUTGOING_COALESCE_MS', '50'))
+OUTGOING_CHAT_INTERVAL: Final = float(os.getenv('OUTGOING_CHAT_INTERVAL', '1'))
+OUTGOING_GLOBAL_PER_SECOND: Final = float(os.getenv('OUTGOING_GLOBAL_PER_SECOND', '30'))
+OUTGOING_MAX_RETRIES: Final = int(os.getenv('OUTGOING_MAX_RETRIES', '3'))
+# أقصى مدة لمحاولة إرسال رسالة واحدة (بالثواني) بما في ذلك انتظار RetryAfter
+OUTGOING_MAX_WAIT: Final = float(os.getenv('OUTGOING_MAX_WAIT', '120'))
+
 # حالات المحادثة
+PRODUCT = 0
 PRICE = 1
 NOTES = 2
 
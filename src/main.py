@@ -12,6 +12,7 @@
 TELEGRAM_TOKEN=your_bot_token_here
 """
 import os
+import asyncio
 import logging
 import signal
 import sys
@@ -20,7 +21,12 @@ from pathlib import Path
 from telegram import Update
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, ConversationHandler
 
-from src.config import TOKEN, PRICE, NOTES, PRODUCT
+from src.config import TOKEN, BOT_MODE, MAX_CONCURRENT_UPDATES, PRICE, NOTES, PRODUCT, METRICS_HOST, METRICS_PORT
+from src.webhook import run_webhook
+from src.update_processor import PerChatUpdateProcessor, register_update_metrics
+from src.message_queue import close_outgoing_queue
+from utils.logging_setup import setup_logging
+from utils.metrics import ERRORS, start_metrics_server, stop_metrics_server
 from handlers.commands import (
     start_command, 
     help_command, 
@@ -29,17 +35,17 @@ from handlers.commands import (
     handle_product,
     handle_price,
     handle_notes,
+    report_command,
+    find_command,
 )
+from database.sheets import (
+    load_product_index,
+    shutdown_sheets_executor,
+)
+from database.storage import get_storage
 
 # إعداد التسجيل
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO,
-    handlers=[
-        logging.StreamHandler(sys.stdout),
-        logging.FileHandler('bot.log', encoding='utf-8')
-    ]
-)
+setup_logging('bot.log')
 logger = logging.getLogger(__name__)
 
 # مسار ملف القفل
@@ -62,12 +68,33 @@ def signal_handler(signum, frame):
 
 async def error_handler(update: Update, context) -> None:
     """معالج الأخطاء العامة"""
+    ERRORS.inc(component='update', type=type(context.error).__name__)
     logger.error(f"حدث خطأ أثناء معالجة التحديث: {context.error}")
     if update:
         await update.message.reply_text(
             "عذراً، حدث خطأ أثناء معالجة طلبك. الرجاء المحاولة مرة أخرى."
         )
 
+async def post_init(application: Application) -> None:
+    """بدء مزامنة صندوق الصادر وتحميل اقتراحات المنتجات وخادم المقاييس بعد تشغيل البوت"""
+    register_update_metrics(application)
+    await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    get_storage().start()
+    try:
+        await load_product_index()
+    except Exception as e:
+        logger.warning(f"تعذر تحميل اقتراحات المنتجات: {str(e)}")
+
+async def post_stop(application: Application) -> None:
+    """إرسال الردود المتبقية قبل إغلاق اتصال البوت"""
+    await close_outgoing_queue()
+    await stop_metrics_server()
+
+async def post_shutdown(application: Application) -> None:
+    """إرسال الصفوف المتبقية وإيقاف المهام الخلفية عند إغلاق البوت"""
+    await get_storage().close()
+    shutdown_sheets_executor(wait=False)
+
 def main() -> None:
     """
     الدالة الرئيسية للبوت
@@ -88,14 +115,22 @@ def main() -> None:
         logger.info(f"تم العثور على التوكن: {TOKEN[:5]}...")
         
         logger.info("جاري إنشاء التطبيق...")
-        app = Application.builder().token(TOKEN).build()
+        app = (
+            Application.builder()
+            .token(TOKEN)
+            .concurrent_updates(PerChatUpdateProcessor(MAX_CONCURRENT_UPDATES))
+            .post_init(post_init)
+            .post_stop(post_stop)
+            .post_shutdown(post_shutdown)
+            .build()
+        )
         logger.info("تم إنشاء التطبيق بنجاح")
         
         # إضافة معالج الأخطاء
         app.add_error_handler(error_handler)
         
         logger.info("جاري إعداد معالج المحادثة...")
-        logger.info("تسجيل الأوامر: start, s, cancel")
+        logger.info("تسجيل الأوامر: start, s, cancel, report, find")
         conv_handler = ConversationHandler(
             entry_points=[
                 CommandHandler('start', start_command),
@@ -126,15 +161,20 @@ def main() -> None:
         logger.info("جاري إضافة المعالجات...")
         app.add_handler(conv_handler)
         app.add_handler(CommandHandler("help", help_command))
+        app.add_handler(CommandHandler("report", report_command))
+        app.add_handler(CommandHandler("find", find_command))
         logger.info("تم إضافة المعالجات بنجاح")
         
         logger.info("جاري تشغيل البوت...")
-        app.run_polling(
-            allowed_updates=Update.ALL_TYPES,
-            drop_pending_updates=True,  # تجاهل التحديثات القديمة
-            stop_signals=[],  # منع الإيقاف التلقائي
-            close_loop=False
-        )
+        if BOT_MODE == 'webhook':
+            asyncio.run(run_webhook(app))
+        else:
+            app.run_polling(
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,  # تجاهل التحديثات القديمة
+                stop_signals=[],  # منع الإيقاف التلقائي
+                close_loop=False
+            )
         logger.info("تم تشغيل البوت بنجاح!")
         
     except ValueError as e:
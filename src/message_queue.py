@@ -0,0 +1,280 @@
+"""
+طابور الرسائل الصادرة
+
+بدلاً من استدعاء reply_text مباشرة، تضع المعالجات ردودها في هذا الطابور.
+الردود المتتالية لنفس المحادثة (مثل تأكيد الإضافة ثم رسالة الترحيب) يتم
+دمجها في رسالة واحدة، ويتم احترام حدود تيليجرام للإرسال (لكل محادثة
+وإجمالاً) بواسطة مجدول، مع إعادة المحاولة بعد المدة المحددة في RetryAfter.
+"""
+import asyncio
+import logging
+import weakref
+from collections import deque
+from typing import Deque, Dict, List, Optional
+from telegram import Bot, Update
+from telegram.error import Forbidden, BadRequest, RetryAfter, TelegramError
+
+from src.config import (
+    OUTGOING_COALESCE_MS,
+    OUTGOING_CHAT_INTERVAL,
+    OUTGOING_GLOBAL_PER_SECOND,
+    OUTGOING_MAX_RETRIES,
+    OUTGOING_MAX_WAIT,
+)
+from utils.metrics import ERRORS, counter, gauge
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لطول رسالة تيليجرام
+MAX_MESSAGE_LENGTH = 4096
+
+# الفاصل بين الردود المدمجة
+MERGE_SEPARATOR = "\n\n"
+
+# المقاييس
+MESSAGES_SENT = counter('telegram_messages_sent_total', 'عدد الرسائل المرسلة (بعد الدمج)')
+REPLIES_MERGED = counter('telegram_replies_merged_total', 'عدد الردود التي تم دمجها مع رد سابق')
+RETRY_AFTER = counter('telegram_retry_after_total', 'عدد مرات طلب تيليجرام الانتظار (RetryAfter)')
+
+class _OutgoingMessage:
+    """رسالة تنتظر الإرسال"""
+    __slots__ = ("text", "reply_markup", "future")
+
+    def __init__(self, text: str, reply_markup, future: asyncio.Future):
+        self.text = text
+        self.reply_markup = reply_markup
+        self.future = future
+
+class OutgoingMessageQueue:
+    """
+    مجدول الرسائل الصادرة لبوت واحد
+
+    المعطيات:
+        bot: البوت المستخدم في الإرسال
+        coalesce_delay (float): مدة انتظار الردود التالية قبل الإرسال (بالثواني)
+        chat_interval (float): أقل فاصل بين رسالتين لنفس المحادثة (بالثواني)
+        global_per_second (float): الحد الأقصى للرسائل في الثانية لجميع المحادثات
+        max_retries (int): عدد مرات إعادة المحاولة عند أخطاء الشبكة
+        max_wait (float): أقصى مدة لمحاولة إرسال دفعة (بالثواني)، بعدها تفشل
+            حتى لو استمر تيليجرام في طلب الانتظار (RetryAfter)
+    """
+
+    def __init__(self, bot: Bot, coalesce_delay: float = OUTGOING_COALESCE_MS / 1000,
+                 chat_interval: float = OUTGOING_CHAT_INTERVAL,
+                 global_per_second: float = OUTGOING_GLOBAL_PER_SECOND,
+                 max_retries: int = OUTGOING_MAX_RETRIES,
+                 max_wait: float = OUTGOING_MAX_WAIT):
+        self.bot = bot
+        self.coalesce_delay = coalesce_delay
+        self.chat_interval = chat_interval
+        self.global_interval = 1 / global_per_second if global_per_second > 0 else 0.0
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+
+        self._pending: Dict[int, Deque[_OutgoingMessage]] = {}
+        # أقرب وقت يسمح فيه بالإرسال لكل محادثة
+        self._not_before: Dict[int, float] = {}
+        self._sending: set = set()
+        self._next_global = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._inflight: set = set()
+
+    @property
+    def pending_messages(self) -> int:
+        """عدد الرسائل التي تنتظر الإرسال"""
+        return sum(len(messages) for messages in self._pending.values())
+
+    def send(self, chat_id: int, text: str, reply_markup=None) -> asyncio.Future:
+        """
+        إضافة رسالة إلى الطابور
+
+        تعيد:
+            مستقبل يكتمل بعد إرسال الرسالة (لا حاجة لانتظاره)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        # تجنب تحذير "Future exception was never retrieved" إذا لم ينتظره أحد
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        messages = self._pending.get(chat_id)
+        if messages is None:
+            messages = self._pending[chat_id] = deque()
+            self._not_before[chat_id] = max(
+                self._not_before.get(chat_id, 0.0), loop.time() + self.coalesce_delay
+            )
+        messages.append(_OutgoingMessage(text, reply_markup, future))
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        self._wakeup.set()
+        return future
+
+    def _take_batch(self, chat_id: int) -> List[_OutgoingMessage]:
+        """أخذ الرسائل المتتالية القابلة للدمج في رسالة واحدة"""
+        messages = self._pending[chat_id]
+        batch = [messages.popleft()]
+        length = len(batch[0].text)
+        # الرسالة التي تحمل لوحة أزرار تكون آخر الدفعة
+        while messages and batch[-1].reply_markup is None:
+            next_length = length + len(MERGE_SEPARATOR) + len(messages[0].text)
+            if next_length > MAX_MESSAGE_LENGTH:
+                break
+            batch.append(messages.popleft())
+            length = next_length
+        if not messages:
+            del self._pending[chat_id]
+        return batch
+
+    async def _run(self) -> None:
+        """حلقة المجدول"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+
+            # أقدم محادثة جاهزة للإرسال
+            ready = None
+            next_time = None
+            for chat_id in self._pending:
+                if chat_id in self._sending:
+                    continue
+                not_before = max(self._not_before.get(chat_id, 0.0), self._next_global)
+                if not_before <= now:
+                    ready = chat_id
+                    break
+                next_time = not_before if next_time is None else min(next_time, not_before)
+
+            if ready is None:
+                timeout = None if next_time is None else next_time - now
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = self._take_batch(ready)
+            self._sending.add(ready)
+            self._next_global = now + self.global_interval
+            task = asyncio.ensure_future(self._deliver(ready, batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, chat_id: int, batch: List[_OutgoingMessage]) -> None:
+        """إرسال دفعة مدمجة مع إعادة المحاولة"""
+        loop = asyncio.get_running_loop()
+        text = MERGE_SEPARATOR.join(message.text for message in batch)
+        attempt = 0
+        deadline = loop.time() + self.max_wait
+        try:
+            while True:
+                try:
+                    await self.bot.send_message(chat_id, text, reply_markup=batch[-1].reply_markup)
+                except RetryAfter as e:
+                    # تيليجرام يطلب الانتظار: إيقاف جميع الإرسال لهذه المدة
+                    retry_after = float(e.retry_after)
+                    RETRY_AFTER.inc()
+                    self._next_global = max(self._next_global, loop.time() + retry_after)
+                    if loop.time() + retry_after > deadline:
+                        # لا ننتظر إلى ما لا نهاية، فالرد بعد هذه المدة لم يعد مفيداً
+                        raise
+                    logger.warning(f"تم تجاوز حد الإرسال، الانتظار {retry_after} ثانية")
+                    await asyncio.sleep(retry_after)
+                except (Forbidden, BadRequest):
+                    # أخطاء دائمة (حظر البوت أو رسالة غير صالحة) لا فائدة من إعادتها
+                    raise
+                except TelegramError:
+                    attempt += 1
+                    delay = min(2 ** attempt, 30)
+                    if attempt > self.max_retries or loop.time() + delay > deadline:
+                        raise
+                    await asyncio.sleep(delay)
+                else:
+                    break
+        except Exception as e:
+            ERRORS.inc(component='telegram', type=type(e).__name__)
+            logger.error(f"فشل إرسال رسالة إلى المحادثة {chat_id}: {str(e)}")
+            for message in batch:
+                if not message.future.done():
+                    message.future.set_exception(e)
+        else:
+            MESSAGES_SENT.inc()
+            if len(batch) > 1:
+                REPLIES_MERGED.inc(len(batch) - 1)
+            for message in batch:
+                if not message.future.done():
+                    message.future.set_result(None)
+        finally:
+            self._sending.discard(chat_id)
+            self._not_before[chat_id] = loop.time() + self.chat_interval
+            if chat_id not in self._pending:
+                # لا حاجة لتذكر المحادثة بعد انتهاء الفاصل
+                loop.call_later(self.chat_interval, self._forget, chat_id)
+            self._wakeup.set()
+
+    def _forget(self, chat_id: int) -> None:
+        """حذف بيانات محادثة لم تعد لها رسائل"""
+        if chat_id not in self._pending and chat_id not in self._sending:
+            self._not_before.pop(chat_id, None)
+
+    async def flush(self) -> None:
+        """انتظار إرسال جميع الرسائل المنتظرة"""
+        while self._pending or self._inflight:
+            futures = [message.future for messages in self._pending.values() for message in messages]
+            await asyncio.gather(*futures, *self._inflight, return_exceptions=True)
+
+    async def close(self) -> None:
+        """إرسال ما تبقى ثم إيقاف المجدول"""
+        await self.flush()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+# طابور واحد لكل حلقة أحداث
+_queues: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, OutgoingMessageQueue]" = weakref.WeakKeyDictionary()
+
+gauge(
+    'telegram_outgoing_pending_messages', 'عدد الردود المنتظرة في طابور الرسائل الصادرة',
+    callback=lambda: sum(queue.pending_messages for queue in list(_queues.values()))
+)
+
+# مهام إغلاق الطوابير المستبدلة (يجب الاحتفاظ بها حتى لا تحذف قبل انتهائها)
+_closing: set = set()
+
+def get_outgoing_queue(bot: Bot) -> OutgoingMessageQueue:
+    """
+    الحصول على طابور الرسائل الصادرة الخاص بحلقة الأحداث الحالية
+    """
+    loop = asyncio.get_running_loop()
+    queue = _queues.get(loop)
+    if queue is not None and queue.bot is not bot:
+        # بوت آخر على نفس الحلقة: الطابور القديم يرسل ما تبقى فيه ببوته ثم يتوقف
+        task = asyncio.ensure_future(queue.close())
+        _closing.add(task)
+        task.add_done_callback(_closing.discard)
+        queue = None
+    if queue is None:
+        queue = _queues[loop] = OutgoingMessageQueue(bot)
+    return queue
+
+def reply(update: Update, text: str, reply_markup=None) -> asyncio.Future:
+    """
+    الرد على رسالة عبر طابور الرسائل الصادرة
+
+    الردود المتتالية لنفس المحادثة يتم دمجها في رسالة واحدة.
+    """
+    return get_outgoing_queue(update.get_bot()).send(update.effective_chat.id, text, reply_markup)
+
+async def close_outgoing_queue() -> None:
+    """
+    إرسال الرسائل المتبقية وإيقاف الطابور (يستخدم قبل إيقاف البوت)
+    """
+    loop = asyncio.get_running_loop()
+    queue = _queues.pop(loop, None)
+    if queue is not None:
+        await queue.close()
+    # انتظار الطوابير المستبدلة على هذه الحلقة أيضاً
+    closing = [task for task in _closing if task.get_loop() is loop]
+    if closing:
+        await asyncio.gather(*closing, return_exceptions=True)
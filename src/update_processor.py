@@ -0,0 +1,93 @@
+"""
+معالجة التحديثات بالتوازي
+
+يتم تنفيذ تحديثات المحادثات المختلفة في نفس الوقت، بينما تنفذ تحديثات
+المحادثة الواحدة بالترتيب واحداً تلو الآخر، حتى لا تتداخل مراحل
+ConversationHandler (المنتج ← السعر ← الملاحظات) لنفس المستخدم.
+
+الحد الأقصى للتحديثات المتزامنة يطبق بعد قفل المحادثة: التحديث الذي ينتظر
+دوره في محادثته لا يشغل مكاناً، فلا يستطيع مستخدم يرسل رسائل كثيرة أن يملأ
+جميع الأماكن بتحديثات منتظرة ويوقف المحادثات الأخرى.
+"""
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Dict, Optional
+from telegram import Update
+from telegram.ext import Application, BaseUpdateProcessor
+from utils.metrics import gauge
+from utils.profiler import should_profile, profile_coroutine
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    معالج تحديثات متوازٍ بين المحادثات ومتسلسل داخل كل محادثة
+
+    المعطيات:
+        max_concurrent_updates (int): الحد الأقصى لعدد التحديثات المعالجة في نفس الوقت
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        # BaseUpdateProcessor.process_update يأخذ self._semaphore قبل do_process_update،
+        # لذلك يتم تعطيله وتطبيق الحد داخل do_process_update بعد قفل المحادثة
+        self._semaphore = contextlib.nullcontext()
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._locks: Dict[Any, asyncio.Lock] = {}
+        self._waiters: Dict[Any, int] = {}
+
+    @staticmethod
+    def _chat_key(update: object) -> Optional[int]:
+        """مفتاح الترتيب: معرف المحادثة، أو المستخدم إذا لم توجد محادثة"""
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        """تنفيذ التحديث بعد انتهاء التحديثات السابقة لنفس المحادثة"""
+        key = self._chat_key(update)
+        if should_profile(key):
+            coroutine = profile_coroutine(coroutine, f"update-{getattr(update, 'update_id', 'unknown')}", key)
+        if key is None:
+            async with self._slots:
+                await coroutine
+            return
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._waiters[key] = self._waiters.get(key, 0) + 1
+        try:
+            # asyncio.Lock يخدم المنتظرين بترتيب وصولهم، ثم يؤخذ مكان من الحد الأقصى
+            async with lock, self._slots:
+                await coroutine
+        finally:
+            # حذف القفل عند عدم وجود منتظرين حتى لا تكبر القاموس مع عدد المحادثات
+            self._waiters[key] -= 1
+            if not self._waiters[key]:
+                del self._waiters[key]
+                del self._locks[key]
+
+    @property
+    def active_chats(self) -> int:
+        """عدد المحادثات التي لديها تحديثات قيد المعالجة أو الانتظار"""
+        return len(self._locks)
+
+    async def initialize(self) -> None:
+        """لا توجد موارد للتهيئة"""
+
+    async def shutdown(self) -> None:
+        """لا توجد موارد للتحرير"""
+
+def register_update_metrics(application: Application) -> None:
+    """
+    تسجيل مقاييس طابور التحديثات والمحادثات النشطة لتطبيق معين
+    """
+    gauge('telegram_update_queue_depth', 'عدد التحديثات المنتظرة في طابور التطبيق',
+          callback=application.update_queue.qsize)
+    processor = application.update_processor
+    if isinstance(processor, PerChatUpdateProcessor):
+        gauge('telegram_active_chats', 'عدد المحادثات التي لديها تحديثات قيد المعالجة',
+              callback=lambda: processor.active_chats)
@@ -0,0 +1,151 @@
+"""
+تشغيل البوت في وضع webhook
+
+بدلاً من سؤال تيليجرام عن التحديثات بشكل دوري (polling)، يرسل تيليجرام كل
+تحديث مباشرة إلى خادم HTTP مدمج. يتم التحقق من الرمز السري، ووضع التحديث
+في طابور محدود، والرد بـ 200 فوراً قبل انتهاء معالجته.
+
+للاختبار محلياً بدون WEBHOOK_URL يمكن إرسال تحديث مسجل:
+    curl -X POST http://127.0.0.1:8443/telegram \
+         -H "X-Telegram-Bot-Api-Secret-Token: $WEBHOOK_SECRET" \
+         -H "Content-Type: application/json" -d @update.json
+"""
+import hmac
+import json
+import ipaddress
+import signal
+import asyncio
+import logging
+from telegram import Update
+from telegram.ext import Application
+
+from src.config import (
+    WEBHOOK_URL,
+    WEBHOOK_LISTEN,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_QUEUE_SIZE,
+)
+from utils.http_server import HttpError, HttpRequest, serve
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# ترويسة الرمز السري التي يرسلها تيليجرام
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+def _is_loopback(host: str) -> bool:
+    """هل عنوان الاستماع محلي (لا يصل إليه أحد من خارج الجهاز)"""
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def check_webhook_config() -> None:
+    """
+    التحقق من إعدادات webhook قبل التشغيل
+
+    بدون رمز سري يستطيع أي شخص يصل إلى الخادم إرسال تحديثات مزيفة باسم أي
+    مستخدم، لذلك لا يسمح بذلك إلا للاختبار المحلي (بدون WEBHOOK_URL وعلى عنوان محلي).
+
+    ترفع:
+        ValueError: إذا لم يحدد WEBHOOK_SECRET والخادم متاح من الخارج
+    """
+    if WEBHOOK_SECRET:
+        return
+    if WEBHOOK_URL or not _is_loopback(WEBHOOK_LISTEN):
+        raise ValueError(
+            f"WEBHOOK_SECRET مطلوب لتشغيل webhook على {WEBHOOK_LISTEN}"
+            + (" مع WEBHOOK_URL" if WEBHOOK_URL else "")
+        )
+    logger.warning("WEBHOOK_SECRET غير محدد، يتم قبول التحديثات بدون تحقق (اختبار محلي فقط)")
+
+def create_webhook_handler(application: Application):
+    """
+    إنشاء معالج طلبات webhook لتطبيق معين
+    """
+    async def handle(request: HttpRequest):
+        if request.path != WEBHOOK_PATH:
+            raise HttpError(404)
+        if request.method != "POST":
+            raise HttpError(405)
+
+        # التحقق من الرمز السري
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get(SECRET_HEADER, "").encode("utf-8"),
+            WEBHOOK_SECRET.encode("utf-8")
+        ):
+            logger.warning("تم رفض طلب webhook برمز سري غير صحيح")
+            raise HttpError(403)
+
+        # طابور ممتلئ: تيليجرام سيعيد إرسال التحديث لاحقاً
+        if application.update_queue.qsize() >= WEBHOOK_QUEUE_SIZE:
+            logger.warning("طابور التحديثات ممتلئ، تم رفض التحديث مؤقتاً")
+            raise HttpError(503)
+
+        try:
+            update = Update.de_json(json.loads(request.body), application.bot)
+        except (ValueError, TypeError, KeyError) as e:
+            raise HttpError(400, f"تحديث غير صالح: {str(e)}")
+
+        # الرد فوراً، والمعالجة تتم بواسطة التطبيق من الطابور
+        application.update_queue.put_nowait(update)
+        return 200, b"", "text/plain; charset=utf-8"
+
+    return handle
+
+async def run_webhook(application: Application) -> None:
+    """
+    تشغيل التطبيق في وضع webhook حتى استلام إشارة إيقاف
+
+    يتم تنفيذ post_init و post_stop و post_shutdown كما في run_polling.
+
+    ترفع:
+        ValueError: إذا كانت إعدادات webhook غير آمنة (انظر check_webhook_config)
+    """
+    check_webhook_config()
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # غير مدعوم على ويندوز، سيتم الإيقاف عبر KeyboardInterrupt
+            pass
+
+    await application.initialize()
+    try:
+        if application.post_init:
+            await application.post_init(application)
+
+        server = await serve(create_webhook_handler(application), WEBHOOK_LISTEN, WEBHOOK_PORT)
+        logger.info(f"خادم webhook يعمل على {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+
+        if WEBHOOK_URL:
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL.rstrip("/") + WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET or None,
+                allowed_updates=Update.ALL_TYPES,
+                drop_pending_updates=True,
+            )
+            logger.info("تم تسجيل عنوان webhook لدى تيليجرام")
+        else:
+            logger.warning("WEBHOOK_URL غير محدد، لن يتم تسجيل webhook لدى تيليجرام (وضع الاختبار المحلي)")
+
+        await application.start()
+        try:
+            await stop_event.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+    finally:
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
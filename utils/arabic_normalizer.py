@@ -0,0 +1,39 @@
+"""
+توحيد النص العربي للبحث
+
+يتم توحيد أشكال الألف (أ إ آ ٱ ← ا) والتاء المربوطة (ة ← ه) والألف المقصورة
+(ى ← ي)، وحذف التشكيل والتطويل، وتحويل الأرقام العربية إلى إنجليزية بنفس
+قواعد utils/number_converter.py، بحيث تتطابق "قهوة" و"قهوه" و"قَهْوَة".
+"""
+import re
+from typing import List
+from utils.number_converter import convert_to_english_numbers
+
+# التشكيل (الفتحتان حتى السكون، والألف الخنجرية) والتطويل
+_DIACRITICS_RE = re.compile('[\u064B-\u0652\u0670\u0640]')
+
+_LETTERS = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ة': 'ه',
+    'ى': 'ي',
+})
+
+# الكلمة: حروف وأرقام، مع السماح بفاصلة عشرية داخل الأرقام (12.5)
+_TOKEN_RE = re.compile(r'\d+(?:\.\d+)?|\w+')
+
+def normalize_arabic(text: str) -> str:
+    """
+    توحيد النص للمقارنة والبحث
+    """
+    text = convert_to_english_numbers(str(text))
+    text = _DIACRITICS_RE.sub('', text)
+    return text.translate(_LETTERS).casefold()
+
+def tokenize(text: str) -> List[str]:
+    """
+    تقسيم النص إلى كلمات موحدة
+    """
+    return _TOKEN_RE.findall(normalize_arabic(text))
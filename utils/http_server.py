@@ -0,0 +1,133 @@
+"""
+خادم HTTP بسيط مبني على asyncio
+
+يستخدم لاستقبال تحديثات تيليجرام (webhook) وعرض المقاييس، دون الحاجة
+لمكتبات إضافية. يدعم HTTP/1.1 مع إبقاء الاتصال مفتوحاً (keep-alive).
+"""
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# الحد الأقصى لحجم جسم الطلب (بالبايت)
+MAX_BODY_SIZE = 1024 * 1024
+
+# مهلة انتظار الطلب التالي على اتصال مفتوح (بالثواني)
+KEEP_ALIVE_TIMEOUT = 75
+
+STATUS_TEXT = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+    503: "Service Unavailable",
+}
+
+class HttpRequest(NamedTuple):
+    """طلب HTTP"""
+    method: str
+    path: str
+    headers: Dict[str, str]
+    body: bytes
+
+class HttpError(Exception):
+    """خطأ يتم الرد عليه برمز حالة HTTP"""
+
+    def __init__(self, status: int, message: str = ""):
+        super().__init__(message or STATUS_TEXT.get(status, ""))
+        self.status = status
+
+# المعالج يعيد (رمز الحالة، الجسم، نوع المحتوى)
+Handler = Callable[[HttpRequest], Awaitable[Tuple[int, bytes, str]]]
+
+async def read_request(reader: asyncio.StreamReader, max_body_size: int = MAX_BODY_SIZE) -> Optional[HttpRequest]:
+    """
+    قراءة طلب HTTP واحد
+
+    تعيد:
+        الطلب، أو None إذا أغلق العميل الاتصال
+
+    ترفع:
+        HttpError: إذا كان الطلب غير صالح أو كبيراً جداً
+    """
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(400, "ترويسات الطلب كبيرة جداً")
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, path, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HttpError(400, "سطر الطلب غير صالح")
+
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HttpError(400, "Content-Length غير صالح")
+    if length > max_body_size:
+        raise HttpError(413)
+
+    body = await reader.readexactly(length) if length else b""
+    return HttpRequest(method.upper(), path.split("?", 1)[0], headers, body)
+
+def write_response(writer: asyncio.StreamWriter, status: int, body: bytes = b"",
+                   content_type: str = "text/plain; charset=utf-8", keep_alive: bool = True) -> None:
+    """كتابة رد HTTP"""
+    head = (
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        "\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+
+async def serve(handler: Handler, host: str, port: int) -> asyncio.AbstractServer:
+    """
+    تشغيل خادم HTTP يستدعي handler لكل طلب
+
+    تعيد:
+        كائن الخادم (يتم إيقافه بـ close ثم wait_closed)
+    """
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                keep_alive = False
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                    if request is None:
+                        break
+                    keep_alive = request.headers.get("connection", "").lower() != "close"
+                    status, body, content_type = await handler(request)
+                except HttpError as e:
+                    status, body, content_type = e.status, str(e).encode("utf-8"), "text/plain; charset=utf-8"
+                except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception as e:
+                    logger.error(f"خطأ في معالجة طلب HTTP: {str(e)}", exc_info=True)
+                    status, body, content_type = 500, b"", "text/plain; charset=utf-8"
+
+                write_response(writer, status, body, content_type, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle_connection, host, port)
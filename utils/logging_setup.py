@@ -0,0 +1,147 @@
+"""
+إعداد السجلات بدون حجب حلقة الأحداث
+
+المعالجات المرتبطة بالسجل الرئيسي تضع السجلات في طابور فقط، وخيط مستمع
+واحد يقوم بالكتابة إلى الملف ووحدة التحكم. بذلك لا يؤدي بطء القرص (أو
+تسجيل تتبع خطأ كامل) إلى إيقاف معالجة التحديثات. يدعم تدوير الملف حسب
+الحجم أو الوقت مع ضغط الملفات القديمة، وتنسيقاً نصياً أو JSON.
+"""
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+from datetime import datetime, timezone
+from typing import Optional
+from src.config import (
+    LOG_LEVEL,
+    LOG_DIR,
+    LOG_FORMAT,
+    LOG_ROTATION,
+    LOG_MAX_BYTES,
+    LOG_ROTATE_WHEN,
+    LOG_BACKUP_COUNT,
+    LOG_COMPRESS,
+)
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# خصائص السجل القياسية (كل ما عداها يعتبر حقولاً إضافية من extra=...)
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+class JsonFormatter(logging.Formatter):
+    """تنسيق كل سجل كسطر JSON واحد"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        if record.stack_info:
+            entry['stack'] = self.formatStack(record.stack_info)
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and not name.startswith('_'):
+                entry[name] = value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """
+    وضع السجل في الطابور بأقل عمل ممكن في الخيط المستدعي
+
+    يتم دمج الرسالة مع معطياتها فوراً (حتى لا تتغير الكائنات قبل الكتابة)،
+    أما تنسيق تتبع الخطأ فيبقى لخيط المستمع لأن المستمع في نفس العملية.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+def _compress_rotator(source: str, dest: str) -> None:
+    """ضغط الملف المدور بـ gzip (يعمل في خيط المستمع)"""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+def _file_handler(path: str) -> logging.Handler:
+    """معالج ملف السجل حسب إعدادات التدوير"""
+    if LOG_ROTATION == 'size':
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    elif LOG_ROTATION == 'time':
+        handler = logging.handlers.TimedRotatingFileHandler(
+            path, when=LOG_ROTATE_WHEN, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+        )
+    else:
+        return logging.FileHandler(path, encoding='utf-8')
+
+    if LOG_COMPRESS:
+        handler.namer = lambda name: f"{name}.gz"
+        handler.rotator = _compress_rotator
+    return handler
+
+def setup_logging(filename: str = 'bot.log', console: bool = True) -> logging.handlers.QueueListener:
+    """
+    إعداد السجل الرئيسي (مرة واحدة لكل عملية)
+
+    المعطيات:
+        filename: اسم ملف السجل داخل LOG_DIR (فارغ لتعطيل الملف)
+        console: الكتابة إلى وحدة التحكم أيضاً
+
+    تعيد:
+        مستمع الطابور (يتم إيقافه تلقائياً عند الخروج بعد كتابة السجلات المتبقية)
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+
+        formatter = JsonFormatter() if LOG_FORMAT == 'json' else logging.Formatter(TEXT_FORMAT)
+        handlers = []
+        if filename:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handlers.append(_file_handler(os.path.join(LOG_DIR, filename)))
+        if console:
+            handlers.append(logging.StreamHandler(sys.stderr))
+        for handler in handlers:
+            handler.setFormatter(formatter)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        root_logger = logging.getLogger()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        root_logger.addHandler(_NonBlockingQueueHandler(log_queue))
+        root_logger.setLevel(LOG_LEVEL)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+        return _listener
+
+def stop_logging() -> None:
+    """كتابة السجلات المتبقية في الطابور وإيقاف خيط المستمع"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,346 @@
+"""
+مقاييس الأداء (زمن الاستجابة، العدادات، أعماق الطوابير)
+
+مقاييس بسيطة في الذاكرة بدون مكتبات إضافية: كل تسجيل هو قفل وعملية جمع
+(والبحث الثنائي عن الفئة في المدرج التكراري)، فيمكن تركها مفعلة دائماً.
+يتم عرضها بتنسيق Prometheus النصي على /metrics وبتنسيق JSON على
+/metrics.json (يستخدمه أمر cli.py stats).
+
+مقاييس أعماق الطوابير تعرف بدالة تحسب القيمة عند القراءة فقط، فلا تكلف
+شيئاً أثناء معالجة التحديثات.
+"""
+import asyncio
+import bisect
+import functools
+import json
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from utils.http_server import HttpError, HttpRequest, serve
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+# حدود فئات زمن الاستجابة بالثواني
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelKey = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    """تهريب قيمة تسمية في تنسيق Prometheus"""
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+class _Metric:
+    """الأساس المشترك للمقاييس ذات التسميات"""
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelKey, Any] = {}
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"المقياس {self.name} يتطلب التسميات {self.labelnames}")
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError:
+            raise ValueError(f"المقياس {self.name} يتطلب التسميات {self.labelnames}")
+
+    def samples(self) -> List[Tuple[LabelKey, Any]]:
+        """نسخة من القيم الحالية"""
+        with self._lock:
+            return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self.samples()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+    def snapshot(self) -> List[dict]:
+        return [
+            {"labels": dict(zip(self.labelnames, key)), "value": value}
+            for key, value in sorted(self.samples())
+        ]
+
+class Counter(_Metric):
+    """عداد متزايد فقط"""
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """
+    قيمة حالية قابلة للزيادة والنقصان
+
+    إذا تم تمرير callback يتم حساب القيمة عند القراءة فقط (بدون تسميات).
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def samples(self) -> List[Tuple[LabelKey, Any]]:
+        if self.callback is None:
+            return super().samples()
+        try:
+            return [((), float(self.callback()))]
+        except Exception as e:
+            logger.debug(f"تعذر حساب المقياس {self.name}: {str(e)}")
+            return []
+
+class _Timer:
+    """قياس مدة كتلة with وتسجيلها في المدرج التكراري"""
+    __slots__ = ("_histogram", "_labels", "_start")
+
+    def __init__(self, histogram: "Histogram", labels: Dict[str, Any]):
+        self._histogram = histogram
+        self._labels = labels
+
+    def __enter__(self) -> "_Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self._histogram.observe(time.perf_counter() - self._start, **self._labels)
+
+class Histogram(_Metric):
+    """
+    مدرج تكراري بفئات ثابتة (لحساب المتوسط والنسب المئوية التقريبية)
+
+    القيمة المخزنة لكل تسميات: [عدد كل فئة (غير تراكمي)، المجموع، العدد].
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels) -> _Timer:
+        """قياس مدة كتلة: with HISTOGRAM.time(operation='read'): ..."""
+        return _Timer(self, labels)
+
+    def samples(self) -> List[Tuple[LabelKey, Any]]:
+        with self._lock:
+            return [(key, [list(state[0]), state[1], state[2]]) for key, state in self._values.items()]
+
+    def quantile(self, counts: Sequence[int], q: float) -> Optional[float]:
+        """
+        تقدير نسبة مئوية من أعداد الفئات (استيفاء خطي داخل الفئة)
+
+        تعيد:
+            القيمة التقديرية، أو None إذا لم توجد قياسات
+        """
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index >= len(self.buckets):
+                    # الفئة الأخيرة مفتوحة، نكتفي بحدها الأدنى
+                    return lower
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in sorted(self.samples()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def snapshot(self) -> List[dict]:
+        result = []
+        for key, (counts, total, count) in sorted(self.samples()):
+            result.append({
+                "labels": dict(zip(self.labelnames, key)),
+                "count": count,
+                "sum": total,
+                "p50": self.quantile(counts, 0.5),
+                "p95": self.quantile(counts, 0.95),
+                "p99": self.quantile(counts, 0.99),
+            })
+        return result
+
+class MetricsRegistry:
+    """
+    سجل المقاييس المعرفة في البرنامج
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """
+        تسجيل مقياس، أو إعادة المقياس الموجود بنفس الاسم
+
+        ترفع:
+            ValueError: إذا كان الاسم مسجلاً لمقياس من نوع آخر
+        """
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+            raise ValueError(f"المقياس {metric.name} مسجل مسبقاً بتعريف مختلف")
+        if isinstance(metric, Gauge) and metric.callback is not None:
+            existing.callback = metric.callback
+        return existing
+
+    def metrics(self) -> List[_Metric]:
+        with self._lock:
+            return sorted(self._metrics.values(), key=lambda metric: metric.name)
+
+    def render(self) -> str:
+        """جميع المقاييس بتنسيق Prometheus النصي"""
+        lines = []
+        for metric in self.metrics():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> dict:
+        """جميع المقاييس كقاموس (لتنسيق JSON)"""
+        return {
+            metric.name: {"type": metric.kind, "help": metric.documentation, "samples": metric.snapshot()}
+            for metric in self.metrics()
+        }
+
+REGISTRY = MetricsRegistry()
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """تعريف عداد في السجل الافتراضي"""
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = (),
+          callback: Optional[Callable[[], float]] = None) -> Gauge:
+    """تعريف مقياس قيمة حالية في السجل الافتراضي"""
+    return REGISTRY.register(Gauge(name, documentation, labelnames, callback))
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    """تعريف مدرج تكراري في السجل الافتراضي"""
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+# مقاييس مشتركة
+ERRORS = counter('errors_total', 'عدد الأخطاء حسب المكون ونوع الاستثناء', ('component', 'type'))
+HANDLER_SECONDS = histogram('handler_seconds', 'مدة تنفيذ معالجات تيليجرام', ('handler',))
+
+def timed(metric: Histogram, component: str, **labels):
+    """
+    مزخرف لدالة غير متزامنة يسجل مدة تنفيذها، ونوع الاستثناء إذا فشلت
+
+    مثال:
+        @timed(HANDLER_SECONDS, 'handler', handler='price')
+        async def price(update, context): ...
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                ERRORS.inc(component=component, type=type(e).__name__)
+                raise
+            finally:
+                metric.observe(time.perf_counter() - start, **labels)
+        return wrapper
+    return decorator
+
+# خادم المقاييس (واحد لكل عملية)
+_server: Optional[asyncio.AbstractServer] = None
+
+async def _handle_metrics_request(request: HttpRequest):
+    if request.method != "GET":
+        raise HttpError(405)
+    if request.path == "/metrics":
+        return 200, REGISTRY.render().encode("utf-8"), PROMETHEUS_CONTENT_TYPE
+    if request.path == "/metrics.json":
+        body = json.dumps(REGISTRY.snapshot(), ensure_ascii=False).encode("utf-8")
+        return 200, body, "application/json; charset=utf-8"
+    raise HttpError(404)
+
+async def start_metrics_server(host: str, port: int) -> None:
+    """
+    تشغيل خادم المقاييس المحلي (لا يفعل شيئاً إذا كان المنفذ 0)
+
+    فشل تشغيل الخادم (مثل منفذ مستخدم) لا يوقف البوت.
+    """
+    global _server
+    if not port or _server is not None:
+        return
+    try:
+        _server = await serve(_handle_metrics_request, host, port)
+    except OSError as e:
+        logger.warning(f"تعذر تشغيل خادم المقاييس على {host}:{port}: {str(e)}")
+        return
+    logger.info(f"المقاييس متاحة على http://{host}:{port}/metrics")
+
+async def stop_metrics_server() -> None:
+    """إيقاف خادم المقاييس"""
+    global _server
+    if _server is not None:
+        _server.close()
+        await _server.wait_closed()
+        _server = None
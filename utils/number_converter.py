@@ -1,17 +1,28 @@
 """
 تحويل الأرقام العربية إلى إنجليزية
 """
+import re
+
+# الأرقام العربية (٠-٩) والفارسية (۰-۹) والفاصلة العشرية العربية (٫) وفاصل الآلاف العربي (٬)
+_REPLACEMENTS = tuple(
+    [(chr(0x0660 + i), str(i)) for i in range(10)]
+    + [(chr(0x06F0 + i), str(i)) for i in range(10)]
+    + [('٫', '.'), ('٬', ',')]
+)
+
+_NON_ENGLISH_DIGITS_RE = re.compile('[' + ''.join(char for char, _ in _REPLACEMENTS) + ']')
 
 def convert_to_english_numbers(text: str) -> str:
     """
     تحويل الأرقام العربية إلى إنجليزية في النص
     """
-    arabic_numbers = {'٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
-                     '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
-                     '.': '.', '٫': '.'}
-    
-    result = ''
-    for char in text:
-        result += arabic_numbers.get(char, char)
-    
-    return result
+    # معظم النصوص لا تحتوي على أرقام عربية، فنعيدها كما هي بعد بحث واحد
+    if _NON_ENGLISH_DIGITS_RE.search(text) is None:
+        return text
+
+    # كل استبدال يمر على النص مرة واحدة بسرعة C، وهو أسرع من str.translate
+    # للنصوص العربية لأن الأخيرة تعالج كل حرف غير ASCII على حدة
+    for char, replacement in _REPLACEMENTS:
+        if char in text:
+            text = text.replace(char, replacement)
+    return text
@@ -0,0 +1,63 @@
+"""
+تحليل أسطر المنتجات
+
+يحول سطراً مثل "شيبس ٢٥ حار" إلى (المنتج، السعر، الملاحظات) في مرور واحد
+باستخدام جدول استبدال الأرقام وتعبير نمطي مترجم مسبقاً.
+"""
+import re
+from typing import List, Optional, Tuple
+from utils.number_converter import convert_to_english_numbers
+
+# السعر هو أول كلمة تتكون من رقم فقط، مع دعم فواصل الآلاف (1,500) والكسور (2.5)
+_PRICE = r'[-+]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d*)?|[-+]?\.\d+'
+_PRICE_RE = re.compile(r'(?<!\S)(?:' + _PRICE + r')(?!\S)')
+
+# سطر كامل: (المنتج)(السعر)(الملاحظات) أو سطر بدون سعر، لتحليل رسالة كاملة في مرور واحد
+_LINE_RE = re.compile(r'^(?:(.*?)(?<!\S)(' + _PRICE + r')(?!\S)(.*)|(.*))$', re.MULTILINE)
+
+def parse_product_line(line: str) -> Optional[Tuple[str, Optional[float], str]]:
+    """
+    تحليل سطر منتج واحد
+
+    تعيد:
+        (المنتج، السعر، الملاحظات)، والسعر None إذا لم يوجد رقم في السطر،
+        أو None إذا كان السطر فارغاً
+    """
+    line = convert_to_english_numbers(line)
+    match = _PRICE_RE.search(line)
+
+    # إذا لم يتم العثور على سعر
+    if match is None:
+        product = ' '.join(line.split())
+        return (product, None, "") if product else None
+
+    # ما قبل السعر هو اسم المنتج وكل ما بعده يعتبر ملاحظات
+    product = ' '.join(line[:match.start()].split())
+    price = float(match.group().replace(',', ''))
+    notes = ' '.join(line[match.end():].split())
+    return product, price, notes
+
+def parse_product_lines(text: str) -> List[Tuple[str, Tuple[str, Optional[float], str]]]:
+    """
+    تحليل رسالة متعددة الأسطر (منتج في كل سطر) في مرور واحد
+
+    يتم تحويل الأرقام مرة واحدة للرسالة كاملة ثم مطابقة جميع الأسطر بنفس
+    التعبير النمطي، بدلاً من استدعاء parse_product_line لكل سطر.
+
+    تعيد:
+        أزواج (السطر الأصلي، (المنتج، السعر، الملاحظات)) للأسطر غير الفارغة
+    """
+    results = []
+    # التحويل يستبدل كل حرف بحرف واحد، فمواضع الأسطر في النصين متطابقة
+    for match in _LINE_RE.finditer(convert_to_english_numbers(text)):
+        product, price, notes, name = match.groups()
+        if price is None:
+            name = ' '.join(name.split())
+            if name:
+                results.append((text[match.start():match.end()].strip(), (name, None, "")))
+            continue
+        results.append((
+            text[match.start():match.end()].strip(),
+            (' '.join(product.split()), float(price.replace(',', '')), ' '.join(notes.split()))
+        ))
+    return results
@@ -0,0 +1,276 @@
+"""
+تحليل أداء تحديثات مختارة (profiling) بأخذ عينات من المكدس
+
+عند التفعيل يتم اختيار نسبة من التحديثات (PROFILE_SAMPLE_RATE) أو جميع
+تحديثات محادثة واحدة (PROFILE_CHAT_ID). أثناء معالجة التحديث المختار يأخذ
+خيط منفصل كل PROFILE_INTERVAL_MS عينة من:
+    - مكدس حلقة الأحداث، فقط عندما يكون التحديث المختار هو الذي ينفذ
+      (وليس تحديثات المحادثات الأخرى التي تعمل بالتوازي)
+    - مكدس خيط Google Sheets الذي ينفذ استدعاءات هذا التحديث
+
+لكل تحديث يتم حفظ ملف JSON (مدة التحديث واستدعاءات Google Sheets والمكدسات)
+وملف .folded بتنسيق flamegraph.pl / speedscope. يلخصها أمر cli.py profile.
+التحديثات غير المختارة لا تكلف سوى مقارنة واحدة.
+"""
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from src.config import (
+    PROFILE_SAMPLE_RATE,
+    PROFILE_CHAT_ID,
+    PROFILE_DIR,
+    PROFILE_INTERVAL_MS,
+    PROFILE_MAX_FILES,
+)
+
+# إعداد التسجيل
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = PROFILE_SAMPLE_RATE > 0 or PROFILE_CHAT_ID is not None
+
+# أقصى عمق للمكدس في العينة الواحدة
+MAX_STACK_DEPTH = 128
+
+# التحليل الجاري والمهمة التي يخصها: (التحليل، المهمة). المهام الخلفية التي تنشأ
+# أثناء التحديث (مثل الكاتب الخلفي) ترث المتغير، لذلك يتم التحقق من المهمة أيضاً
+_current_profile: contextvars.ContextVar = contextvars.ContextVar('profile', default=(None, None))
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def _stack_until(frame, marker) -> Optional[List[str]]:
+    """
+    أسماء الإطارات من marker إلى الإطار الحالي
+
+    تعيد None إذا لم يكن marker في المكدس (أي أن الكود المحلل لا ينفذ الآن).
+    """
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        if frame is marker:
+            names.reverse()
+            return names
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return None
+
+class UpdateProfile:
+    """
+    عينات المكدس واستدعاءات Google Sheets لتحديث واحد
+    """
+
+    def __init__(self, label: str, chat_id: Optional[int], loop_marker=None):
+        self.label = label
+        self.chat_id = chat_id
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.stacks: Counter = Counter()
+        self.sheets_calls: List[dict] = []
+        self._lock = threading.Lock()
+        self._loop_thread = threading.get_ident()
+        # إطار جذر مكدس التحديث في حلقة الأحداث
+        self._loop_marker = loop_marker
+        # الخيوط التي تنفذ استدعاءات هذا التحديث: معرف الخيط ← (الإطار الجذر، اسم الاستدعاء)
+        self._threads: Dict[int, tuple] = {}
+        # عدد الأعمال الخلفية التي ما زالت تخص هذا التحديث بعد انتهائه (انظر hold)
+        self._holds = 0
+        self._ended = False
+
+    def sample(self, frames: Dict[int, Any]) -> None:
+        """أخذ عينة من مكدسات خيوط هذا التحديث (من خيط أخذ العينات)"""
+        if self._loop_marker is not None:
+            stack = _stack_until(frames.get(self._loop_thread), self._loop_marker)
+            if stack is not None:
+                self.stacks[";".join(["[loop]"] + stack)] += 1
+        for thread_id, (marker, name) in list(self._threads.items()):
+            stack = _stack_until(frames.get(thread_id), marker)
+            if stack is not None:
+                self.stacks[";".join([f"[sheets] {name}"] + stack)] += 1
+
+    def wrap_call(self, func: Callable[[], Any], name: str) -> Callable[[], Any]:
+        """تغليف استدعاء سيعمل في خيط آخر ليتم أخذ عينات منه وقياس مدته"""
+        def run():
+            thread_id = threading.get_ident()
+            self._threads[thread_id] = (sys._getframe(), name)
+            start = time.perf_counter()
+            try:
+                return func()
+            finally:
+                self._threads.pop(thread_id, None)
+                with self._lock:
+                    self.sheets_calls.append({
+                        'name': name,
+                        'seconds': time.perf_counter() - start,
+                        'after_reply': self._ended,
+                    })
+        return run
+
+    def hold(self) -> None:
+        """
+        تأجيل حفظ التحليل حتى ينتهي عمل خلفي يخص هذا التحديث
+
+        مثل صفوف صندوق الصادر التي ترسل إلى Google Sheets بعد الرد على المستخدم،
+        فتظهر استدعاءاتها في التحليل. كل hold يقابله release.
+        """
+        with self._lock:
+            self._holds += 1
+
+    def release(self) -> None:
+        with self._lock:
+            self._holds -= 1
+            done = self._ended and self._holds == 0
+        if done:
+            _get_sampler().finish(self)
+
+    def _end(self) -> None:
+        """انتهاء التحديث: الحفظ الآن إلا إذا كان هناك عمل خلفي منتظر"""
+        with self._lock:
+            self._ended = True
+            done = self._holds == 0
+        if done:
+            _get_sampler().finish(self)
+
+    def to_dict(self) -> dict:
+        return {
+            'label': self.label,
+            'chat_id': self.chat_id,
+            'started_at': datetime.fromtimestamp(self.started_at).isoformat(timespec='seconds'),
+            'duration': self.duration,
+            'interval': PROFILE_INTERVAL_MS / 1000,
+            'samples': sum(self.stacks.values()),
+            'sheets_calls': self.sheets_calls,
+            'stacks': dict(self.stacks),
+        }
+
+class _Sampler(threading.Thread):
+    """خيط يأخذ عينات من التحديثات الجاري تحليلها ويكتب النتائج إلى القرص"""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profiler", daemon=True)
+        self.interval = interval
+        self._active: set = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._finished: queue.SimpleQueue = queue.SimpleQueue()
+
+    def add(self, profile: UpdateProfile) -> None:
+        with self._lock:
+            self._active.add(profile)
+        self._wakeup.set()
+
+    def finish(self, profile: UpdateProfile) -> None:
+        with self._lock:
+            self._active.discard(profile)
+        self._finished.put(profile)
+        self._wakeup.set()
+
+    def run(self) -> None:
+        while True:
+            with self._lock:
+                active = list(self._active)
+            if not active:
+                self._wakeup.wait()
+                self._wakeup.clear()
+            else:
+                time.sleep(self.interval)
+                frames = sys._current_frames()
+                for profile in active:
+                    profile.sample(frames)
+                del frames
+            while not self._finished.empty():
+                self._write(self._finished.get())
+
+    def _write(self, profile: UpdateProfile) -> None:
+        """حفظ ملف JSON وملف المكدسات بتنسيق folded"""
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            stamp = datetime.fromtimestamp(profile.started_at).strftime('%Y%m%d-%H%M%S')
+            base = os.path.join(PROFILE_DIR, f"{stamp}-{profile.label}")
+            with open(base + '.json', 'w', encoding='utf-8') as f:
+                json.dump(profile.to_dict(), f, ensure_ascii=False)
+            with open(base + '.folded', 'w', encoding='utf-8') as f:
+                for stack, count in profile.stacks.items():
+                    f.write(f"{stack} {count}\n")
+            self._prune()
+        except OSError as e:
+            logger.warning(f"تعذر حفظ ملف تحليل الأداء: {str(e)}")
+
+    @staticmethod
+    def _prune() -> None:
+        """حذف أقدم الملفات عند تجاوز PROFILE_MAX_FILES"""
+        profiles = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+        for name in profiles[:max(0, len(profiles) - PROFILE_MAX_FILES)]:
+            for path in (name, name[:-len('.json')] + '.folded'):
+                try:
+                    os.remove(os.path.join(PROFILE_DIR, path))
+                except FileNotFoundError:
+                    pass
+
+_sampler: Optional[_Sampler] = None
+_sampler_lock = threading.Lock()
+
+def _get_sampler() -> _Sampler:
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+            _sampler.start()
+        return _sampler
+
+def should_profile(chat_id: Optional[int]) -> bool:
+    """هل يتم تحليل التحديث التالي لهذه المحادثة"""
+    if not PROFILING_ENABLED:
+        return False
+    if PROFILE_CHAT_ID is not None:
+        return chat_id == PROFILE_CHAT_ID
+    return random.random() < PROFILE_SAMPLE_RATE
+
+async def profile_coroutine(coroutine: Awaitable[Any], label: str, chat_id: Optional[int] = None) -> Any:
+    """
+    تنفيذ coroutine مع أخذ عينات من مكدسها ومن استدعاءات Google Sheets التي تطلقها
+    """
+    profile = UpdateProfile(label, chat_id, loop_marker=sys._getframe())
+    token = _current_profile.set((profile, asyncio.current_task()))
+    sampler = _get_sampler()
+    sampler.add(profile)
+    start = time.perf_counter()
+    try:
+        return await coroutine
+    finally:
+        profile.duration = time.perf_counter() - start
+        _current_profile.reset(token)
+        profile._end()
+
+def current_profile() -> Optional[UpdateProfile]:
+    """التحليل الجاري في المهمة الحالية (أو None)"""
+    profile, task = _current_profile.get()
+    if profile is None or task is not asyncio.current_task():
+        return None
+    return profile
+
+@contextlib.contextmanager
+def use_profile(profile: Optional[UpdateProfile]):
+    """
+    نسب استدعاءات Google Sheets داخل الكتلة إلى تحليل تحديث آخر
+
+    يستخدمها الكاتب الخلفي وصندوق الصادر عند إرسال صفوف تحديث جاري تحليله.
+    """
+    if profile is None:
+        yield
+        return
+    token = _current_profile.set((profile, asyncio.current_task()))
+    try:
+        yield
+    finally:
+        _current_profile.reset(token)
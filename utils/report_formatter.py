@@ -0,0 +1,47 @@
+"""
+تنسيق تقرير المصروفات ونتائج البحث للعرض في البوت وسطر الأوامر
+"""
+
+def format_amount(value: float) -> str:
+    """تنسيق مبلغ بدون أصفار زائدة (23 بدلاً من 23.00)"""
+    return f"{value:,.2f}".rstrip('0').rstrip('.')
+
+def _section(title: str, entries: list) -> list:
+    """تنسيق قسم من التقرير"""
+    lines = [f"{title}:"]
+    if not entries:
+        lines.append("  لا توجد بيانات")
+    for key, total, count in entries:
+        lines.append(f"  {key}: {format_amount(total)} ({count} عملية شراء)")
+    return lines
+
+def format_spending_report(report: dict) -> str:
+    """
+    تحويل التقرير الذي تعيده get_spending_report إلى نص
+    """
+    lines = ["📊 تقرير المصروفات", ""]
+    for title, key in (("اليوم", 'today'), ("هذا الأسبوع", 'this_week'), ("هذا الشهر", 'this_month')):
+        total, count = report[key]
+        lines.append(f"{title}: {format_amount(total)} ({count} عملية شراء)")
+
+    for title, key in (
+        ("آخر الأيام", 'days'),
+        ("آخر الأسابيع", 'weeks'),
+        ("آخر الأشهر", 'months'),
+        ("أكثر المنتجات إنفاقاً", 'products'),
+    ):
+        lines.append("")
+        lines.extend(_section(title, report[key]))
+    return "\n".join(lines)
+
+def format_purchases(products: list) -> str:
+    """
+    تحويل قائمة منتجات (بشكل get_products) إلى نص، سطر لكل عملية شراء
+    """
+    lines = []
+    for product in products:
+        line = f"{product['date']} - {product['name']}: {format_amount(product['price'])}"
+        if product.get('notes'):
+            line += f" ({product['notes']})"
+        lines.append(line)
+    return "\n".join(lines)